@@ -1,11 +1,18 @@
 # Decryption.py — Passphrase + scrypt KDF + AES-GCM (no biometrics, no key file)
 import os, base64, zlib
+from concurrent.futures import ProcessPoolExecutor
 from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import scrypt
+
+import metrics
+from metrics import log
+
+from Encryption import (BINARY_MODE, CODEC_VERSION, CODECS, LAST_RECORD_FLAG,
+                        STREAM_HEADER_SIZE, STREAM_VERSION, _record_nonce, decompress_payload, derive_key)
 
 # --- Paths (edit if needed) ---
 PROJECT_DIR = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography"
 EXTRACTED_ENCRYPTED_TXT = os.path.join(PROJECT_DIR, "extracted_encrypted_message.txt")
+EXTRACTED_ENCRYPTED_BIN = os.path.join(PROJECT_DIR, "extracted_encrypted_message.bin")
 DECRYPTED_MESSAGE_TXT   = os.path.join(PROJECT_DIR, "decrypted_message.txt")
 PASS_FILE = os.path.join(PROJECT_DIR, "pass.txt")           # optional; plain-text passphrase file
 PASS_ENV = "STEGO_PASS"                                     # optional; env var for passphrase
@@ -22,39 +29,150 @@ def get_passphrase() -> bytes:
     # 3) Visible prompt (fallback)
     return input("Enter passphrase (visible): ").encode("utf-8")
 
-def decrypt_message(token_b64: str, passphrase: bytes) -> str:
-    data = base64.b64decode(token_b64)
-    if not data or data[0] != 3:
+# Largest piece of decompressed plaintext yielded at once by decrypt_stream
+OUTPUT_CHUNK = 64 * 1024
+
+class _ByteReader:
+    """Pulls exactly the requested number of bytes from an iterable of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = bytearray()
+
+    def read_exact(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                raise ValueError("Truncated envelope.")
+            self._buf += chunk
+        out = bytes(self._buf[:n])
+        del self._buf[:n]
+        return out
+
+def decrypt_stream(chunks, passphrase: bytes):
+    """Decrypt a v4 envelope given as an iterable of byte chunks; yields plaintext bytes.
+
+    Input is consumed only up to the final record, so `chunks` may run on past the end
+    of the envelope (e.g. the rest of a frame). Memory use is bounded by the chunk size.
+    """
+    reader = _ByteReader(chunks)
+    header = reader.read_exact(STREAM_HEADER_SIZE)
+    if header[0] != STREAM_VERSION:
+        raise ValueError("Unsupported envelope version or empty data.")
+    N_log2, r, p = header[1], header[2], header[3]
+    salt = header[4:20]
+    prefix = header[20:27]
+    chunk_size = int.from_bytes(header[27:31], "big")
+
+    key = derive_key(passphrase, salt, N_log2, r, p)
+    decompressor = zlib.decompressobj()
+
+    counter = 0
+    while True:
+        word = int.from_bytes(reader.read_exact(4), "big")
+        last = bool(word & LAST_RECORD_FLAG)
+        ct_len = word & ~LAST_RECORD_FLAG
+        if ct_len > chunk_size:
+            raise ValueError("Corrupt envelope: record larger than chunk size.")
+        ct = reader.read_exact(ct_len)
+        tag = reader.read_exact(16)
+
+        cipher = AES.new(key, AES.MODE_GCM, nonce=_record_nonce(prefix, counter, last))
+        cipher.update(header)
+        with metrics.timer(metrics.AEAD, len(ct)):
+            data = cipher.decrypt_and_verify(ct, tag)
+        while data:
+            with metrics.timer(metrics.COMPRESS, len(data)):
+                out = decompressor.decompress(data, OUTPUT_CHUNK)
+            if out:
+                yield out
+            data = decompressor.unconsumed_tail
+        if last:
+            break
+        counter += 1
+
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+    if not decompressor.eof:
+        raise ValueError("Corrupt envelope: compressed stream is incomplete.")
+
+def decrypt_envelope(data: bytes, passphrase: bytes) -> bytes:
+    """Decrypt a raw (binary) v3/v4/v5 envelope; returns the plaintext bytes."""
+    if data and data[0] == STREAM_VERSION:
+        return b"".join(decrypt_stream([data], passphrase))
+    if not data or data[0] not in (3, CODEC_VERSION):
         raise ValueError("Unsupported envelope version or empty data.")
 
     # Parse envelope
+    head_len = 4 if data[0] == 3 else 5
     N_log2 = data[1]
     r = data[2]
     p = data[3]
-    salt  = data[4:20]
-    nonce = data[20:32]
-    tag   = data[32:48]
-    ct    = data[48:]
+    codec = "zlib"
+    if data[0] == CODEC_VERSION:
+        codec = {v: k for k, v in CODECS.items()}.get(data[4])
+        if codec is None:
+            raise ValueError(f"Unknown codec id: {data[4]}")
+    salt  = data[head_len:head_len + 16]
+    nonce = data[head_len + 16:head_len + 28]
+    tag   = data[head_len + 28:head_len + 44]
+    ct    = data[head_len + 44:]
 
-    # Derive key with scrypt using stored params
-    key = scrypt(passphrase, salt, key_len=32, N=1 << N_log2, r=r, p=p)
+    # Derive key with scrypt using stored params (cached per passphrase/salt/params)
+    key = derive_key(passphrase, salt, N_log2, r, p)
 
     # AES-GCM verify + decrypt
     cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    pt = cipher.decrypt_and_verify(ct, tag)
-    return zlib.decompress(pt).decode("utf-8")
+    if data[0] == CODEC_VERSION:
+        cipher.update(data[:head_len])
+    with metrics.timer(metrics.AEAD, len(ct)):
+        pt = cipher.decrypt_and_verify(ct, tag)
+    return decompress_payload(pt, codec)
+
+def decrypt_message(token_b64: str, passphrase: bytes) -> str:
+    return decrypt_envelope(base64.b64decode(token_b64), passphrase).decode("utf-8")
+
+def _decrypt_one(job):
+    token, passphrase = job
+    if isinstance(token, (bytes, bytearray)):
+        return decrypt_envelope(bytes(token), passphrase).decode("utf-8")
+    return decrypt_message(token, passphrase)
+
+def decrypt_batch(tokens, passphrase: bytes, workers: int = None) -> list:
+    """Decrypt many tokens under one passphrase, fanned out over a process pool.
+
+    Tokens sharing a salt (e.g. from Encryption.encrypt_batch with a session salt) only
+    pay for scrypt once per worker. Tokens may be base64 text or raw binary envelopes.
+    Results are returned in input order.
+    """
+    jobs = [(token, passphrase) for token in tokens]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        return [_decrypt_one(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(_decrypt_one, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
 
 def load_text(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read().strip()
 
+def load_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
 def save_text(s: str, path: str):
     with open(path, "w", encoding="utf-8") as f:
         f.write(s)
 
 if __name__ == "__main__":
-    token = load_text(EXTRACTED_ENCRYPTED_TXT)
+    # Log level and metrics sink come from $STEGO_LOG_LEVEL / $STEGO_METRICS
+    metrics.configure()
     pw = get_passphrase()
-    msg = decrypt_message(token, pw)
+    if BINARY_MODE and os.path.exists(EXTRACTED_ENCRYPTED_BIN):
+        msg = decrypt_envelope(load_bytes(EXTRACTED_ENCRYPTED_BIN), pw).decode("utf-8")
+    else:
+        msg = decrypt_message(load_text(EXTRACTED_ENCRYPTED_TXT), pw)
     save_text(msg, DECRYPTED_MESSAGE_TXT)
-    print(f"✅ Decrypted message saved to: {DECRYPTED_MESSAGE_TXT}")
+    log.info(f"✅ Decrypted message saved to: {DECRYPTED_MESSAGE_TXT}")
+    metrics.report("decryption")
@@ -1,12 +1,18 @@
 # Encryption.py — Passphrase + scrypt KDF + AES-GCM (no biometrics, no key file)
-import os, base64, zlib
+import os, base64, bz2, hashlib, lzma, threading, zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from Crypto.Cipher import AES
 from Crypto.Protocol.KDF import scrypt
 from Crypto.Random import get_random_bytes
 
+import metrics
+from metrics import log
+
 # --- Paths (edit if your project lives elsewhere) ---
 PROJECT_DIR = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography"
 ENCRYPTED_MESSAGE_TXT = os.path.join(PROJECT_DIR, "encrypted_message.txt")
+ENCRYPTED_MESSAGE_BIN = os.path.join(PROJECT_DIR, "encrypted_message.bin")
 PLAINTEXT_FILE = os.path.join(PROJECT_DIR, "message.txt")   # optional; if exists, we'll read from it
 PASS_FILE = os.path.join(PROJECT_DIR, "pass.txt")           # optional; plain-text passphrase file
 PASS_ENV = "STEGO_PASS"                                     # optional; env var for passphrase
@@ -17,6 +23,36 @@ N_LOG2 = 15
 R = 8
 P = 1
 
+# --- Payload framing ---
+# Binary mode embeds the raw envelope bytes; text mode embeds its base64 (33% larger).
+BINARY_MODE = True
+ENVELOPE_VERSIONS = (3, 4, 5)
+
+# --- Inner payload compression ---
+# zlib envelopes keep the v3 layout (readable by older Decryption.py); any other codec
+# uses v5: [ver(0x05) | N_log2(1B) | r(1B) | p(1B) | codec(1B) | salt(16B) | nonce(12B) | tag(16B) | ct]
+# with the 5 leading bytes authenticated as AAD.
+CODECS = {"zlib": 0, "lzma": 1, "bz2": 2, "none": 3}
+CODEC = "zlib"
+COMPRESSION_LEVEL = 6
+CODEC_VERSION = 5
+
+# --- Derived-key cache: (sha256(passphrase), salt, N_log2, r, p) -> key, LRU-bounded ---
+KDF_CACHE_SIZE = 64
+_kdf_cache = OrderedDict()
+_kdf_lock = threading.Lock()
+
+# --- Streaming envelope (v4): fixed-size, independently authenticated chunks ---
+# Header: [ver(0x04) | N_log2(1B) | r(1B) | p(1B) | salt(16B) | nonce_prefix(7B) | chunk_size(4B)]
+# Record: [last<<31 | ct_len (4B) | ct | tag(16B)]   — ct_len <= chunk_size
+# Each record is AES-GCM with nonce = nonce_prefix | counter(4B) | last(1B) and the header
+# as AAD, so records cannot be reordered, dropped, truncated or moved between envelopes.
+# The plaintext is zlib-compressed as a stream before chunking.
+STREAM_VERSION = 4
+STREAM_HEADER_SIZE = 4 + 16 + 7 + 4
+CHUNK_SIZE = 64 * 1024
+LAST_RECORD_FLAG = 0x80000000
+
 def get_passphrase() -> bytes:
     # 1) Environment variable
     pw = os.environ.get(PASS_ENV)
@@ -35,28 +71,176 @@ def load_plaintext() -> str:
             return f.read()
     return "This is a test message hidden in the video."*100
 
-def encrypt_message(plaintext: str, passphrase: bytes) -> str:
-    # Derive 256-bit key with scrypt
-    salt = get_random_bytes(16)
-    key = scrypt(passphrase, salt, key_len=32, N=1 << N_LOG2, r=R, p=P)
+def derive_key(passphrase: bytes, salt: bytes, n_log2: int = N_LOG2, r: int = R, p: int = P) -> bytes:
+    # Derive 256-bit key with scrypt; repeated (passphrase, salt, params) hit the LRU cache
+    cache_key = (hashlib.sha256(passphrase).digest(), bytes(salt), n_log2, r, p)
+    with _kdf_lock:
+        key = _kdf_cache.get(cache_key)
+        if key is not None:
+            _kdf_cache.move_to_end(cache_key)
+            metrics.incr("kdf_cache_hits")
+            return key
+
+    with metrics.timer(metrics.KDF):
+        key = scrypt(passphrase, salt, key_len=32, N=1 << n_log2, r=r, p=p)
+    with _kdf_lock:
+        _kdf_cache[cache_key] = key
+        while len(_kdf_cache) > KDF_CACHE_SIZE:
+            _kdf_cache.popitem(last=False)
+    return key
+
+def clear_kdf_cache():
+    with _kdf_lock:
+        _kdf_cache.clear()
+
+def new_session_salt() -> bytes:
+    # Reusing one salt for a batch of messages lets every message after the first skip
+    # scrypt. Each message still gets its own random GCM nonce.
+    return get_random_bytes(16)
+
+def compress_payload(data: bytes, codec: str = CODEC, level: int = COMPRESSION_LEVEL) -> bytes:
+    with metrics.timer(metrics.COMPRESS, len(data)):
+        return _compress(data, codec, level)
+
+def _compress(data: bytes, codec: str, level: int) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "lzma":
+        return lzma.compress(data, preset=level)
+    if codec == "bz2":
+        return bz2.compress(data, max(1, level))
+    if codec == "none":
+        return bytes(data)
+    raise ValueError(f"Unknown codec: {codec!r} (expected one of {sorted(CODECS)})")
+
+def decompress_payload(data: bytes, codec: str) -> bytes:
+    with metrics.timer(metrics.COMPRESS, len(data)):
+        return _decompress(data, codec)
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    if codec == "bz2":
+        return bz2.decompress(data)
+    if codec == "none":
+        return bytes(data)
+    raise ValueError(f"Unknown codec: {codec!r}")
+
+def encrypt_envelope(plaintext: bytes, passphrase: bytes, salt: bytes = None,
+                     codec: str = CODEC, level: int = COMPRESSION_LEVEL) -> bytes:
+    # Derive 256-bit key with scrypt (fresh salt unless a session salt is given)
+    salt = salt if salt is not None else get_random_bytes(16)
+    key = derive_key(passphrase, salt)
 
     # AEAD: AES-GCM
     nonce = get_random_bytes(12)
-    pt = zlib.compress(plaintext.encode("utf-8"))
+    pt = compress_payload(plaintext, codec, level)
     cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    ct, tag = cipher.encrypt_and_digest(pt)
+    if codec == "zlib":
+        # Envelope: [ver(0x03) | N_log2(1B) | r(1B) | p(1B) | salt(16B) | nonce(12B) | tag(16B) | ct]
+        head = b"\x03" + bytes([N_LOG2, R, P])
+    else:
+        head = bytes([CODEC_VERSION, N_LOG2, R, P, CODECS[codec]])
+        cipher.update(head)
+    with metrics.timer(metrics.AEAD, len(pt)):
+        ct, tag = cipher.encrypt_and_digest(pt)
+    return head + salt + nonce + tag + ct
 
-    # Envelope: [ver(0x03) | N_log2(1B) | r(1B) | p(1B) | salt(16B) | nonce(12B) | tag(16B) | ct]
-    blob = b"\x03" + bytes([N_LOG2, R, P]) + salt + nonce + tag + ct
+def encrypt_message(plaintext: str, passphrase: bytes, salt: bytes = None) -> str:
+    blob = encrypt_envelope(plaintext.encode("utf-8"), passphrase, salt)
     return base64.b64encode(blob).decode("utf-8")
 
+def _record_nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    return prefix + counter.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+def encrypt_stream(chunks, passphrase: bytes, chunk_size: int = CHUNK_SIZE, salt: bytes = None):
+    """Encrypt an iterable of plaintext byte chunks; yields the v4 envelope piece by piece.
+
+    Memory use is bounded by `chunk_size`, whatever the total size of the plaintext.
+    """
+    if not 0 < chunk_size < LAST_RECORD_FLAG:
+        raise ValueError("chunk_size out of range.")
+    salt = salt if salt is not None else get_random_bytes(16)
+    key = derive_key(passphrase, salt)
+    prefix = get_random_bytes(7)
+    header = bytes([STREAM_VERSION, N_LOG2, R, P]) + salt + prefix + chunk_size.to_bytes(4, "big")
+    yield header
+
+    counter = 0
+    def seal(block, last):
+        cipher = AES.new(key, AES.MODE_GCM, nonce=_record_nonce(prefix, counter, last))
+        cipher.update(header)
+        with metrics.timer(metrics.AEAD, len(block)):
+            ct, tag = cipher.encrypt_and_digest(bytes(block))
+        word = len(ct) | (LAST_RECORD_FLAG if last else 0)
+        return word.to_bytes(4, "big") + ct + tag
+
+    compressor = zlib.compressobj()
+    pending = bytearray()
+    for chunk in chunks:
+        with metrics.timer(metrics.COMPRESS, len(chunk)):
+            pending += compressor.compress(chunk)
+        while len(pending) > chunk_size:
+            yield seal(pending[:chunk_size], False)
+            del pending[:chunk_size]
+            counter += 1
+    pending += compressor.flush()
+    while len(pending) > chunk_size:
+        yield seal(pending[:chunk_size], False)
+        del pending[:chunk_size]
+        counter += 1
+    yield seal(pending, True)
+
+def _encrypt_one(job):
+    plaintext, passphrase, salt, binary = job
+    if binary:
+        return encrypt_envelope(plaintext.encode("utf-8"), passphrase, salt)
+    return encrypt_message(plaintext, passphrase, salt)
+
+def encrypt_batch(plaintexts, passphrase: bytes, session_salt: bytes = None, workers: int = None,
+                  binary: bool = False) -> list:
+    """Encrypt many messages under one passphrase, fanned out over a process pool.
+
+    Without `session_salt` every message gets its own salt (and its own scrypt run, in
+    parallel). With one, each worker derives the key once and reuses it from its cache.
+    Results (base64 tokens, or raw envelopes if `binary`) are returned in input order.
+    """
+    jobs = [(plaintext, passphrase, session_salt, binary) for plaintext in plaintexts]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        return [_encrypt_one(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(_encrypt_one, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+def iter_file_chunks(path: str, chunk_size: int = CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
 def save_text(s: str, path: str):
     with open(path, "w", encoding="utf-8") as f:
         f.write(s)
 
+def save_bytes(b: bytes, path: str):
+    with open(path, "wb") as f:
+        f.write(b)
+
 if __name__ == "__main__":
+    # Log level and metrics sink come from $STEGO_LOG_LEVEL / $STEGO_METRICS
+    metrics.configure()
     plaintext = load_plaintext()
     pw = get_passphrase()
-    token = encrypt_message(plaintext, pw)
-    save_text(token, ENCRYPTED_MESSAGE_TXT)
-    print(f"✅ Encrypted message saved to: {ENCRYPTED_MESSAGE_TXT}")
+    if BINARY_MODE:
+        blob = encrypt_envelope(plaintext.encode("utf-8"), pw, codec=CODEC, level=COMPRESSION_LEVEL)
+        save_bytes(blob, ENCRYPTED_MESSAGE_BIN)
+        log.info(f"✅ Encrypted message saved to: {ENCRYPTED_MESSAGE_BIN}")
+    else:
+        token = encrypt_message(plaintext, pw)
+        save_text(token, ENCRYPTED_MESSAGE_TXT)
+        log.info(f"✅ Encrypted message saved to: {ENCRYPTED_MESSAGE_TXT}")
+    metrics.report("encryption")
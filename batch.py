@@ -0,0 +1,330 @@
+# batch.py — Run many (cover video, payload) embed jobs across a process pool
+# Jobs come from a JSON-lines file, one object per line:
+#   {"id": "clip1", "video": "covers/clip1.mov", "payload": "secrets/a.txt",
+#    "output": "out/clip1.mkv", "passphrase_env": "CLIP1_PASS"}
+# Fields:
+#   video, output        cover video and lossless stego video (required)
+#   payload | message    plaintext file, or inline text (one of them is required)
+#   passphrase_env | passphrase_file
+#                        where the passphrase comes from; default: Encryption.get_passphrase()
+#                        (STEGO_PASS / pass.txt / prompt), resolved once up front
+#   id                   label for the report (default: line number)
+#   stream               true: chunked v4 envelope, constant memory for huge payloads
+#   codec, level, lsb_depth, channels ("bgr"), frame_rate
+#   verify               true: extract + decrypt the output and compare with the plaintext
+#   memory_limit_mb      per-job address-space limit (overrides --memory_limit_mb)
+# Relative paths are resolved against the job file's folder. Every job runs in a fresh
+# worker process (so limits and peak memory are per job). Jobs that failed for lack of
+# memory or on an I/O error, or whose worker died, are retried; other failures are final.
+import argparse
+import errno
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource  # POSIX only; memory limits are not enforced elsewhere
+except ImportError:
+    resource = None
+
+import metrics
+from metrics import log
+from Decryption import decrypt_envelope
+from Encryption import CODEC, CODECS, COMPRESSION_LEVEL, encrypt_envelope, get_passphrase
+from embed_msg import stream_embed_video
+from extract_modified_frames import extract_payload_from_video_file
+from lsb import check_layout, parse_channels
+from pipeline import encrypt_and_embed_file, extract_and_decrypt_file
+
+MB = 1024 * 1024
+# How allocation failures under RLIMIT_AS surface when they are not a MemoryError:
+# pycryptodome's scrypt (error 2 = out of memory), OpenCV and the dynamic loader
+ALLOCATION_FAILURES = ("Error 2 while running scrypt", "Insufficient memory", "Failed to allocate",
+                       "failed to map segment")
+# ProcessPoolExecutor(max_tasks_per_child=...) needs Python 3.11; older versions run each
+# job on a one-process pool of its own instead
+RECYCLING_POOL = sys.version_info >= (3, 11)
+PATH_FIELDS = ("video", "output", "payload", "passphrase_file")
+
+# Function to read and validate a JSON-lines job file. Returns (jobs, invalid) where
+# invalid jobs carry an "error" and are reported without being run.
+def load_jobs(job_file):
+    base = os.path.dirname(os.path.abspath(job_file))
+    jobs, invalid = [], []
+    with open(job_file, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                invalid.append({"id": f"line{line_no}", "status": "invalid", "error": f"Bad JSON: {e}"})
+                continue
+            job.setdefault("id", f"line{line_no}")
+            for field in PATH_FIELDS:
+                if job.get(field):
+                    job[field] = os.path.join(base, os.path.expanduser(job[field]))
+            error = _validate(job)
+            if error:
+                invalid.append({"id": job["id"], "status": "invalid", "error": error})
+            else:
+                jobs.append(job)
+    return jobs, invalid
+
+def _validate(job):
+    for field in ("video", "output"):
+        if not job.get(field):
+            return f"Missing {field!r}"
+    if ("payload" in job) == ("message" in job):
+        return "Exactly one of 'payload' or 'message' is required"
+    if job.get("stream") and "message" in job:
+        return "'stream' jobs need a 'payload' file"
+    if job.get("codec", CODEC) not in CODECS:
+        return f"Unknown codec {job['codec']!r}"
+    try:
+        check_layout(job.get("lsb_depth", 1), parse_channels(job.get("channels", "b")))
+    except (TypeError, ValueError) as e:
+        return str(e)
+    for field in ("video", "payload", "passphrase_file"):
+        if job.get(field) and not os.path.isfile(job[field]):
+            return f"{field} not found: {job[field]}"
+    return None
+
+def _apply_memory_limit(limit_mb):
+    # Lowers the soft address-space limit of this (single-job) worker process
+    if not limit_mb or resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = int(limit_mb * MB)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+# Function to tell whether `error` is an allocation that failed under the job's memory limit
+def _hit_memory_limit(error, limit_mb):
+    if isinstance(error, MemoryError):
+        return True
+    if not limit_mb:
+        return False
+    if isinstance(error, OSError) and error.errno == errno.ENOMEM:
+        return True
+    return any(marker in str(error) for marker in ALLOCATION_FAILURES)
+
+def _resolve_passphrase(job):
+    if job.get("passphrase_env"):
+        value = os.environ.get(job["passphrase_env"])
+        if not value:
+            raise ValueError(f"Environment variable {job['passphrase_env']} is not set")
+        return value.encode("utf-8")
+    if job.get("passphrase_file"):
+        with open(job["passphrase_file"], "r", encoding="utf-8") as f:
+            return f.read().strip().encode("utf-8")
+    return job["default_passphrase"]
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _embed(job, passphrase):
+    layout = dict(lsb_depth=job.get("lsb_depth", 1), channels=parse_channels(job.get("channels", "b")))
+    os.makedirs(os.path.dirname(os.path.abspath(job["output"])), exist_ok=True)
+
+    if job.get("stream"):
+        frames = encrypt_and_embed_file(job["video"], job["payload"], passphrase, job["output"],
+                                        frame_rate=job.get("frame_rate"), **layout)
+        payload_bytes = os.path.getsize(job["payload"])
+        if job.get("verify"):
+            with tempfile.TemporaryDirectory() as tmp:
+                check = os.path.join(tmp, "payload")
+                extract_and_decrypt_file(job["output"], passphrase, check)
+                if _file_sha256(check) != _file_sha256(job["payload"]):
+                    raise ValueError("Verification failed: extracted payload differs")
+        return frames, payload_bytes
+
+    if "payload" in job:
+        with open(job["payload"], "rb") as f:
+            plaintext = f.read()
+    else:
+        plaintext = job["message"].encode("utf-8")
+    envelope = encrypt_envelope(plaintext, passphrase, codec=job.get("codec", CODEC),
+                                level=job.get("level", COMPRESSION_LEVEL))
+    frames = stream_embed_video(job["video"], envelope, job["output"], frame_rate=job.get("frame_rate"), **layout)
+    if job.get("verify"):
+        if decrypt_envelope(extract_payload_from_video_file(job["output"]), passphrase) != plaintext:
+            raise ValueError("Verification failed: extracted payload differs")
+    return frames, len(plaintext)
+
+def run_job(job):
+    """Run one job in this worker process; returns a result dict and never raises.
+
+    Failed results carry `retryable`: true for memory and I/O errors, which another
+    attempt may get past, false for anything that would just fail again.
+    """
+    metrics.reset()
+    start = time.perf_counter()
+    limit_mb = job.get("memory_limit_mb")
+    result = {"id": job["id"], "attempt": job["attempt"], "output": job["output"]}
+    try:
+        _apply_memory_limit(limit_mb)
+        frames, payload_bytes = _embed(job, _resolve_passphrase(job))
+        result.update(status="ok", frames=frames, payload_bytes=payload_bytes)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if _hit_memory_limit(e, limit_mb):
+            error = f"MemoryError: over the {limit_mb} MB limit ({error})" if limit_mb else error
+            result.update(status="failed", error=error, retryable=True)
+        else:
+            result.update(status="failed", error=error, retryable=isinstance(e, OSError))
+    seconds = time.perf_counter() - start
+    snapshot = metrics.snapshot()
+    result.update(seconds=round(seconds, 3), peak_rss_mb=snapshot["peak_rss_mb"],
+                  stages={name: s["seconds"] for name, s in snapshot["stages"].items()})
+    if result.get("frames"):
+        result["frames_per_s"] = round(result["frames"] / seconds, 2)
+    return result
+
+def run_jobs(jobs, workers=None, retries=1, memory_limit_mb=None):
+    """Schedule `jobs` on a pool of `workers` processes; returns one result per job.
+
+    A job that failed for lack of memory or on an I/O error is re-queued up to `retries`
+    times. If a worker dies outright (e.g. it was killed by the OS), the pool is rebuilt
+    and every job it was running is retried.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue = deque(dict(job, attempt=1, memory_limit_mb=job.get("memory_limit_mb", memory_limit_mb))
+                  for job in jobs)
+    results = []
+    single_pools = {}   # future -> its one-job pool (without RECYCLING_POOL)
+
+    def new_pool():
+        # One job per process: per-job memory limits and peak RSS, nothing leaks across jobs
+        if RECYCLING_POOL:
+            return ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1)
+        return None
+
+    def submit(job):
+        if pool is not None:
+            return pool.submit(run_job, job)
+        single = ProcessPoolExecutor(max_workers=1)
+        future = single.submit(run_job, job)
+        single_pools[future] = single
+        return future
+
+    def collect(future, job):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            return {"id": job["id"], "attempt": job["attempt"], "status": "failed", "retryable": True,
+                    "error": "Worker process died (out of memory or killed?)"}
+        finally:
+            if future in single_pools:
+                single_pools.pop(future).shutdown(wait=True)
+
+    def finish(job, result):
+        metrics.emit("job", **result)
+        if result["status"] == "ok" or not result.get("retryable") or job["attempt"] > retries:
+            level = log.info if result["status"] == "ok" else log.error
+            level(f"{'✅' if result['status'] == 'ok' else '❌'} {job['id']}: {result['status']}"
+                  f" in {result.get('seconds', 0):.1f} s" + (f" ({result['error']})" if "error" in result else ""))
+            results.append(result)
+        else:
+            log.warning(f"Retrying {job['id']} (attempt {job['attempt'] + 1}): {result['error']}")
+            queue.append(dict(job, attempt=job["attempt"] + 1))
+
+    pool = new_pool()
+    in_flight = {}
+    try:
+        while queue or in_flight:
+            while queue and len(in_flight) < workers:
+                job = queue.popleft()
+                in_flight[submit(job)] = job
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                job = in_flight.pop(future)
+                broken = broken or isinstance(future.exception(), BrokenProcessPool)
+                finish(job, collect(future, job))
+            if broken and pool is not None:
+                # The remaining in-flight futures fail too; collect them, then start over
+                for future, job in list(in_flight.items()):
+                    wait([future])
+                    finish(job, collect(future, job))
+                in_flight.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = new_pool()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        for single in single_pools.values():
+            single.shutdown(wait=True)
+    return results
+
+def summarize(results, seconds):
+    ok = [r for r in results if r["status"] == "ok"]
+    frames = sum(r.get("frames", 0) for r in ok)
+    return {
+        "jobs": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "seconds": round(seconds, 3),
+        "jobs_per_min": round(len(ok) * 60 / seconds, 2) if seconds > 0 else None,
+        "frames": frames,
+        "frames_per_s": round(frames / seconds, 2) if seconds > 0 else None,
+        "payload_bytes": sum(r.get("payload_bytes", 0) for r in ok),
+        "results": results,
+    }
+
+def print_summary(summary):
+    log.info(f"{'job':<24} {'status':<8} {'tries':>5} {'seconds':>8} {'frames':>7} {'peak MB':>8}")
+    for r in summary["results"]:
+        peak = r.get("peak_rss_mb")
+        log.info(f"{str(r['id'])[:24]:<24} {r['status']:<8} {r.get('attempt', 0):>5} {r.get('seconds', 0):>8.1f} "
+                 f"{r.get('frames', 0):>7} {peak if peak is not None else '-':>8}")
+    log.info(f"{summary['ok']}/{summary['jobs']} jobs ok, {summary['frames']} frames in {summary['seconds']:.1f} s "
+             f"({summary['jobs_per_min']} jobs/min, {summary['frames_per_s']} frames/s)")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Encrypt and embed a queue of (video, payload) jobs in parallel")
+    ap.add_argument("job_file", help="JSON-lines job file (see the header of batch.py)")
+    ap.add_argument("--workers", type=int, default=None, help="Parallel jobs (default: all cores)")
+    ap.add_argument("--retries", type=int, default=1, help="Extra attempts for a failed job")
+    ap.add_argument("--memory_limit_mb", type=float, default=None,
+                    help="Default per-job address-space limit in MB (POSIX only)")
+    ap.add_argument("--report", default=None, help="Write the JSON summary report here")
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args(argv)
+    metrics.configure_from_args(args)
+
+    jobs, invalid = load_jobs(args.job_file)
+    for r in invalid:
+        log.error(f"❌ {r['id']}: {r['error']}")
+    if any(not (job.get("passphrase_env") or job.get("passphrase_file")) for job in jobs):
+        default_passphrase = get_passphrase()
+        jobs = [dict(job, default_passphrase=default_passphrase) for job in jobs]
+    if args.memory_limit_mb and resource is None:
+        log.warning("Memory limits are not supported on this platform; running without them.")
+
+    log.info(f"🚀 Running {len(jobs)} jobs on {args.workers or os.cpu_count() or 1} workers...")
+    start = time.perf_counter()
+    results = run_jobs(jobs, args.workers, args.retries, args.memory_limit_mb)
+    summary = summarize(invalid + results, time.perf_counter() - start)
+    print_summary(summary)
+    metrics.emit("batch_summary", **{k: v for k, v in summary.items() if k != "results"})
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
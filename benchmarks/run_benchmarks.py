@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py — Reproducible benchmarks for the hot paths
+- Generates synthetic frames (720p / 1080p / 4K) and payloads locally, seeded.
+- Times embed/extract (classic + masked), mask scoring, PNG write/read and scrypt.
+- Each benchmark runs in a fresh worker process so its peak RSS is its own.
+- Emits JSON (frames/s, MB/s, peak RSS) and compares against a stored baseline;
+  exits with status 1 if any benchmark regressed beyond --tolerance.
+
+Usage:
+  python benchmarks/run_benchmarks.py                       # run + compare to baseline.json
+  python benchmarks/run_benchmarks.py --sizes 720p --quick  # fast smoke run
+  python benchmarks/run_benchmarks.py --save_baseline       # record a new baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "ml"))
+
+import cv2
+import numpy as np
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = {"720p": (720, 1280), "1080p": (1080, 1920), "4k": (2160, 3840)}
+SCRYPT_N_LOG2 = (14, 15, 16)
+SEED = 1234
+MB = 1024 * 1024
+MIN_DELTA_S = 0.001
+SCATTER_KEY = 0x5EED5EED5EED5EED   # fixed key for the scattered benchmarks (no scrypt)
+
+def synthetic_frame(shape, seed=SEED):
+    # Smooth gradient + noise + a few shapes: textured enough for realistic mask scores
+    # and PNG sizes, unlike pure noise.
+    H, W = shape
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:H, 0:W]
+    base = np.stack([(xx * 255 // max(W - 1, 1)), (yy * 255 // max(H - 1, 1)), ((xx + yy) % 256)], axis=-1)
+    noise = rng.integers(0, 24, size=(H, W, 3))
+    frame = np.clip(base + noise, 0, 255).astype(np.uint8)
+    for _ in range(8):
+        cx, cy, r = int(rng.integers(0, W)), int(rng.integers(0, H)), int(rng.integers(H // 20, H // 5))
+        cv2.circle(frame, (cx, cy), r, tuple(int(c) for c in rng.integers(0, 256, 3)), -1)
+    return frame
+
+def synthetic_payload(n_bytes, seed=SEED):
+    return np.random.default_rng(seed).integers(0, 256, n_bytes, dtype=np.uint8).tobytes()
+
+def synthetic_masks(shape, keep_ratio=0.25, seed=SEED):
+    # A different {0, 255} mask on every call, like consecutive frames of a clip, so
+    # per-mask caches (scatter.mask_rows) never hit
+    rng = np.random.default_rng(seed)
+    return lambda: np.where(rng.random(shape) < keep_ratio, 255, 0).astype(np.uint8)
+
+def _time(fn, repeat, setup=None):
+    # Best of `repeat`: the least noisy estimate of the code's own cost on a busy machine
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+# --- Benchmarks: each returns (seconds per frame/op, bytes processed per op or None) ---
+
+def bench_embed_message_in_frame(shape, repeat):
+    from embed_msg import embed_message_in_frame
+    frame = synthetic_frame(shape)
+    chunk = synthetic_payload(shape[0] * shape[1] // 8).hex()[: shape[0] * shape[1] // 8]
+    seconds = _time(lambda f: embed_message_in_frame(f, chunk), repeat, setup=frame.copy)
+    return seconds, len(chunk)
+
+def bench_extract_message_from_frame(shape, repeat):
+    from extract_modified_frames import extract_message_from_frame
+    frame = synthetic_frame(shape)
+    bits = shape[0] * shape[1]
+    seconds = _time(lambda _: extract_message_from_frame(frame, bits), repeat)
+    return seconds, bits // 8
+
+def bench_embed_bits_in_frame_masked(shape, repeat, scatter_key=None):
+    from embed_msg_masked import bytes_to_bits, embed_bits_in_frame
+    frame = synthetic_frame(shape)
+    next_mask = synthetic_masks(shape)   # 25% of pixels, like the default keep_ratio
+    bits = bytes_to_bits(synthetic_payload(shape[0] * shape[1] // 4 // 8))
+    seconds = _time(lambda state: embed_bits_in_frame(state[0], state[1], bits, 0, scatter_key=scatter_key),
+                    repeat, setup=lambda: (frame.copy(), next_mask()))
+    return seconds, bits.shape[0] // 8
+
+def bench_embed_bits_in_frame_masked_scattered(shape, repeat):
+    return bench_embed_bits_in_frame_masked(shape, repeat, SCATTER_KEY)
+
+def bench_embed_bytes_in_frame_scattered(shape, repeat):
+    # Full frame of blue LSBs in keyed order; the order itself is built once (untimed run)
+    from embed_msg import embed_bytes_in_frame
+    frame = synthetic_frame(shape)
+    data = synthetic_payload(shape[0] * shape[1] // 8)
+    embed_bytes_in_frame(frame.copy(), data, scatter_key=SCATTER_KEY)
+    seconds = _time(lambda f: embed_bytes_in_frame(f, data, scatter_key=SCATTER_KEY), repeat, setup=frame.copy)
+    return seconds, len(data)
+
+def bench_extract_bytes_from_frame_scattered(shape, repeat):
+    from extract_modified_frames import extract_bytes_from_frame
+    frame = synthetic_frame(shape)
+    bits = shape[0] * shape[1]
+    extract_bytes_from_frame(frame, bits, scatter_key=SCATTER_KEY)
+    seconds = _time(lambda _: extract_bytes_from_frame(frame, bits, scatter_key=SCATTER_KEY), repeat)
+    return seconds, bits // 8
+
+def bench_score_frame(shape, repeat):
+    from mask_generator import score_frame
+    gray = cv2.cvtColor(synthetic_frame(shape), cv2.COLOR_BGR2GRAY).astype(np.float32)
+    prev = cv2.cvtColor(synthetic_frame(shape, SEED + 1), cv2.COLOR_BGR2GRAY).astype(np.float32)
+    seconds = _time(lambda _: score_frame(gray, prev), repeat)
+    return seconds, shape[0] * shape[1]
+
+def bench_mask_from_score(shape, repeat):
+    from mask_generator import mask_from_score, score_frame
+    gray = cv2.cvtColor(synthetic_frame(shape), cv2.COLOR_BGR2GRAY).astype(np.float32)
+    score = score_frame(gray)
+    seconds = _time(lambda _: mask_from_score(score), repeat)
+    return seconds, shape[0] * shape[1]
+
+def bench_png_write(shape, repeat):
+    frame = synthetic_frame(shape)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "frame.png")
+        seconds = _time(lambda _: cv2.imwrite(path, frame), repeat)
+    return seconds, frame.nbytes
+
+def bench_png_read(shape, repeat):
+    frame = synthetic_frame(shape)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "frame.png")
+        cv2.imwrite(path, frame)
+        seconds = _time(lambda _: cv2.imread(path, cv2.IMREAD_COLOR), repeat)
+    return seconds, frame.nbytes
+
+def bench_scrypt(n_log2, repeat):
+    from Crypto.Protocol.KDF import scrypt
+    from Encryption import P, R
+    salt = synthetic_payload(16)
+    seconds = _time(lambda _: scrypt(b"benchmark passphrase", salt, key_len=32, N=1 << n_log2, r=R, p=P),
+                    max(1, repeat // 2))
+    return seconds, None
+
+FRAME_BENCHMARKS = {
+    "embed_message_in_frame": bench_embed_message_in_frame,
+    "extract_message_from_frame": bench_extract_message_from_frame,
+    "embed_bits_in_frame_masked": bench_embed_bits_in_frame_masked,
+    "embed_bits_in_frame_masked_scattered": bench_embed_bits_in_frame_masked_scattered,
+    "embed_bytes_in_frame_scattered": bench_embed_bytes_in_frame_scattered,
+    "extract_bytes_from_frame_scattered": bench_extract_bytes_from_frame_scattered,
+    "score_frame": bench_score_frame,
+    "mask_from_score": bench_mask_from_score,
+    "png_write": bench_png_write,
+    "png_read": bench_png_read,
+}
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+def _run_one(job):
+    name, param, repeat = job
+    if name == "scrypt":
+        seconds, n_bytes = bench_scrypt(param, repeat)
+    else:
+        seconds, n_bytes = FRAME_BENCHMARKS[name](SIZES[param], repeat)
+    return {
+        "seconds": seconds,
+        "per_s": 1.0 / seconds if seconds > 0 else None,
+        "mb_per_s": (n_bytes / MB) / seconds if n_bytes and seconds > 0 else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def run_benchmarks(sizes, names, repeat, scrypt_n_log2=SCRYPT_N_LOG2):
+    jobs = [(name, size, repeat) for size in sizes for name in names]
+    if "scrypt" in names:
+        jobs = [j for j in jobs if j[0] != "scrypt"] + [("scrypt", n, repeat) for n in scrypt_n_log2]
+    results = {}
+    for job in jobs:
+        key = f"{job[0]}@{job[1] if job[0] != 'scrypt' else 'N2^' + str(job[1])}"
+        # Fresh process per benchmark: isolated peak RSS, no warm caches from earlier runs
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results[key] = pool.submit(_run_one, job).result()
+        print(f"{key:<42} {results[key]['seconds'] * 1000:10.2f} ms", file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance, min_delta=MIN_DELTA_S):
+    """Return a list of regressions: benchmarks slower than baseline by more than `tolerance`.
+
+    Slowdowns smaller than `min_delta` seconds are ignored; at a few milliseconds per op,
+    scheduler jitter alone exceeds any sensible relative tolerance.
+    """
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        ratio = res["seconds"] / base["seconds"]
+        res["vs_baseline"] = round(ratio, 3)
+        if ratio > 1.0 + tolerance and res["seconds"] - base["seconds"] > min_delta:
+            regressions.append({"benchmark": key, "ratio": round(ratio, 3),
+                                "seconds": res["seconds"], "baseline_seconds": base["seconds"]})
+    return regressions
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark embed, extract, mask generation and crypto")
+    ap.add_argument("--sizes", default=",".join(SIZES), help=f"Comma-separated frame sizes ({', '.join(SIZES)})")
+    ap.add_argument("--only", default=None, help="Comma-separated benchmark names (default: all)")
+    ap.add_argument("--repeat", type=int, default=15, help="Timed repetitions per benchmark (best is reported)")
+    ap.add_argument("--quick", action="store_true", help="3 repetitions, scrypt at N=2^14 only")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--min_delta_ms", type=float, default=MIN_DELTA_S * 1000,
+                    help="Ignore slowdowns smaller than this many milliseconds per op")
+    ap.add_argument("--save_baseline", action="store_true", help="Write the results as the new baseline")
+    ap.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = ap.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        ap.error(f"unknown sizes: {unknown}")
+    names = list(FRAME_BENCHMARKS) + ["scrypt"]
+    if args.only:
+        names = [n.strip() for n in args.only.split(",") if n.strip()]
+    repeat = 3 if args.quick else args.repeat
+    scrypt_n = (14,) if args.quick else SCRYPT_N_LOG2
+
+    report = {"environment": environment(), "repeat": repeat,
+              "results": run_benchmarks(sizes, names, repeat, scrypt_n)}
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance,
+                                  args.min_delta_ms / 1000)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if regressions:
+        for r in regressions:
+            print(f"REGRESSION: {r['benchmark']} is {r['ratio']:.2f}x the baseline time", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# capacity.py — How many frames a payload needs for each bit layout
+# Classic streams need frames_needed(...) frames (stream header included). Masked streams
+# only use the pixels their masks keep, so pass --keep_ratio for an estimate of those.
+# --rs_nsym accounts for the Reed-Solomon parity of ECC streams (classic only).
+import argparse
+import os
+import sys
+
+import cv2
+
+import ecc
+from lsb import DEFAULT_LAYOUT, LAYOUTS, MAX_LSB_DEPTH, bits_per_pixel, format_channels, frame_capacity_bits
+from stream_header import ECC_PREFIX_SIZE, HEADER_SIZE, frames_needed
+
+# Function to read the frame shape (H, W) and frame count of a video
+def probe_video(video_path):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    try:
+        shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        return shape, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+def capacity_table(frame_shape, payload_length, frame_count=None, keep_ratio=None, max_depth=MAX_LSB_DEPTH,
+                   ecc_nsym=0):
+    """One row per layout: bytes per frame, frames needed and the saving vs. 1 blue bit.
+
+    With `keep_ratio`, capacity is estimated for masked embedding (that fraction of the
+    pixels carries payload); otherwise it is exact for the classic raster layout, with
+    `ecc_nsym` RS parity bytes per codeword if given.
+    """
+    def per_frame(lsb_depth, channels):
+        # (payload bytes per frame, bytes of stream prefix)
+        if keep_ratio is None:
+            raw = frame_capacity_bits(frame_shape, lsb_depth, channels) // 8
+            if ecc_nsym:
+                return ecc.data_capacity(raw, ecc_nsym), HEADER_SIZE + ECC_PREFIX_SIZE
+            return raw, HEADER_SIZE
+        pixels = int(frame_shape[0] * frame_shape[1] * keep_ratio)
+        prefix = 4 if (lsb_depth, channels) == DEFAULT_LAYOUT else HEADER_SIZE
+        return pixels * bits_per_pixel(lsb_depth, channels) // 8, prefix
+
+    def needed(lsb_depth, channels):
+        bytes_per_frame, prefix = per_frame(lsb_depth, channels)
+        if keep_ratio is None and ecc_nsym:
+            raw = frame_capacity_bits(frame_shape, lsb_depth, channels) // 8
+            return ecc.frames_needed(payload_length, raw, ecc_nsym, prefix)
+        if keep_ratio is None:
+            return frames_needed(payload_length, bytes_per_frame * 8)
+        return -(-(prefix + payload_length) // max(1, bytes_per_frame))
+
+    baseline = needed(*DEFAULT_LAYOUT)
+    rows = []
+    for lsb_depth, channels in sorted(LAYOUTS, key=lambda layout: (layout[0], bin(layout[1]).count("1"), layout[1])):
+        if lsb_depth > max_depth:
+            continue
+        frames = needed(lsb_depth, channels)
+        rows.append({
+            "lsb_depth": lsb_depth,
+            "channels": format_channels(channels),
+            "bytes_per_frame": per_frame(lsb_depth, channels)[0],
+            "frames_needed": frames,
+            "reduction": baseline / frames,
+            "fits": frame_count is None or frames <= frame_count,
+        })
+    return rows
+
+def print_table(rows, frame_count=None):
+    print(f"{'depth':>5} {'chans':>5} {'bytes/frame':>12} {'frames':>8} {'vs 1b':>7}")
+    for row in rows:
+        flag = "" if row["fits"] else "  (does not fit)"
+        print(f"{row['lsb_depth']:>5} {row['channels']:>5} {row['bytes_per_frame']:>12} "
+              f"{row['frames_needed']:>8} {row['reduction']:>6.1f}x{flag}")
+    if frame_count is not None:
+        print(f"Video has {frame_count} frames.")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Frames needed per LSB depth / channel set for a payload")
+    ap.add_argument("--video", default=None, help="Cover video (frame size and count are read from it)")
+    ap.add_argument("--width", type=int, default=None, help="Frame width (if no --video)")
+    ap.add_argument("--height", type=int, default=None, help="Frame height (if no --video)")
+    ap.add_argument("--frames", type=int, default=None, help="Available frames (if no --video)")
+    ap.add_argument("--message_file", default=None, help="Payload file (e.g. encrypted_message.bin)")
+    ap.add_argument("--payload_bytes", type=int, default=None, help="Payload size, instead of --message_file")
+    ap.add_argument("--keep_ratio", type=float, default=None,
+                    help="Estimate for masked embedding with this mask keep ratio (0..1)")
+    ap.add_argument("--max_depth", type=int, choices=range(1, MAX_LSB_DEPTH + 1), default=MAX_LSB_DEPTH,
+                    help="Only list layouts up to this LSB depth")
+    ap.add_argument("--rs_nsym", type=int, default=0,
+                    help="RS parity bytes per codeword of an ECC stream (0 = no ECC)")
+    args = ap.parse_args(argv)
+
+    if args.video:
+        frame_shape, frame_count = probe_video(args.video)
+    elif args.width and args.height:
+        frame_shape, frame_count = (args.height, args.width), args.frames
+    else:
+        ap.error("either --video or --width/--height is required")
+    if args.message_file:
+        payload_length = os.path.getsize(args.message_file)
+    elif args.payload_bytes is not None:
+        payload_length = args.payload_bytes
+    else:
+        ap.error("either --message_file or --payload_bytes is required")
+
+    print(f"Payload: {payload_length} bytes, frames: {frame_shape[1]}x{frame_shape[0]}")
+    if args.rs_nsym and args.keep_ratio is not None:
+        ap.error("--rs_nsym applies to classic streams only")
+    rows = capacity_table(frame_shape, payload_length, frame_count, args.keep_ratio, args.max_depth, args.rs_nsym)
+    print_table(rows, frame_count)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# ecc.py — Optional frame-local Reed-Solomon coding for the classic LSB stream
+# With FLAG_ECC set in the stream header, the byte after the header holds `nsym` and each
+# frame's share of the payload is RS-coded on its own: it is cut into codewords of up to
+# 255 bytes (255 - nsym data + nsym parity, the last one shortened), exactly as
+# reedsolo.RSCodec(nsym).encode() would, and no codeword spans two frames. A damaged frame
+# therefore only costs its own codewords, each of which corrects up to nsym / 2 bytes.
+#
+# reedsolo is pure Python (~1.5 ms per codeword), so encoding and the clean-stream check
+# are done here with numpy across all codewords of a frame at once; only codewords whose
+# parity does not match are handed to reedsolo for correction, optionally in a process pool.
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import metrics
+
+BLOCK_SIZE = 255         # RS codeword length over GF(2^8)
+DEFAULT_NSYM = 32        # parity bytes per codeword (corrects 16 byte errors)
+PRIM_POLY = 0x11D        # reedsolo's defaults: primitive polynomial, generator 2, fcr 0
+MIN_PARALLEL_BLOCKS = 32 # fewer damaged codewords than this are corrected in-process
+HELPER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "helper.json")
+
+# Function to read the RS parity length ("rs_nsym") from helper.json, if it has one
+def load_rs_nsym(path=HELPER_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("rs_nsym", DEFAULT_NSYM))
+    except (OSError, ValueError):
+        return DEFAULT_NSYM
+
+def check_nsym(nsym):
+    if not 2 <= nsym < BLOCK_SIZE - 1:
+        raise ValueError(f"rs_nsym must be between 2 and {BLOCK_SIZE - 2}.")
+
+# --- GF(2^8) tables ---
+
+def _gf_tables():
+    exp = np.zeros(512, dtype=np.int32)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= PRIM_POLY
+    exp[255:510] = exp[:255]
+    mul = np.zeros((256, 256), dtype=np.uint8)
+    nz = np.arange(1, 256)
+    mul[1:, 1:] = exp[log[nz][:, None] + log[nz][None, :]]
+    return exp, mul
+
+_GF_EXP, _GF_MUL = _gf_tables()
+_parity_tables = {}
+
+def _parity_table(nsym):
+    # (256, nsym) table: feedback byte times the generator polynomial's lower coefficients
+    table = _parity_tables.get(nsym)
+    if table is None:
+        gen = np.array([1], dtype=np.uint8)
+        for i in range(nsym):
+            # gen *= (x - 2^i)
+            shifted = np.append(gen, 0)
+            shifted[1:] ^= _GF_MUL[gen, _GF_EXP[i]]
+            gen = shifted
+        table = _parity_tables[nsym] = _GF_MUL[:, gen[1:]]
+    return table
+
+# --- Sizes ---
+
+def data_capacity(n_bytes, nsym):
+    """Payload bytes that fit in `n_bytes` of coded stream."""
+    full, rest = divmod(n_bytes, BLOCK_SIZE)
+    return full * (BLOCK_SIZE - nsym) + max(0, rest - nsym)
+
+def encoded_size(n_data, nsym):
+    """Coded length of `n_data` payload bytes."""
+    full, rest = divmod(n_data, BLOCK_SIZE - nsym)
+    return full * BLOCK_SIZE + (rest + nsym if rest else 0)
+
+# Function to count the frames a payload of `payload_length` bytes occupies when each frame
+# holds `bytes_per_frame` coded bytes and frame 0 starts with `prefix` raw bytes
+def frames_needed(payload_length, bytes_per_frame, nsym, prefix):
+    first = data_capacity(bytes_per_frame - prefix, nsym)
+    if payload_length <= first:
+        return 1
+    per_frame = data_capacity(bytes_per_frame, nsym)
+    return 1 + -(-(payload_length - first) // per_frame)
+
+# --- Encode / check ---
+
+def _split(data, nsym):
+    # (codewords, k) data matrix; the short last codeword is left-padded with zeros,
+    # which does not change its parity
+    k = BLOCK_SIZE - nsym
+    n_blocks = -(-len(data) // k)
+    matrix = np.zeros(n_blocks * k, dtype=np.uint8)
+    flat = np.frombuffer(bytes(data), dtype=np.uint8)
+    full = (len(data) // k) * k
+    matrix[:full] = flat[:full]
+    rest = len(data) - full
+    if rest:
+        matrix[-rest:] = flat[full:]
+    return matrix.reshape(n_blocks, k), rest
+
+def _parity(matrix, nsym):
+    # Systematic RS parity of each row (LFSR division by the generator, all rows at once)
+    table = _parity_table(nsym)
+    reg = np.zeros((matrix.shape[0], nsym), dtype=np.uint8)
+    for i in range(matrix.shape[1]):
+        feedback = matrix[:, i] ^ reg[:, 0]
+        reg[:, :-1] = reg[:, 1:]
+        reg[:, -1] = 0
+        reg ^= table[feedback]
+    return reg
+
+def encode(data, nsym):
+    """RS-code `data` into codewords of up to 255 bytes; same bytes as reedsolo's encode()."""
+    if not data:
+        return b""
+    with metrics.timer(metrics.ECC, len(data)):
+        matrix, rest = _split(data, nsym)
+        coded = np.concatenate([matrix, _parity(matrix, nsym)], axis=1)
+        if rest:
+            # Drop the zero padding of the shortened last codeword
+            last = coded[-1, BLOCK_SIZE - nsym - rest:]
+            return coded[:-1].tobytes() + last.tobytes()
+        return coded.tobytes()
+
+def _codewords(coded, n_data, nsym):
+    # Inverse of encode()'s layout: the (data matrix, received parity) of each codeword
+    k = BLOCK_SIZE - nsym
+    n_blocks = -(-n_data // k)
+    rest = n_data % k
+    flat = np.frombuffer(bytes(coded), dtype=np.uint8)
+    full_len = (n_blocks - (1 if rest else 0)) * BLOCK_SIZE
+    blocks = np.zeros((n_blocks, BLOCK_SIZE), dtype=np.uint8)
+    blocks[:full_len // BLOCK_SIZE] = flat[:full_len].reshape(-1, BLOCK_SIZE)
+    if rest:
+        blocks[-1, k - rest:] = flat[full_len:full_len + rest + nsym]
+    return blocks[:, :k], blocks[:, k:], rest
+
+# --- Correction (reedsolo, only for codewords that fail the check) ---
+
+def _correct(job):
+    import reedsolo
+    blocks, nsym = job
+    codec = reedsolo.RSCodec(nsym)
+    fixed = []
+    for block in blocks:
+        try:
+            fixed.append(bytes(codec.decode(block)[0]))
+        except reedsolo.ReedSolomonError:
+            fixed.append(None)
+    return fixed
+
+def correct_blocks(blocks, nsym, workers=1):
+    """RS-decode `blocks` (coded bytes each); None for the ones beyond repair."""
+    if workers and workers > 1 and len(blocks) >= MIN_PARALLEL_BLOCKS:
+        step = -(-len(blocks) // workers)
+        jobs = [(blocks[i:i + step], nsym) for i in range(0, len(blocks), step)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            return [fixed for part in pool.map(_correct, jobs) for fixed in part]
+    return _correct((blocks, nsym))
+
+def decode_frames(coded_frames, data_sizes, nsym, workers=1):
+    """Decode the coded share of each frame; returns the payload bytes of all frames.
+
+    Every codeword is checked at numpy speed; those whose parity does not match are
+    corrected with reedsolo (spread over `workers` processes). Raises ValueError naming
+    the frames that cannot be repaired.
+    """
+    checked = []
+    failing = []   # (frame, row, coded bytes)
+    with metrics.timer(metrics.ECC, sum(data_sizes)):
+        for index, (coded, n_data) in enumerate(zip(coded_frames, data_sizes)):
+            if n_data == 0:
+                checked.append(None)
+                continue
+            data, parity, rest = _codewords(coded, n_data, nsym)
+            bad = np.flatnonzero(np.any(_parity(data, nsym) != parity, axis=1))
+            for row in bad:
+                block = np.concatenate([data[row], parity[row]])
+                if rest and row == data.shape[0] - 1:
+                    block = block[BLOCK_SIZE - nsym - rest:]
+                failing.append((index, row, block.tobytes()))
+            checked.append((data, rest))
+
+    if failing:
+        with metrics.timer(metrics.ECC):
+            fixed = correct_blocks([block for _, _, block in failing], nsym, workers)
+        lost = sorted({index for (index, _, _), out in zip(failing, fixed) if out is None})
+        if lost:
+            raise ValueError(f"Uncorrectable ECC errors in frame(s) {lost}.")
+        for (index, row, _), out in zip(failing, fixed):
+            data, rest = checked[index]
+            data[row, data.shape[1] - len(out):] = np.frombuffer(out, dtype=np.uint8)
+        metrics.incr("ecc_blocks_corrected", len(failing))
+
+    out = bytearray()
+    for entry in checked:
+        if entry is None:
+            continue
+        data, rest = entry
+        flat = data.reshape(-1)
+        if rest:
+            out += flat[:-data.shape[1]].tobytes() + flat[-rest:].tobytes()
+        else:
+            out += flat.tobytes()
+    return bytes(out)
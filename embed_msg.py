@@ -1,154 +1,413 @@
 import cv2
+import itertools
 import os
+import queue
+import threading
+import time
 import numpy as np
 
+import ecc
+import metrics
+from metrics import log
+from extract_frames import (FRAME_EXTENSIONS, get_video_fps, iter_frame_files, iter_frames_from_folder,
+                            iter_video_frames, list_frame_files)
+from frame_writer import DEFAULT_PNG_COMPRESSION, FrameWriter
+from lsb import DEFAULT_LAYOUT, bits_per_pixel, check_layout, frame_capacity_bits, write_lsb_bits
+from scatter import frame_rows, scatter_lsbs
+from stream_header import (CHANNEL_BLUE, ECC_PREFIX_SIZE, FLAG_ECC, FLAG_SCATTERED, FLAG_STREAMED, HEADER_SIZE,
+                           frames_needed, pack_header)
+
+# Lossless codec for stego videos. Lossy codecs such as 'mp4v' destroy the LSB payload;
+# FFV1 round-trips every pixel exactly and is available in OpenCV's FFmpeg backend.
+LOSSLESS_FOURCC = 'FFV1'
+LOSSLESS_VIDEO_EXT = '.mkv'
+
 # Function to read the encrypted message from the file
 def load_encrypted_message(filename):
     with open(filename, 'r', encoding='utf-8') as file:
         return file.read().strip()
 
-# Function to embed the encrypted message into the frame
+# Function to read the encrypted payload: raw envelope bytes for a binary file (.bin),
+# base64 text otherwise
+def load_encrypted_payload(filename):
+    if filename.lower().endswith('.bin'):
+        with open(filename, 'rb') as file:
+            return file.read()
+    return load_encrypted_message(filename)
+
+# Function to get a flat, writable view of the blue channel of a BGR frame.
+# The frame must be C-contiguous so the view aliases the frame's own memory.
+def blue_channel_view(frame):
+    return frame.reshape(-1, frame.shape[2])[:, 0]
+
+# Vectorized embed engine: writes the bits of `data` (MSB first) into the LSBs of `frame`
+# in place, starting at bit `bit_offset` of the (lsb_depth, channels) layout (see lsb.py;
+# the default is one blue-channel bit per pixel in raster order). With `scatter_key` the
+# pixels are visited in that key's order instead (see scatter.py).
+# Bits that do not fit in the frame are dropped. Returns the number of bits written.
+def embed_bytes_in_frame(frame, data, bit_offset=0, lsb_depth=1, channels=CHANNEL_BLUE, scatter_key=None):
+    capacity = frame.shape[0] * frame.shape[1] * bits_per_pixel(lsb_depth, channels) - bit_offset
+    if capacity <= 0 or not data:
+        return 0
+
+    # Only unpack the bytes that can (at least partially) fit in this frame
+    data = data[:(capacity + 7) // 8]
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    write_n = min(bits.shape[0], capacity)
+
+    rows = frame_rows(frame.shape, scatter_key)
+    if (lsb_depth, channels) != DEFAULT_LAYOUT:
+        write_lsb_bits(frame.reshape(-1, frame.shape[2]), bits[:write_n], bit_offset, lsb_depth, channels, rows)
+        return write_n
+
+    if rows is not None:
+        scatter_lsbs(blue_channel_view(frame), bits[:write_n], bit_offset, scatter_key)
+        return write_n
+
+    target = blue_channel_view(frame)[bit_offset:bit_offset + write_n]
+    target &= 0xFE
+    target |= bits[:write_n]
+    return write_n
+
+# Function to embed the encrypted message into the frame.
+# Embeds in place (no per-frame copy) unless the frame is not C-contiguous.
 def embed_message_in_frame(frame, message_chunk):
-    message_bytes = message_chunk.encode('utf-8')
-    frame_array = np.array(frame)
-
-    index = 0
-    for byte in message_bytes:
-        for bit in range(8):
-            # Calculate the row and column based on the current bit index
-            bit_index = index * 8 + bit
-            row = bit_index // frame_array.shape[1]
-            col = bit_index % frame_array.shape[1]
-
-            if row >= frame_array.shape[0]:
-                # If we've reached the end of the frame, stop embedding
-                return frame_array
-
-            # Embed one bit into the blue channel LSB
-            frame_array[row, col][0] = (frame_array[row, col][0] & 0xFE) | ((byte >> (7 - bit)) & 0x01)
-
-        index += 1
-
+    frame_array = np.ascontiguousarray(frame)
+    embed_bytes_in_frame(frame_array, message_chunk.encode('utf-8'))
     return frame_array
 
-# Function to embed the message into the frames
-def embed_message_in_video(frames, message, output_folder):
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-        print(f"Created output folder: {output_folder}")
+# Function to build the byte stream that is written across the frames: the stream
+# header (payload length + per-frame layout) followed by the message bytes.
+def build_byte_stream(message, bytes_per_frame, header=True, lsb_depth=1, channels=CHANNEL_BLUE, flags=0):
+    data = message.encode('utf-8') if isinstance(message, str) else bytes(message)
+    if not header:
+        return data
+    if bytes_per_frame <= HEADER_SIZE:
+        raise ValueError("Frames are too small to hold the stream header.")
+    return pack_header(len(data), bytes_per_frame * 8, flags=flags, lsb_depth=lsb_depth, channels=channels) + data
+
+# Function to build the raw prefix of an RS-coded stream: the header (FLAG_ECC) and nsym
+def build_ecc_prefix(payload_length, bytes_per_frame, ecc_nsym, flags=0, lsb_depth=1, channels=CHANNEL_BLUE):
+    ecc.check_nsym(ecc_nsym)
+    prefix = pack_header(payload_length, bytes_per_frame * 8, flags=flags | FLAG_ECC,
+                         lsb_depth=lsb_depth, channels=channels) + bytes([ecc_nsym])
+    if ecc.data_capacity(bytes_per_frame - len(prefix), ecc_nsym) <= 0:
+        raise ValueError("Frames are too small to hold the stream header and an ECC codeword.")
+    return prefix
+
+# Generator that yields the bytes each frame carries, in frame order: the byte stream (see
+# build_byte_stream) cut into frame-sized pieces or, with `ecc_nsym`, the ECC prefix
+# followed by each frame's share of the message RS-coded on its own (see ecc.py). `flags`
+# are extra header flags (e.g. FLAG_SCATTERED).
+def iter_frame_chunks(message, bytes_per_frame, header=True, lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0,
+                      flags=0):
+    if not ecc_nsym:
+        data = memoryview(build_byte_stream(message, bytes_per_frame, header, lsb_depth, channels, flags))
+        for start in range(0, len(data), bytes_per_frame):
+            yield data[start:start + bytes_per_frame]
+        return
+
+    if not header:
+        raise ValueError("ECC needs the stream header.")
+    data = memoryview(message.encode('utf-8') if isinstance(message, str) else bytes(message))
+    prefix = build_ecc_prefix(len(data), bytes_per_frame, ecc_nsym, flags, lsb_depth, channels)
+    start = 0
+    while True:
+        capacity = ecc.data_capacity(bytes_per_frame - len(prefix), ecc_nsym)
+        yield prefix + ecc.encode(data[start:start + capacity], ecc_nsym)
+        start += capacity
+        prefix = b''
+        if start >= len(data):
+            return
+
+# Function to count the frames a message occupies (including the stream header)
+def count_frames_needed(message, frame_shape, header=True, lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0):
+    bytes_per_frame = frame_capacity_bits(frame_shape, lsb_depth, channels) // 8
+    length = len(message.encode('utf-8') if isinstance(message, str) else message)
+    if ecc_nsym:
+        return ecc.frames_needed(length, bytes_per_frame, ecc_nsym, HEADER_SIZE + ECC_PREFIX_SIZE)
+    if header:
+        return frames_needed(length, bytes_per_frame * 8)
+    return (length + bytes_per_frame - 1) // bytes_per_frame
+
+# Generator that embeds the message into a stream of frames, one frame at a time.
+# Frames past the end of the message are yielded unmodified. Works with any iterable
+# (a list, a folder reader or a cv2.VideoCapture reader), so frames never need to be
+# held in memory all at once. With header=True (default) frame 0 starts with a stream
+# header so the extractor needs no side-channel message length (nor the layout).
+# `lsb_depth` (1-4) and `channels` (CHANNEL_* bitmask) select the bit layout; deeper
+# layouts fit the same payload into proportionally fewer frames. With `ecc_nsym` (parity
+# bytes per codeword) each frame's share is Reed-Solomon coded (see ecc.py). With
+# `scatter_key` (see scatter.py) the bits are spread over each frame in that key's order.
+def embed_message_in_frames(frames, message, header=True, lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0,
+                            scatter_key=None):
+    check_layout(lsb_depth, channels)
+    if scatter_key is not None and not header:
+        raise ValueError("Scattered embedding needs the stream header.")
+    flags = FLAG_SCATTERED if scatter_key is not None else 0
+    chunks = None
 
-    # Calculate how many characters can be embedded per frame
-    chars_per_frame = (frames[0].shape[0] * frames[0].shape[1]) // 8
-    total_frames_needed = (len(message) + chars_per_frame - 1) // chars_per_frame
-
-    if total_frames_needed > len(frames):
+    for frame in frames:
+        if chunks is None:
+            # Calculate how many bytes can be embedded per frame
+            bytes_per_frame = frame_capacity_bits(frame.shape, lsb_depth, channels) // 8
+            chunks = iter_frame_chunks(message, bytes_per_frame, header, lsb_depth, channels, ecc_nsym, flags)
+
+        chunk = next(chunks, None)
+        if chunk is not None:
+            # Embed this frame's chunk of the stream in place
+            with metrics.timer(metrics.EMBED, len(chunk)):
+                frame = np.ascontiguousarray(frame)
+                embed_bytes_in_frame(frame, chunk, 0, lsb_depth, channels, scatter_key)
+            metrics.incr("frames_embedded")
+            metrics.incr("bytes_embedded", len(chunk))
+
+        yield frame
+
+    if chunks is None or next(chunks, None) is not None:
         raise ValueError("Not enough frames to embed the entire message.")
 
-    frame_count = 0
+# Generator that embeds a payload given as an iterable of byte chunks (e.g. the output of
+# Encryption.encrypt_stream) without ever holding the whole payload in memory. The total
+# length is not known up front, so frame 0 carries a FLAG_STREAMED header and the payload
+# itself must be self-delimiting. With `ecc_nsym` every frame is RS-coded on its own (see
+# ecc.py); the last one is zero-padded so the extractor can decode whole frames.
+def embed_stream_in_frames(frames, chunks, lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0, scatter_key=None):
+    check_layout(lsb_depth, channels)
+    flags = FLAG_STREAMED | (FLAG_SCATTERED if scatter_key is not None else 0)
+    chunks = iter(chunks)
+    pending = bytearray()
+    prefix = b''
+    exhausted = False
+    bytes_per_frame = None
 
     for frame in frames:
-        if frame_count * chars_per_frame < len(message):
-            # Determine the chunk of the message to embed in this frame
-            chunk = message[frame_count * chars_per_frame : (frame_count + 1) * chars_per_frame]
-            modified_frame = embed_message_in_frame(frame, chunk)
-            modified_frame_path = os.path.join(output_folder, f"modified_frame_{frame_count:04d}.png")
-            cv2.imwrite(modified_frame_path, modified_frame)
-            print(f"Embedded chunk into frame {frame_count} and saved as {modified_frame_path}.")
-        else:
-            # Save the remaining frames without modification
-            modified_frame_path = os.path.join(output_folder, f"modified_frame_{frame_count:04d}.png")
-            cv2.imwrite(modified_frame_path, frame)
-            print(f"Saved remaining frame {frame_count} without modification as {modified_frame_path}.")
-
-        frame_count += 1
-
-    print(f"Message embedding complete. Total frames processed: {frame_count}")
-
-# Function to combine frames into a video
-def combine_frames_to_video(frames_folder, output_video_path, frame_rate=30):
-    # Get sorted list of frame filenames
-    frame_files = sorted([
-        f for f in os.listdir(frames_folder) 
-        if f.lower().endswith('.png')
-    ])
-
-    if not frame_files:
-        raise ValueError("No frames found to create the video.")
-
-    # Read the first frame to get the frame size
-    first_frame_path = os.path.join(frames_folder, frame_files[0])
-    first_frame = cv2.imread(first_frame_path)
-    if first_frame is None:
-        raise ValueError(f"Unable to read the first frame: {first_frame_path}")
-
-    height, width, layers = first_frame.shape
-    frame_size = (width, height)
-
-    # Define the codec and create VideoWriter object
-    # 'mp4v' is a commonly used codec for MP4 files
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video_path, fourcc, frame_rate, frame_size)
+        if bytes_per_frame is None:
+            bytes_per_frame = frame_capacity_bits(frame.shape, lsb_depth, channels) // 8
+            if ecc_nsym:
+                prefix = build_ecc_prefix(0, bytes_per_frame, ecc_nsym, flags, lsb_depth, channels)
+            elif bytes_per_frame <= HEADER_SIZE:
+                raise ValueError("Frames are too small to hold the stream header.")
+            else:
+                pending += pack_header(0, bytes_per_frame * 8, flags=flags,
+                                       lsb_depth=lsb_depth, channels=channels)
+
+        # Pull just enough of the payload to fill this frame
+        take = ecc.data_capacity(bytes_per_frame - len(prefix), ecc_nsym) if ecc_nsym else bytes_per_frame
+        while not exhausted and len(pending) < take:
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                pending += chunk
+
+        if pending or prefix:
+            piece = pending[:take]
+            if ecc_nsym:
+                piece = prefix + ecc.encode(bytes(piece) + bytes(take - len(piece)), ecc_nsym)
+                prefix = b''
+            n_bytes = len(piece)
+            with metrics.timer(metrics.EMBED, n_bytes):
+                frame = np.ascontiguousarray(frame)
+                embed_bytes_in_frame(frame, piece, 0, lsb_depth, channels, scatter_key)
+            del pending[:take]
+            metrics.incr("frames_embedded")
+            metrics.incr("bytes_embedded", n_bytes)
+
+        yield frame
+
+    if pending or bytes_per_frame is None or any(chunks):
+        raise ValueError("Not enough frames to embed the entire message.")
 
-    print(f"Combining frames into video: {output_video_path}")
-    print(f"Frame size: {frame_size}, Frame rate: {frame_rate} FPS")
+# Function to embed the message into the frames. Frames are encoded and written by a
+# pooled FrameWriter (`workers` threads, PNG level `png_compression`, or fmt='npy').
+def embed_message_in_video(frames, message, output_folder, workers=None,
+                           png_compression=DEFAULT_PNG_COMPRESSION, fmt='png', header=True,
+                           lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0, scatter_key=None):
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+        log.info(f"Created output folder: {output_folder}")
 
-    for filename in frame_files:
-        frame_path = os.path.join(frames_folder, filename)
-        frame = cv2.imread(frame_path)
-        if frame is None:
-            print(f"Warning: Unable to read frame {filename}. Skipping.")
-            continue
+    # Fail early when the frame count is known up front
+    if hasattr(frames, '__len__') and len(frames) > 0:
+        if count_frames_needed(message, frames[0].shape, header, lsb_depth, channels, ecc_nsym) > len(frames):
+            raise ValueError("Not enough frames to embed the entire message.")
 
-        # Verify frame size consistency
-        if frame.shape[1] != width or frame.shape[0] != height:
-            print(f"Warning: Frame {filename} has a different size. Resizing to match the first frame.")
-            frame = cv2.resize(frame, frame_size)
+    frame_count = 0
 
-        out.write(frame)
-        print(f"Added frame {filename} to video.")
+    with FrameWriter(output_folder, workers=workers, png_compression=png_compression, fmt=fmt) as writer:
+        for frame in embed_message_in_frames(frames, message, header, lsb_depth, channels, ecc_nsym, scatter_key):
+            modified_frame_path = writer.write(f"modified_frame_{frame_count:04d}", frame)
+            log.debug(f"Queued frame {frame_count} for {modified_frame_path}.")
+            frame_count += 1
+
+    log.info(f"Message embedding complete. Total frames processed: {frame_count}")
+
+# Function to embed the message into a folder of frames. Only the frames that carry
+# payload are decoded, embedded and encoded; the remaining frames are passed through
+# untouched (`passthrough`='link' hard-links them, 'copy' copies the bytes), so the cost
+# scales with the payload size rather than with the length of the video.
+def embed_message_in_folder(frames_folder, message, output_folder, extensions=FRAME_EXTENSIONS,
+                            workers=None, png_compression=DEFAULT_PNG_COMPRESSION, fmt='png', header=True,
+                            lsb_depth=1, channels=CHANNEL_BLUE, passthrough='link', ecc_nsym=0, scatter_key=None):
+    frame_paths = list_frame_files(frames_folder, extensions)
+    first = next(iter_frame_files(frame_paths[:1]), None)
+    if first is None:
+        raise ValueError(f"No frames found in {frames_folder}.")
+
+    needed = count_frames_needed(message, first.shape, header, lsb_depth, channels, ecc_nsym)
+    if needed > len(frame_paths):
+        raise ValueError("Not enough frames to embed the entire message.")
 
-    out.release()
-    print(f"Video creation complete: {output_video_path}")
+    frames = itertools.chain([first], iter_frame_files(frame_paths[1:needed]))
+    with FrameWriter(output_folder, workers=workers, png_compression=png_compression, fmt=fmt) as writer:
+        frames = embed_message_in_frames(frames, message, header, lsb_depth, channels, ecc_nsym, scatter_key)
+        for frame_count, frame in enumerate(frames):
+            writer.write(f"modified_frame_{frame_count:04d}", frame)
+        for frame_count in range(needed, len(frame_paths)):
+            writer.passthrough(f"modified_frame_{frame_count:04d}", frame_paths[frame_count], passthrough)
+
+    log.info(f"Message embedding complete. {needed} frames embedded, "
+             f"{len(frame_paths) - needed} passed through ({passthrough}).")
+    return len(frame_paths)
+
+# Function to write a stream of frames to a video. Frames are handed to a writer
+# thread through a bounded queue, so encoding overlaps with decoding/embedding and
+# at most `queue_size` frames are buffered. Returns the number of frames written.
+def write_frames_to_video(frames, output_video_path, frame_rate=30, fourcc=LOSSLESS_FOURCC, queue_size=8):
+    frame_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+    written = [0]
+
+    def writer_loop():
+        out = None
+        frame_size = None
+        try:
+            while True:
+                frame = frame_queue.get()
+                if frame is None:
+                    break
+                if out is None:
+                    frame_size = (frame.shape[1], frame.shape[0])
+                    out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*fourcc), frame_rate, frame_size)
+                    if not out.isOpened():
+                        raise ValueError(f"Unable to open video writer for: {output_video_path}")
+                elif (frame.shape[1], frame.shape[0]) != frame_size:
+                    log.warning(f"Frame {written[0]} has a different size. Resizing to match the first frame.")
+                    frame = cv2.resize(frame, frame_size)
+                start = time.perf_counter()
+                out.write(frame)
+                metrics.add(metrics.ENCODE, time.perf_counter() - start, frame.nbytes)
+                written[0] += 1
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the producer never blocks on a full queue
+            while frame_queue.get() is not None:
+                pass
+        finally:
+            if out is not None:
+                out.release()
+
+    writer = threading.Thread(target=writer_loop, daemon=True)
+    writer.start()
+    try:
+        for frame in frames:
+            if errors:
+                break
+            frame_queue.put(frame)
+    finally:
+        frame_queue.put(None)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+    if written[0] == 0:
+        raise ValueError("No frames found to create the video.")
+    metrics.incr("frames_encoded", written[0])
+    return written[0]
+
+# Streaming pipeline: decode frames from `video_path`, embed the message and hand each
+# frame straight to the video writer. Peak memory stays at a handful of frames however
+# long the video is. If `frames_folder` is given, the modified frames are also saved
+# there as checkpoints through a pooled FrameWriter. The message only turns out not to fit
+# once the source runs out of frames; the video written so far is then deleted.
+def stream_embed_video(video_path, message, output_video_path, frame_rate=None,
+                       fourcc=LOSSLESS_FOURCC, queue_size=8, frames_folder=None,
+                       png_compression=DEFAULT_PNG_COMPRESSION, frames_format='png', header=True,
+                       lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0, scatter_key=None):
+    if frame_rate is None:
+        frame_rate = get_video_fps(video_path)
+
+    frames = embed_message_in_frames(iter_video_frames(video_path), message, header, lsb_depth, channels, ecc_nsym,
+                                     scatter_key)
+    if frames_folder is not None:
+        frames = tee_frames_to_folder(frames, frames_folder, png_compression=png_compression, fmt=frames_format)
+
+    try:
+        frame_count = write_frames_to_video(frames, output_video_path, frame_rate, fourcc, queue_size)
+    except Exception:
+        # Never leave a complete-looking video carrying a truncated payload behind
+        if os.path.exists(output_video_path):
+            os.remove(output_video_path)
+        raise
+    log.info(f"Streaming embed complete. {frame_count} frames written to {output_video_path}")
+    return frame_count
+
+# Generator that queues each frame on a FrameWriter as a checkpoint while passing it through.
+# Use copy=True when the frames are modified downstream (e.g. embedded in place).
+def tee_frames_to_folder(frames, output_folder, prefix='modified_frame',
+                         png_compression=DEFAULT_PNG_COMPRESSION, fmt='png', copy=False):
+    with FrameWriter(output_folder, png_compression=png_compression, fmt=fmt) as writer:
+        for frame_count, frame in enumerate(frames):
+            writer.write(f"{prefix}_{frame_count:04d}", frame.copy() if copy else frame)
+            yield frame
+
+# Function to combine frames into a video. The default codec is lossless so the
+# embedded LSBs survive; pass fourcc='mp4v' for a (payload-destroying) preview copy.
+def combine_frames_to_video(frames_folder, output_video_path, frame_rate=30, fourcc=LOSSLESS_FOURCC):
+    log.info(f"Combining frames into video: {output_video_path}")
+    log.info(f"Codec: {fourcc}, Frame rate: {frame_rate} FPS")
+
+    # Passed-through frames keep their source format (e.g. .jpg)
+    frames = iter_frames_from_folder(frames_folder, extensions=FRAME_EXTENSIONS)
+    frame_count = write_frames_to_video(frames, output_video_path, frame_rate, fourcc)
+    log.info(f"Video creation complete: {output_video_path} ({frame_count} frames)")
 
 # Example usage
 if __name__ == "__main__":
     # Paths configuration
     encrypted_message_filename = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\encrypted_message.txt"
+    encrypted_payload_filename = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\encrypted_message.bin"
     output_frames_folder = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_frames_with_message"
     original_frames_folder = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_frames"
-    output_video_path = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_video_with_message.mp4"
+    output_video_path = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_video_with_message.mkv"
+    source_video_path = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\Bali.MOV"
     frame_rate = 30 # Adjust as needed
 
-    # Load the encrypted message
-    encrypted_message = load_encrypted_message(encrypted_message_filename)
-    print(f"Encrypted message loaded. Length: {len(encrypted_message)} characters.")
-
-    # Load the frames as PNG images
-    frames = []
-    for filename in sorted(os.listdir(original_frames_folder)):
-        if filename.lower().endswith('.jpg'):
-            frame_path = os.path.join(original_frames_folder, filename)
-            frame = cv2.imread(frame_path)
-            if frame is not None:
-                frames.append(frame)
-            else:
-                print(f"Warning: Unable to read frame {filename}.")
-
-    if not frames:
-        raise ValueError("No frames found to embed the message.")
-
-    print(f"Total frames loaded: {len(frames)}")
-
-    # Optional: Print frame details for debugging
-    for idx, frame in enumerate(frames):
-        print(f"Frame {idx}: Shape {frame.shape}")
-
-    # Embed the message into the video frames
-    embed_message_in_video(frames, encrypted_message, output_frames_folder)
-
-    # Combine the modified frames back into a video
-    combine_frames_to_video(
-        frames_folder=output_frames_folder,
-        output_video_path=output_video_path,
-        frame_rate=frame_rate
-    )
\ No newline at end of file
+    # Log level and metrics sink come from $STEGO_LOG_LEVEL / $STEGO_METRICS
+    metrics.configure()
+
+    # Load the encrypted message (binary envelope if Encryption.py wrote one)
+    if os.path.exists(encrypted_payload_filename):
+        encrypted_message = load_encrypted_payload(encrypted_payload_filename)
+    else:
+        encrypted_message = load_encrypted_message(encrypted_message_filename)
+    log.info(f"Encrypted message loaded. Length: {len(encrypted_message)} bytes.")
+
+    if os.path.exists(source_video_path):
+        # Stream straight from the source video; no intermediate frame folders needed
+        stream_embed_video(source_video_path, encrypted_message, output_video_path, frame_rate=frame_rate)
+    else:
+        # Otherwise embed into the extracted frames; only the frames that carry the message
+        # are decoded and re-encoded, the rest are hard-linked into the output folder
+        embed_message_in_folder(original_frames_folder, encrypted_message, output_frames_folder,
+                                extensions=('.jpg',))
+
+        # Combine the modified frames back into a video
+        combine_frames_to_video(
+            frames_folder=output_frames_folder,
+            output_video_path=output_video_path,
+            frame_rate=frame_rate
+        )
+
+    metrics.report("embed_msg")
@@ -1,40 +1,183 @@
+import argparse
 import cv2
+import functools
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_frames_from_video(video_path, output_folder, frame_interval=1):
+import metrics
+from metrics import log
+from frame_writer import DEFAULT_PNG_COMPRESSION, FRAME_FORMATS, LOSSY_FRAME_FORMATS, FrameWriter, read_frame
+
+# Generator that yields every `frame_interval`-th frame of a video straight from
+# cv2.VideoCapture, so only one decoded frame is held in memory at a time. Frames that
+# are skipped are only grab()bed, never retrieve()d (no color conversion or copy).
+# `start` seeks to that frame index first, `end` (exclusive) and `max_frames` (frames
+# yielded) bound the range.
+def iter_video_frames(video_path, frame_interval=1, start=0, end=None, max_frames=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    try:
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame_count = start
+        kept = 0
+        while (end is None or frame_count < end) and (max_frames is None or kept < max_frames):
+            begin = time.perf_counter()
+            if not cap.grab():
+                break
+            if (frame_count - start) % frame_interval == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                metrics.add(metrics.DECODE, time.perf_counter() - begin, frame.nbytes)
+                metrics.incr("frames_decoded")
+                kept += 1
+                yield frame
+            else:
+                metrics.add(metrics.DECODE, time.perf_counter() - begin)
+            frame_count += 1
+    finally:
+        cap.release()
+
+# Function to read the frame rate of a video (falls back to `default` if unknown)
+def get_video_fps(video_path, default=30):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+# Function to read the (container-reported, possibly approximate) frame count of a video
+def get_video_frame_count(video_path):
+    cap = cv2.VideoCapture(video_path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    cap.release()
+    return max(count, 0)
+
+FRAME_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.npy')
+
+# Function to list the frame files of a folder in sorted filename order
+def list_frame_files(frames_folder, extensions=FRAME_EXTENSIONS):
+    return [os.path.join(frames_folder, f) for f in sorted(os.listdir(frames_folder))
+            if f.lower().endswith(extensions)]
+
+# Generator that lazily reads the given frame files (e.g. from list_frame_files)
+def iter_frame_files(frame_paths):
+    for frame_path in frame_paths:
+        start = time.perf_counter()
+        frame = read_frame(frame_path)
+        if frame is not None:
+            metrics.add(metrics.DECODE, time.perf_counter() - start, frame.nbytes)
+            metrics.incr("frames_decoded")
+            yield frame
+        else:
+            log.warning(f"Unable to read frame {os.path.basename(frame_path)}.")
+
+# Generator that lazily reads the frames of a folder in sorted filename order
+def iter_frames_from_folder(frames_folder, extensions=FRAME_EXTENSIONS):
+    return iter_frame_files(list_frame_files(frames_folder, extensions))
+
+# Function to decode one segment of a video and write its kept frames as
+# frame_<index>.<fmt>, numbered globally from `start`. Runs in a worker process in
+# parallel mode. Returns the number of frames written.
+def _extract_segment(job):
+    video_path, output_folder, start, seg_start, seg_end, frame_interval, fmt, png_compression, writers = job
+    first_index = (seg_start - start) // frame_interval
+    frames = iter_video_frames(video_path, frame_interval, seg_start, seg_end)
+    with FrameWriter(output_folder, workers=writers, png_compression=png_compression, fmt=fmt) as writer:
+        for i, frame in enumerate(frames):
+            frame_path = writer.write(f"frame_{first_index + i:04d}", frame)
+            log.debug(f"Extracted frame {seg_start + i * frame_interval} and saved as {frame_path}.")
+    return writer.frames_written
+
+# Function to split [start, end) into `workers` segments of whole frame intervals.
+# The last segment is open-ended so an underestimated frame count loses nothing.
+def _split_segments(start, end, frame_interval, workers):
+    kept = -(-(end - start) // frame_interval)
+    per_segment = -(-kept // workers)
+    bounds = [start + i * per_segment * frame_interval for i in range(workers) if i * per_segment < kept]
+    return [(b, bounds[i + 1] if i + 1 < len(bounds) else None) for i, b in enumerate(bounds)]
+
+# Function to extract frames from a video into `output_folder` as frame_0000.<fmt>, ...
+# Only every `frame_interval`-th frame of [start, end) is kept, at most `max_frames`.
+# fmt='png' / 'npy' are lossless ('jpg' is the original, lossy default). With workers > 1
+# the range is split into segments that are decoded by separate processes, each seeking
+# to its segment with CAP_PROP_POS_FRAMES. Returns the number of frames saved.
+def extract_frames_from_video(video_path, output_folder, frame_interval=1, start=0, end=None,
+                              max_frames=None, fmt='jpg', workers=1, png_compression=DEFAULT_PNG_COMPRESSION):
     # Create output folder if it doesn't exist
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
     # Capture the video
     cap = cv2.VideoCapture(video_path)
-
     if not cap.isOpened():
-        print("Error: Could not open video file.")
-        return
+        log.error("Could not open video file.")
+        return 0
+    cap.release()
 
-    frame_count = 0
-    saved_frame_count = 0
+    if max_frames is not None:
+        limit = start + max_frames * frame_interval
+        end = limit if end is None else min(end, limit)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    if workers > 1:
+        total = end if end is not None else get_video_frame_count(video_path)
+        segments = _split_segments(start, total, frame_interval, workers) if total > start else []
+        if end is not None and segments:
+            segments[-1] = (segments[-1][0], end)
+    else:
+        segments = []
+    if len(segments) <= 1:
+        segments = [(start, end)]
 
-        if frame_count % frame_interval == 0:
-            frame_path = os.path.join(output_folder, f"frame_{saved_frame_count:04d}.jpg")
-            cv2.imwrite(frame_path, frame)
-            print(f"Extracted frame {frame_count} and saved as {frame_path}.")
-            saved_frame_count += 1
+    # In parallel mode one encoder thread per process overlaps encoding with decoding
+    # without oversubscribing the cores
+    writers = 1 if len(segments) > 1 else None
+    jobs = [(video_path, output_folder, start, seg_start, seg_end, frame_interval, fmt, png_compression, writers)
+            for seg_start, seg_end in segments]
+    if len(jobs) == 1:
+        saved_frame_count = _extract_segment(jobs[0])
+    else:
+        saved_frame_count = 0
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            for count, snapshot in pool.map(functools.partial(metrics.run_with_snapshot, _extract_segment), jobs):
+                metrics.merge(snapshot)
+                saved_frame_count += count
 
-        frame_count += 1
+    log.info(f"✅ Total {saved_frame_count} frames extracted and saved in {output_folder}.")
+    return saved_frame_count
 
-    cap.release()
-    print(f"✅ Total {saved_frame_count} frames extracted and saved in {output_folder}.")
+def main(argv=None):
+    # ✅ Use raw strings for Windows paths
+    video_path = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\Bali.MOV"
+    output_folder = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_frames"
+
+    ap = argparse.ArgumentParser(description="Extract frames from a video")
+    ap.add_argument("--video", default=video_path, help="Source video")
+    ap.add_argument("--output_folder", default=output_folder, help="Folder for the extracted frames")
+    ap.add_argument("--frame_interval", type=int, default=1, help="Keep every n-th frame")
+    ap.add_argument("--start", type=int, default=0, help="First frame index to consider")
+    ap.add_argument("--end", type=int, default=None, help="Stop before this frame index")
+    ap.add_argument("--max_frames", type=int, default=None, help="Save at most this many frames")
+    ap.add_argument("--format", choices=LOSSY_FRAME_FORMATS + FRAME_FORMATS, default="jpg",
+                    help="Output format: jpg (lossy), or lossless png / npy")
+    ap.add_argument("--png_compression", type=int, default=DEFAULT_PNG_COMPRESSION,
+                    help="PNG compression level 0 (fastest) .. 9 (smallest)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Decode segments in this many processes (0 = all cores)")
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args(argv)
+    metrics.configure_from_args(args)
 
-# ✅ Use raw strings for Windows paths
-video_path = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\Bali.MOV"
-output_folder = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_frames"
+    # Run the frame extraction
+    extract_frames_from_video(args.video, args.output_folder, args.frame_interval, args.start, args.end,
+                              args.max_frames, args.format, args.workers or os.cpu_count() or 1,
+                              args.png_compression)
+    metrics.report("extract_frames")
+    return 0
 
-# Run the frame extraction
-extract_frames_from_video(video_path, output_folder)
+if __name__ == "__main__":
+    sys.exit(main())
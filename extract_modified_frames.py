@@ -1,86 +1,401 @@
-import cv2
 import os
+import functools
+import itertools
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import ecc
+import metrics
+from metrics import log
+from Encryption import ENVELOPE_VERSIONS
+from extract_frames import iter_frame_files, iter_video_frames, list_frame_files
+from lsb import DEFAULT_LAYOUT, LAYOUTS, bits_per_pixel, frame_capacity_bits, read_lsb_bits
+from scatter import frame_rows, gather_lsbs
+from stream_header import (CHANNEL_BLUE, ECC_PREFIX_SIZE, FLAG_ECC, FLAG_SCATTERED, FLAG_STREAMED, HEADER_BITS,
+                           HEADER_SIZE, frames_needed, unpack_header)
+
+# Vectorized extraction engine: reads up to `bits_needed` bits of `frame`, starting at
+# bit `bit_offset` of the (lsb_depth, channels) layout (see lsb.py; the default is one
+# blue-channel bit per pixel in raster order), and packs them into bytes (MSB first).
+# Only whole bytes are returned. Only the rows that hold the requested bits are touched.
+# `scatter_key` reads a scattered stream (pixels in that key's order, see scatter.py).
+def extract_bytes_from_frame(frame, bits_needed, bit_offset=0, lsb_depth=1, channels=CHANNEL_BLUE, scatter_key=None):
+    height, width = frame.shape[:2]
+    take = min(bits_needed, height * width * bits_per_pixel(lsb_depth, channels) - bit_offset)
+    take -= take % 8
+    if take <= 0:
+        return b''
+
+    pixel_rows = frame_rows(frame.shape, scatter_key)
+    if (lsb_depth, channels) != DEFAULT_LAYOUT:
+        bits = read_lsb_bits(frame.reshape(-1, frame.shape[2]), take, bit_offset, lsb_depth, channels, pixel_rows)
+        return np.packbits(bits).tobytes()
+    if pixel_rows is not None:
+        flat_blue = frame.reshape(-1, frame.shape[2])[:, 0]
+        return np.packbits(gather_lsbs(flat_blue, take, bit_offset, scatter_key)).tobytes()
+
+    rows = (bit_offset + take + width - 1) // width
+    flat_blue = frame[:rows, :, 0].reshape(-1)
+    return np.packbits(flat_blue[bit_offset:bit_offset + take] & 1).tobytes()
 
 # Function to extract the encrypted message from a frame
 def extract_message_from_frame(frame, bits_needed):
-    frame_array = np.array(frame)
-    extracted_bits = []
-
-    for row in range(frame_array.shape[0]):
-        for col in range(frame_array.shape[1]):
-            if len(extracted_bits) < bits_needed:
-                b = frame_array[row, col][0]  # Extract the blue channel
-                extracted_bits.append(str(b & 0x01))
-            else:
+    return extract_bytes_from_frame(frame, bits_needed).decode('utf-8', errors='ignore')
+
+# Function to read `total_bytes` of the LSB byte stream from consecutive frames.
+# Bytes are accumulated into a preallocated buffer; no further frames are pulled from
+# `frames` once the stream is complete.
+def read_byte_stream(frames, total_bytes, lsb_depth=1, channels=CHANNEL_BLUE, scatter_key=None):
+    buffer = bytearray(total_bytes)
+    view = memoryview(buffer)
+    filled = 0
+
+    if total_bytes > 0:
+        for frame in frames:
+            start = time.perf_counter()
+            chunk = extract_bytes_from_frame(frame, (total_bytes - filled) * 8, 0, lsb_depth, channels, scatter_key)
+            metrics.add(metrics.EXTRACT, time.perf_counter() - start, len(chunk))
+            metrics.incr("bytes_extracted", len(chunk))
+            view[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+            if filled >= total_bytes:
                 break
-        if len(extracted_bits) >= bits_needed:
-            break
 
-    # Ensure that the number of bits is a multiple of 8
-    num_full_bytes = len(extracted_bits) // 8
-    extracted_bits = extracted_bits[:num_full_bytes * 8]
+    view.release()
+    # Truncate in case the frames held fewer bytes than requested
+    del buffer[filled:]
+    return buffer
+
+# Function to read the stream header from the start of frame 0 (None if absent). The
+# header is written in the stream's own bit layout, so every layout is probed (the
+# original one first); a match must also name the layout it was found in. With
+# `scatter_key`, the keyed pixel order is probed before raster order; the header's
+# FLAG_SCATTERED then tells which one the stream uses (see stream_key).
+def read_stream_header(frame, scatter_key=None):
+    for key in ((scatter_key, None) if scatter_key is not None else (None,)):
+        for lsb_depth, channels in LAYOUTS:
+            header = unpack_header(extract_bytes_from_frame(frame, HEADER_BITS, 0, lsb_depth, channels, key))
+            if (header is not None and (header["lsb_depth"], header["channels"]) == (lsb_depth, channels)
+                    and bool(header["flags"] & FLAG_SCATTERED) == (key is not None)):
+                return header
+    return None
+
+# Function to pick the pixel-order key of a stream: `scatter_key` if its header is scattered
+def stream_key(header, scatter_key=None):
+    return scatter_key if header["flags"] & FLAG_SCATTERED else None
 
-    message_bytes = [int(''.join(extracted_bits[i:i+8]), 2) for i in range(0, len(extracted_bits), 8)]
-    return bytes(message_bytes).decode('utf-8', errors='ignore')
+# Function to check a header against the frames it was read from
+def _check_header_layout(header, frame):
+    bits_per_frame = frame_capacity_bits(frame.shape, header["lsb_depth"], header["channels"])
+    if header["bits_per_frame"] != bits_per_frame:
+        raise ValueError(f"Stream header layout ({header['bits_per_frame']} bits/frame) "
+                         f"does not match the frames ({bits_per_frame} bits/frame).")
 
-# Function to extract the encrypted message from all frames
-def extract_message_from_video(frames, message_length):
-    extracted_message = ''
-    bits_needed = message_length * 8  # Total bits to extract
+# Function to read the RS parity length of an ECC stream (the byte after the header)
+def read_ecc_nsym(frame, header, scatter_key=None):
+    nsym = extract_bytes_from_frame(frame, ECC_PREFIX_SIZE * 8, HEADER_BITS, header["lsb_depth"], header["channels"],
+                                    stream_key(header, scatter_key))[0]
+    ecc.check_nsym(nsym)
+    return nsym
 
+# Function to count the leading frames that hold the payload described by `header`
+def payload_frames(header, nsym=None):
+    if header["flags"] & FLAG_ECC:
+        return ecc.frames_needed(header["payload_length"], header["bits_per_frame"] // 8, nsym,
+                                 HEADER_SIZE + ECC_PREFIX_SIZE)
+    return frames_needed(header["payload_length"], header["bits_per_frame"])
+
+# Function to read the RS-coded share of one frame; `offset` skips the raw prefix in frame 0
+def _read_ecc_frame(frame, header, nsym, n_data, offset, scatter_key=None):
+    start = time.perf_counter()
+    coded = extract_bytes_from_frame(frame, ecc.encoded_size(n_data, nsym) * 8, offset * 8,
+                                     header["lsb_depth"], header["channels"], stream_key(header, scatter_key))
+    metrics.add(metrics.EXTRACT, time.perf_counter() - start, len(coded))
+    metrics.incr("bytes_extracted", len(coded))
+    return coded
+
+# Function to extract an RS-coded (FLAG_ECC) payload of known length. The coded share of
+# every frame is read first, then all codewords are checked at once and only the damaged
+# ones are corrected, across `workers` processes (see ecc.decode_frames).
+def read_ecc_payload(frames, header, nsym, workers=None, scatter_key=None):
+    bytes_per_frame = header["bits_per_frame"] // 8
+    remaining = header["payload_length"]
+    offset = HEADER_SIZE + ECC_PREFIX_SIZE
+    coded, sizes = [], []
     for frame in frames:
-        if len(extracted_message) < message_length:
-            remaining_bits = bits_needed - len(extracted_message) * 8
-            chunk = extract_message_from_frame(frame, remaining_bits)
-            extracted_message += chunk
-            print(f"Extracted chunk from frame: {chunk}")
-        else:
+        n_data = min(remaining, ecc.data_capacity(bytes_per_frame - offset, nsym))
+        coded.append(_read_ecc_frame(frame, header, nsym, n_data, offset, scatter_key))
+        sizes.append(n_data)
+        remaining -= n_data
+        offset = 0
+        if remaining <= 0:
             break
+    if remaining > 0:
+        raise ValueError(f"Stream truncated: {remaining} payload bytes missing.")
+    return ecc.decode_frames(coded, sizes, nsym, workers or os.cpu_count())
+
+# Function to extract the payload described by the stream header in frame 0.
+# Only the frames that hold the payload are pulled from `frames`. `workers` processes
+# repair damaged ECC codewords, if the stream has any. `scatter_key` is needed for
+# scattered streams (see scatter.py).
+def extract_payload_from_frames(frames, workers=None, scatter_key=None):
+    frames = iter(frames)
+    first = next(frames, None)
+    header = read_stream_header(first, scatter_key) if first is not None else None
+    if header is None:
+        raise ValueError("No stream header found in frame 0.")
+    _check_header_layout(header, first)
+    if header["flags"] & FLAG_STREAMED:
+        raise ValueError("Streamed payload has no length; read it with iter_payload_chunks.")
+    if header["flags"] & FLAG_ECC:
+        return read_ecc_payload(itertools.chain([first], frames), header, read_ecc_nsym(first, header, scatter_key),
+                                workers, scatter_key)
+
+    total_bytes = HEADER_SIZE + header["payload_length"]
+    stream = read_byte_stream(itertools.chain([first], frames), total_bytes,
+                              header["lsb_depth"], header["channels"], stream_key(header, scatter_key))
+    if len(stream) < total_bytes:
+        raise ValueError(f"Stream truncated: read {len(stream)}/{total_bytes} bytes.")
+    return bytes(stream[HEADER_SIZE:])
+
+# Generator that yields the payload frame by frame, for consumers such as
+# Decryption.decrypt_stream that stop pulling once the payload ends. Streamed payloads
+# (FLAG_STREAMED) are yielded until the frames run out; others stop at the header length.
+# ECC frames are checked (and if need be corrected) one at a time as they are yielded, in
+# this process: a pool per frame would cost more than it saves (and this also runs inside
+# service.py's pool workers).
+def iter_payload_chunks(frames, scatter_key=None):
+    frames = iter(frames)
+    first = next(frames, None)
+    header = read_stream_header(first, scatter_key) if first is not None else None
+    if header is None:
+        raise ValueError("No stream header found in frame 0.")
+    _check_header_layout(header, first)
+
+    bytes_per_frame = header["bits_per_frame"] // 8
+    streamed = bool(header["flags"] & FLAG_STREAMED)
+    nsym = read_ecc_nsym(first, header, scatter_key) if header["flags"] & FLAG_ECC else 0
+    key = stream_key(header, scatter_key)
+    remaining = header["payload_length"]
+    offset = HEADER_SIZE + (ECC_PREFIX_SIZE if nsym else 0)
+    for frame in itertools.chain([first], frames):
+        if nsym:
+            take = ecc.data_capacity(bytes_per_frame - offset, nsym)
+            take = take if streamed else min(take, remaining)
+            coded = _read_ecc_frame(frame, header, nsym, take, offset, key)
+            chunk = ecc.decode_frames([coded], [take], nsym, workers=1)
+        else:
+            take = bytes_per_frame - offset if streamed else min(bytes_per_frame - offset, remaining)
+            start = time.perf_counter()
+            chunk = extract_bytes_from_frame(frame, take * 8, offset * 8, header["lsb_depth"], header["channels"], key)
+            metrics.add(metrics.EXTRACT, time.perf_counter() - start, len(chunk))
+            metrics.incr("bytes_extracted", len(chunk))
+        offset = 0
+        remaining -= len(chunk)
+        yield chunk
+        if not streamed and remaining <= 0:
+            return
+
+    if not streamed and remaining > 0:
+        raise ValueError(f"Stream truncated: {remaining} payload bytes missing.")
 
-    # Truncate in case of over-extraction
-    extracted_message = extracted_message[:message_length]
-    return extracted_message
+# --- Sharded extraction ---
+# Every frame's share of a classic stream is known from the header alone (bytes_per_frame,
+# or its ECC data capacity), so a prefix sum over the frames gives each one's payload
+# offset up front. Contiguous frame ranges are then read by separate processes (each
+# seeking straight to its first frame) and stitched together by offset.
+
+MIN_SHARD_FRAMES = 2   # fewer frames per process do not pay for its start-up and seek
+
+# Function to plan the payload frames: per frame, the byte offset of its share within the
+# frame, its payload byte count and (prefix sum) the payload offset it starts at
+def plan_payload_frames(header, nsym=0):
+    bytes_per_frame = header["bits_per_frame"] // 8
+    remaining = header["payload_length"]
+    offset = HEADER_SIZE + (ECC_PREFIX_SIZE if nsym else 0)
+    plan, position = [], 0
+    while True:
+        capacity = ecc.data_capacity(bytes_per_frame - offset, nsym) if nsym else bytes_per_frame - offset
+        n_data = min(remaining, capacity)
+        plan.append((offset, n_data, position))
+        position += n_data
+        remaining -= n_data
+        offset = 0
+        if remaining <= 0:
+            return plan
+
+# Function to split `n_frames` into at most `workers` contiguous (start, end) ranges
+def split_shards(n_frames, workers, min_frames=MIN_SHARD_FRAMES):
+    n_shards = max(1, min(workers, n_frames // min_frames))
+    bounds = [n_frames * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _read_shard(job):
+    # Payload bytes of frames [start, end); `source` is the video path or the shard's frame files
+    source, start, end, header, nsym, plan, key = job
+    if isinstance(source, str):
+        frames = iter_video_frames(source, start=start, end=end)
+    else:
+        frames = iter_frame_files(source)
+    coded, sizes, out = [], [], bytearray()
+    with closing(frames):
+        for (offset, n_data, _), frame in zip(plan, frames):
+            if nsym:
+                coded.append(_read_ecc_frame(frame, header, nsym, n_data, offset, key))
+                sizes.append(n_data)
+                continue
+            begin = time.perf_counter()
+            chunk = extract_bytes_from_frame(frame, n_data * 8, offset * 8, header["lsb_depth"], header["channels"], key)
+            metrics.add(metrics.EXTRACT, time.perf_counter() - begin, len(chunk))
+            metrics.incr("bytes_extracted", len(chunk))
+            out += chunk
+    if nsym:
+        out = ecc.decode_frames(coded, sizes, nsym, workers=1)
+    expected = sum(n_data for _, n_data, _ in plan)
+    if len(out) < expected:
+        raise ValueError(f"Stream truncated: frames {start}-{end - 1} held {len(out)}/{expected} payload bytes.")
+    return bytes(out)
+
+# Function to extract a payload of known length (not FLAG_STREAMED) from a stego video or a
+# folder of stego frames, with frame ranges read in parallel by `workers` processes
+def extract_payload_sharded(source, workers=None, extensions=('.png', '.npy'), scatter_key=None):
+    workers = workers or os.cpu_count() or 1
+    if os.path.isdir(source):
+        frame_paths = list_frame_files(source, extensions)
+        first = next(iter_frame_files(frame_paths[:1]), None)
+    else:
+        frame_paths = None
+        with closing(iter_video_frames(source, max_frames=1)) as frames:
+            first = next(frames, None)
+    header = read_stream_header(first, scatter_key) if first is not None else None
+    if header is None:
+        raise ValueError(f"No stream header found in frame 0 of {source}.")
+    _check_header_layout(header, first)
+    if header["flags"] & FLAG_STREAMED:
+        raise ValueError("Streamed payload has no length; read it with iter_payload_chunks.")
+
+    nsym = read_ecc_nsym(first, header, scatter_key) if header["flags"] & FLAG_ECC else 0
+    key = stream_key(header, scatter_key)
+    plan = plan_payload_frames(header, nsym)
+    if frame_paths is not None and len(plan) > len(frame_paths):
+        raise ValueError(f"Payload needs {len(plan)} frames but only {len(frame_paths)} were found.")
+
+    shards = split_shards(len(plan), workers)
+    jobs = [(source if frame_paths is None else frame_paths[start:end], start, end, header, nsym, plan[start:end], key)
+            for start, end in shards]
+    if len(jobs) == 1:
+        results = [_read_shard(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            results = []
+            for data, snapshot in pool.map(functools.partial(metrics.run_with_snapshot, _read_shard), jobs):
+                metrics.merge(snapshot)
+                results.append(data)
+
+    payload = bytearray(header["payload_length"])
+    for (start, _), data in zip(shards, results):
+        position = plan[start][2]
+        payload[position:position + len(data)] = data
+    log.debug(f"Extracted {len(payload)} bytes from {len(plan)} frames in {len(jobs)} shard(s).")
+    return bytes(payload)
+
+# Function to extract the payload from a folder of stego frames. Frame 0 is decoded to
+# read the stream header; after that only the frames holding the payload are opened.
+# Legacy headerless folders can still be read by passing `message_length`.
+def extract_payload_from_folder(frame_folder, extensions=('.png', '.npy'), message_length=None, scatter_key=None):
+    frame_paths = list_frame_files(frame_folder, extensions)
+    frames = iter_frame_files(frame_paths)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError(f"No frames found in {frame_folder}.")
+
+    header = read_stream_header(first, scatter_key)
+    if header is None:
+        if message_length is None:
+            raise ValueError(f"No stream header found in {frame_folder}.")
+        return bytes(read_byte_stream(itertools.chain([first], frames), message_length))
+
+    nsym = read_ecc_nsym(first, header, scatter_key) if header["flags"] & FLAG_ECC else None
+    needed = payload_frames(header, nsym)
+    if needed > len(frame_paths):
+        raise ValueError(f"Payload needs {needed} frames but only {len(frame_paths)} were found.")
+    return extract_payload_from_frames(itertools.chain([first], iter_frame_files(frame_paths[1:needed])),
+                                       scatter_key=scatter_key)
+
+# Function to extract the encrypted message from all frames. Without `message_length`
+# the length is taken from the stream header; with it, the legacy headerless layout
+# is read.
+def extract_message_from_video(frames, message_length=None, scatter_key=None):
+    if message_length is None:
+        data = extract_payload_from_frames(frames, scatter_key=scatter_key)
+    else:
+        data = read_byte_stream(frames, message_length)
+    return data.decode('utf-8', errors='ignore')
+
+# Function to extract the message straight from a lossless stego video. Frames are
+# decoded sequentially and decoding stops as soon as the payload is complete.
+def extract_message_from_video_file(video_path, message_length=None, scatter_key=None):
+    with closing(iter_video_frames(video_path)) as frames:
+        return extract_message_from_video(frames, message_length, scatter_key)
+
+# Function to extract the raw payload bytes (byte-exact, e.g. a binary envelope) from a
+# lossless stego video
+def extract_payload_from_video_file(video_path, workers=None, scatter_key=None):
+    with closing(iter_video_frames(video_path)) as frames:
+        return extract_payload_from_frames(frames, workers, scatter_key)
+
+# Function to check whether a payload is a raw binary envelope rather than base64 text:
+# raw envelopes start with their version byte, base64 text never does
+def is_binary_payload(payload):
+    return bool(payload) and payload[0] in ENVELOPE_VERSIONS
 
 # Function to save the extracted message to a file
 def save_extracted_message(message, filename):
     with open(filename, 'w', encoding='utf-8') as file:
         file.write(message)
-    print(f"Extracted message saved to {filename}")
+    log.info(f"Extracted message saved to {filename}")
+
+# Function to save an extracted binary payload to a file, byte for byte
+def save_extracted_payload(payload, filename):
+    with open(filename, 'wb') as file:
+        file.write(payload)
+    log.info(f"Extracted payload saved to {filename}")
 
 # Example usage
 if __name__ == "__main__":
     frame_folder = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_frames_with_message"
     extracted_message_filename = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\extracted_encrypted_message.txt"
+    extracted_payload_filename = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\extracted_encrypted_message.bin"
     original_message_filename = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\encrypted_message.txt"
+    stego_video_path = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography\output_video_with_message.mkv"
 
+    # Log level and metrics sink come from $STEGO_LOG_LEVEL / $STEGO_METRICS
+    metrics.configure()
 
-    # Load the frames as PNG images
-    frames = []
-    for filename in sorted(os.listdir(frame_folder)):
-        if filename.lower().endswith('.png'):
-            frame_path = os.path.join(frame_folder, filename)
-            frame = cv2.imread(frame_path)
-            if frame is not None:
-                frames.append(frame)
-            else:
-                print(f"Warning: Unable to read frame {filename}.")
-
-    if not frames:
-        raise ValueError("No frames found to extract the message.")
-
-    print(f"Total frames loaded: {len(frames)}")
+    if os.path.exists(stego_video_path):
+        # Decode straight from the lossless stego video, frame ranges in parallel
+        payload = extract_payload_sharded(stego_video_path)
+    else:
+        # Legacy headerless frames need the length of the original message
+        message_length = None
+        if os.path.exists(original_message_filename):
+            with open(original_message_filename, 'r', encoding='utf-8') as file:
+                message_length = len(file.read().strip())
 
-    # Read the length of the original message
-    with open(original_message_filename, 'r', encoding='utf-8') as file:
-        original_message = file.read().strip()
+        # The header tells us the length and exactly which frames to open
+        payload = extract_payload_from_folder(frame_folder, message_length=message_length)
 
-    message_length = len(original_message)
-    print(f"Original message length: {message_length} characters.")
+    if is_binary_payload(payload):
+        # Binary mode: keep the envelope byte-exact
+        save_extracted_payload(payload, extracted_payload_filename)
+    else:
+        extracted_message = payload.decode('utf-8', errors='ignore')
+        log.info(f"Extracted message: {len(extracted_message)} characters.")
+        log.debug(f"Extracted Message: {extracted_message}")
 
-    # Extract the message from the video frames
-    extracted_message = extract_message_from_video(frames, message_length)
-    print(f"Extracted Message: {extracted_message}")
+        # Save the extracted message to a file
+        save_extracted_message(extracted_message, extracted_message_filename)
 
-    # Save the extracted message to a file
-    save_extracted_message(extracted_message, extracted_message_filename)
\ No newline at end of file
+    metrics.report("extract_modified_frames")
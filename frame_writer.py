@@ -0,0 +1,145 @@
+# frame_writer.py — Pooled, multi-threaded frame writer shared by all embed entry points
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import metrics
+
+# --- Output formats ---
+# 'png' : lossless PNG; IMWRITE_PNG_COMPRESSION 0 (uncompressed, fastest) .. 9 (smallest)
+# 'npy' : raw NumPy array dump; no encoding at all, largest files, fastest to read back
+FRAME_FORMATS = ('png', 'npy')
+DEFAULT_PNG_COMPRESSION = 1
+# 'jpg' : lossy; only for plain frame dumps (extract_frames), never for stego frames
+LOSSY_FRAME_FORMATS = ('jpg',)
+
+# --- Pass-through of frames that carry no payload ---
+# 'link' : hard link to the source file (falls back to a copy across filesystems)
+# 'copy' : byte-for-byte copy of the source file
+PASSTHROUGH_MODES = ('link', 'copy')
+
+# Function to read a frame written by FrameWriter (or any image cv2 can decode)
+def read_frame(path):
+    if path.lower().endswith('.npy'):
+        return np.load(path)
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+class FrameWriter:
+    """Encodes and writes frames on a thread pool (cv2.imwrite releases the GIL).
+
+    At most `max_in_flight` frames are queued or being encoded at once; `write`
+    blocks when that limit is reached, which bounds memory. Frames handed to `write`
+    must not be modified afterwards. Errors from workers are re-raised on the next
+    `write` or on `close`.
+    """
+
+    def __init__(self, output_folder, workers=None, max_in_flight=None,
+                 png_compression=DEFAULT_PNG_COMPRESSION, fmt='png'):
+        if fmt not in FRAME_FORMATS + LOSSY_FRAME_FORMATS:
+            raise ValueError(f"Unsupported frame format: {fmt!r} "
+                             f"(expected one of {FRAME_FORMATS + LOSSY_FRAME_FORMATS})")
+        if not 0 <= png_compression <= 9:
+            raise ValueError("png_compression must be between 0 and 9.")
+
+        os.makedirs(output_folder, exist_ok=True)
+        self.output_folder = output_folder
+        self.fmt = fmt
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self._params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression] if fmt == 'png' else []
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._errors = []
+        self._lock = threading.Lock()
+        self.frames_written = 0
+
+    def path_for(self, name):
+        return os.path.join(self.output_folder, f"{name}.{self.fmt}")
+
+    def write(self, name, frame):
+        """Queue `frame` to be written as `<output_folder>/<name>.<fmt>`; returns the path."""
+        self._raise_pending()
+        path = self.path_for(name)
+        # A previous run may have hard-linked a source frame here (passthrough); writing
+        # into that path would modify the source, so unlink it first
+        if os.path.lexists(path):
+            os.remove(path)
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._write_one, path, frame)
+        except BaseException:
+            # e.g. submit after close(): the slot would otherwise never be released
+            self._slots.release()
+            raise
+        future.add_done_callback(self._on_done)
+        return path
+
+    def passthrough(self, name, src_path, mode='link'):
+        """Place the unmodified file `src_path` in the output folder as `<name><src ext>`,
+        without decoding or re-encoding it; returns the path."""
+        if mode not in PASSTHROUGH_MODES:
+            raise ValueError(f"Unsupported passthrough mode: {mode!r} (expected one of {PASSTHROUGH_MODES})")
+        self._raise_pending()
+        path = os.path.join(self.output_folder, name + os.path.splitext(src_path)[1].lower())
+        if os.path.exists(path) and os.path.samefile(src_path, path):
+            # Output folder == input folder (or an earlier link): the frame is already in place
+            metrics.incr("frames_passed_through")
+            return path
+        # Place the file under a temp name first: `path` is only replaced once the new one exists
+        tmp_path = path + ".tmp"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        if mode == 'link':
+            try:
+                os.link(src_path, tmp_path)
+            except OSError:
+                shutil.copyfile(src_path, tmp_path)
+        else:
+            shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        # Drop a frame a previous run encoded under this name, so it can't shadow this one
+        stale = self.path_for(name)
+        if stale != path and os.path.lexists(stale):
+            os.remove(stale)
+        metrics.incr("frames_passed_through")
+        return path
+
+    def close(self):
+        """Wait for all queued frames to be written."""
+        self._pool.shutdown(wait=True)
+        self._raise_pending()
+
+    def _write_one(self, path, frame):
+        with metrics.timer(metrics.WRITE, frame.nbytes):
+            if self.fmt == 'npy':
+                np.save(path, frame)
+            elif not cv2.imwrite(path, frame, self._params):
+                raise IOError(f"Unable to write frame: {path}")
+
+    def _on_done(self, future):
+        self._slots.release()
+        with self._lock:
+            if future.exception() is not None:
+                self._errors.append(future.exception())
+            else:
+                self.frames_written += 1
+                metrics.incr("frames_written")
+
+    def _raise_pending(self):
+        if self._errors:
+            raise self._errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't mask the original error; just let queued writes finish
+            self._pool.shutdown(wait=True)
+        return False
@@ -0,0 +1,93 @@
+# lsb.py — Bit layout shared by the classic and masked embedders/extractors
+# A layout is (lsb_depth, channels): the `lsb_depth` lowest bits (1..4) of each selected
+# channel (bitmask of B, G, R) carry payload. Bits are laid out pixel by pixel (raster or
+# mask order), then channel by channel in BGR order, then from the highest of the
+# `lsb_depth` bits down to bit 0, so (1, CHANNEL_BLUE) is exactly the original blue-LSB
+# layout.
+import numpy as np
+
+from stream_header import CHANNEL_BLUE, CHANNEL_GREEN, CHANNEL_RED
+
+MAX_LSB_DEPTH = 4
+CHANNEL_BITS = (CHANNEL_BLUE, CHANNEL_GREEN, CHANNEL_RED)   # BGR order, as stored by OpenCV
+DEFAULT_LAYOUT = (1, CHANNEL_BLUE)
+
+# Function to turn a channel spec such as "b", "bg" or "bgr" into a channel bitmask
+def parse_channels(spec):
+    channels = 0
+    for c in spec.lower():
+        if c not in "bgr":
+            raise ValueError(f"Unknown channel {c!r} in {spec!r} (expected a combination of b, g, r)")
+        channels |= CHANNEL_BITS["bgr".index(c)]
+    if not channels:
+        raise ValueError("At least one channel is required.")
+    return channels
+
+# Function to format a channel bitmask as "b", "bg", "bgr", ...
+def format_channels(channels):
+    return "".join(c for c, bit in zip("bgr", CHANNEL_BITS) if channels & bit)
+
+# Function to list the frame channel indices selected by a channel bitmask
+def channel_indices(channels):
+    return [i for i, bit in enumerate(CHANNEL_BITS) if channels & bit]
+
+def check_layout(lsb_depth, channels):
+    if not 1 <= lsb_depth <= MAX_LSB_DEPTH:
+        raise ValueError(f"lsb_depth must be between 1 and {MAX_LSB_DEPTH}.")
+    if not channels or channels & ~(CHANNEL_BLUE | CHANNEL_GREEN | CHANNEL_RED):
+        raise ValueError(f"Invalid channel mask: {channels:#x}")
+
+# Every valid layout, the original one first (extractors probe them in this order)
+LAYOUTS = [DEFAULT_LAYOUT] + [(depth, channels) for depth in range(1, MAX_LSB_DEPTH + 1)
+                              for channels in range(1, 8) if (depth, channels) != DEFAULT_LAYOUT]
+
+def bits_per_pixel(lsb_depth=1, channels=CHANNEL_BLUE):
+    return lsb_depth * len(channel_indices(channels))
+
+# Function to compute how many payload bits a frame of `frame_shape` holds (whole bytes)
+def frame_capacity_bits(frame_shape, lsb_depth=1, channels=CHANNEL_BLUE):
+    return frame_shape[0] * frame_shape[1] * bits_per_pixel(lsb_depth, channels) // 8 * 8
+
+# Function to select the pixel rows holding bits [bit_offset, bit_offset + n_bits) of a
+# (N, C) pixel array; `rows` maps layout pixel order to array rows (mask order) if given.
+# Returns the row selection, the index of the first sample in the block and the sample count.
+def _sample_block(n_bits, bit_offset, lsb_depth, n_channels, rows):
+    s0 = bit_offset // lsb_depth
+    s1 = -(-(bit_offset + n_bits) // lsb_depth)
+    p0 = s0 // n_channels
+    p1 = -(-s1 // n_channels)
+    sel = np.arange(p0, p1) if rows is None else rows[p0:p1]
+    return sel, s0 - p0 * n_channels, s1 - s0, s0
+
+def _shifts(lsb_depth):
+    return np.arange(lsb_depth - 1, -1, -1, dtype=np.uint8)
+
+# Vectorized write: stores `bits` (uint8 0/1 array) at layout position `bit_offset` of
+# `pixels`, an (N, C) uint8 array (e.g. frame.reshape(-1, C)) modified in place. Bits of
+# a partially written sample that fall outside the range are left as they were.
+def write_lsb_bits(pixels, bits, bit_offset, lsb_depth, channels, rows=None):
+    chans = channel_indices(channels)
+    sel, lo, count, s0 = _sample_block(bits.shape[0], bit_offset, lsb_depth, len(chans), rows)
+    index = np.ix_(sel, chans)
+    block = pixels[index]
+    samples = block.reshape(-1)[lo:lo + count]
+
+    shifts = _shifts(lsb_depth)
+    sample_bits = ((samples[:, None] >> shifts) & 1).reshape(-1)
+    start = bit_offset - s0 * lsb_depth
+    sample_bits[start:start + bits.shape[0]] = bits
+    values = (sample_bits.reshape(-1, lsb_depth) << shifts).sum(axis=1, dtype=np.uint8)
+
+    low_mask = np.uint8((1 << lsb_depth) - 1)
+    block.reshape(-1)[lo:lo + count] = (samples & ~low_mask) | values
+    pixels[index] = block
+
+# Vectorized read: returns `n_bits` bits (uint8 0/1 array) from layout position
+# `bit_offset` of `pixels`, an (N, C) uint8 array.
+def read_lsb_bits(pixels, n_bits, bit_offset, lsb_depth, channels, rows=None):
+    chans = channel_indices(channels)
+    sel, lo, count, s0 = _sample_block(n_bits, bit_offset, lsb_depth, len(chans), rows)
+    samples = pixels[np.ix_(sel, chans)].reshape(-1)[lo:lo + count]
+    sample_bits = ((samples[:, None] >> _shifts(lsb_depth)) & 1).reshape(-1)
+    start = bit_offset - s0 * lsb_depth
+    return sample_bits[start:start + n_bits]
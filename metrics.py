@@ -0,0 +1,193 @@
+# metrics.py — Shared instrumentation: per-stage timers, counters, log levels and an
+# optional JSON-lines metrics sink. Timers cost about a microsecond, so they stay on for
+# every frame; the console only gets a summary, never a line per frame.
+#
+# Library code records into the process-wide registry (add / timer / incr) and logs
+# through the "stego" logger. Entry points call configure() once (or
+# configure_from_args() with add_metrics_args()) and report() at the end.
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # POSIX only; peak memory is reported as None elsewhere
+except ImportError:
+    resource = None
+
+LOGGER_NAME = "stego"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+LOG_LEVEL_ENV = "STEGO_LOG_LEVEL"   # optional; default log level for scripts without flags
+METRICS_ENV = "STEGO_METRICS"       # optional; path of the JSON-lines metrics sink
+
+# --- Stage names (timers) ---
+DECODE = "decode"        # video / image decoding
+EMBED = "embed"          # LSB writes
+EXTRACT = "extract"      # LSB reads
+ENCODE = "encode"        # video encoding
+WRITE = "write"          # frame encode + disk write (PNG / npy)
+MASK = "mask"            # mask scoring / thresholding
+KDF = "kdf"              # scrypt (cache misses only)
+AEAD = "aead"            # AES-GCM seal / open
+COMPRESS = "compress"    # payload (de)compression
+ECC = "ecc"              # Reed-Solomon encode / check / correct
+SCATTER = "scatter"      # keyed pixel orders (cache misses only)
+
+log = logging.getLogger(LOGGER_NAME)
+
+_lock = threading.Lock()
+_stages = {}            # name -> [calls, seconds, bytes]
+_counters = {}          # name -> int
+_started = time.perf_counter()
+_sink = None
+_trace = False
+
+def configure(level=None, metrics_file=None, trace=False):
+    """Set the log level and (optionally) open a JSON-lines metrics sink.
+
+    `level` defaults to $STEGO_LOG_LEVEL or INFO, `metrics_file` to $STEGO_METRICS.
+    With `trace`, every timed call is also written to the sink as a "span" event.
+    """
+    global _sink, _trace
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or "INFO").upper()
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level: {level!r} (expected one of {LOG_LEVELS})")
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(level)
+
+    metrics_file = metrics_file or os.environ.get(METRICS_ENV)
+    with _lock:
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+        if metrics_file:
+            _sink = open(metrics_file, "a", encoding="utf-8", buffering=1)
+        _trace = bool(trace and _sink)
+    return log
+
+def add_metrics_args(ap):
+    ap.add_argument("--log_level", choices=LOG_LEVELS, default=None,
+                    help=f"Console verbosity (default: ${LOG_LEVEL_ENV} or INFO)")
+    ap.add_argument("--metrics_file", default=None,
+                    help=f"Append JSON-lines metrics to this file (default: ${METRICS_ENV})")
+    ap.add_argument("--trace", action="store_true",
+                    help="Also write one metrics line per timed call (needs --metrics_file)")
+
+def configure_from_args(args):
+    return configure(args.log_level, args.metrics_file, args.trace)
+
+def reset():
+    """Clear all timers and counters and restart the wall clock."""
+    global _started
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+
+def add(stage, seconds, n_bytes=0, calls=1):
+    """Charge `seconds` (and `n_bytes` processed) to `stage`."""
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = [0, 0.0, 0]
+        entry[0] += calls
+        entry[1] += seconds
+        entry[2] += n_bytes
+        if _trace:
+            _write_event({"event": "span", "stage": stage, "seconds": seconds, "bytes": n_bytes})
+
+@contextmanager
+def timer(stage, n_bytes=0):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(stage, time.perf_counter() - start, n_bytes)
+
+def show_progress():
+    """Whether progress bars should be drawn (log level INFO or more verbose)."""
+    return log.isEnabledFor(logging.INFO)
+
+def incr(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def run_with_snapshot(fn, job):
+    """Pool-worker entry point: fn(job) on a cleared registry, plus snapshot() for the parent
+    to merge(). Submit it as functools.partial(metrics.run_with_snapshot, fn)."""
+    reset()
+    return fn(job), snapshot()
+
+def merge(snapshot):
+    """Fold a snapshot() taken in another process (e.g. a pool worker) into this registry."""
+    for stage, s in snapshot["stages"].items():
+        add(stage, s["seconds"], s["bytes"], s["calls"])
+    for name, n in snapshot["counters"].items():
+        incr(name, n)
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def snapshot():
+    """Current totals: per-stage calls/seconds/bytes and rates, counters, frames/s, peak RSS."""
+    with _lock:
+        elapsed = time.perf_counter() - _started
+        stages = {}
+        for name, (calls, seconds, n_bytes) in _stages.items():
+            stages[name] = {
+                "calls": calls,
+                "seconds": round(seconds, 6),
+                "bytes": n_bytes,
+                "per_s": round(calls / seconds, 2) if seconds > 0 else None,
+                "mb_per_s": round(n_bytes / (1024 * 1024) / seconds, 2) if n_bytes and seconds > 0 else None,
+            }
+        counters = dict(_counters)
+    frames = counters.get("frames_decoded", 0)
+    return {
+        "elapsed_s": round(elapsed, 6),
+        "frames_per_s": round(frames / elapsed, 2) if frames and elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+        "counters": counters,
+    }
+
+def emit(event, **fields):
+    """Write one event to the metrics sink (no-op unless a sink is configured)."""
+    if _sink is None:
+        return
+    with _lock:
+        _write_event(dict(fields, event=event))
+
+def _write_event(record):
+    # Caller holds _lock
+    if _sink is not None:
+        record.setdefault("ts", round(time.time(), 6))
+        record.setdefault("pid", os.getpid())
+        _sink.write(json.dumps(record, sort_keys=True) + "\n")
+
+def report(name="run", **fields):
+    """Log a per-stage summary and write it to the sink as a "summary" event; returns it."""
+    summary = snapshot()
+    summary.update(fields)
+    for stage, s in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+        rate = f"{s['mb_per_s']:9.1f} MB/s" if s["mb_per_s"] else " " * 14
+        log.info(f"   {stage:<10} {s['seconds'] * 1000:10.1f} ms  {s['calls']:7d} calls {rate}")
+    counters = ", ".join(f"{k}={v}" for k, v in sorted(summary["counters"].items()))
+    if counters:
+        log.info(f"   {counters}")
+    fps = f"{summary['frames_per_s']:.1f} frames/s, " if summary["frames_per_s"] else ""
+    peak = f"peak RSS {summary['peak_rss_mb']} MB, " if summary["peak_rss_mb"] is not None else ""
+    log.info(f"   {fps}{peak}{summary['elapsed_s']:.2f} s elapsed")
+    emit("summary", name=name, **summary)
+    return summary
@@ -3,15 +3,38 @@
 embed_msg_masked.py — LSB embed using content-aware masks
 - Reads encrypted text file (bytes).
 - Prefixes payload with 32-bit big-endian length (bytes).
-- Embeds bits into BLUE-channel LSBs where mask==255.
-- Writes modified frames as PNG to preserve LSBs.
+- Embeds bits into BLUE-channel LSBs where mask==255. With --lsb_depth/--channels, the
+  k low bits of the chosen B/G/R channels are used instead and the length prefix is
+  replaced by a stream header recording that layout (the extractor detects it).
+- Masks come from --masks_dir (PNG masks or a packed mask store), or with --derive_masks are computed on the fly from
+  LSB-cleared frames (the extractor re-derives the same masks from the stego frames).
+- With --scatter, bits go to the eligible pixels in a passphrase-keyed order (scatter.py)
+  rather than raster order. That costs real time: at 1080p (one core) a masked frame takes
+  ~20 ms scattered vs ~5 ms in raster order, at 4k ~145 ms vs ~21 ms.
+- Writes modified frames as PNG (or raw .npy) to preserve LSBs, encoded on a thread pool.
+  Frames after the end of the payload are not decoded at all: they are hard-linked (or
+  copied) into the output folder as they are, unless --passthrough encode is given.
 """
 import os
+import sys
+import time
 import cv2
 import argparse
 import numpy as np
 from tqdm import tqdm
 
+# Shared helpers (frame writer, metrics, ...) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from metrics import log
+from frame_writer import DEFAULT_PNG_COMPRESSION, FRAME_FORMATS, PASSTHROUGH_MODES, FrameWriter
+from lsb import DEFAULT_LAYOUT, MAX_LSB_DEPTH, bits_per_pixel, format_channels, parse_channels, write_lsb_bits
+from mask_generator import add_mask_args, derive_mask, mask_kwargs
+from mask_store import MaskStore, is_mask_store, mask_pixels
+from scatter import mask_rows, scatter_key
+from stream_header import CHANNEL_BLUE, FLAG_SCATTERED, pack_header
+from Encryption import get_passphrase
+
 def bytes_to_bits(b: bytes):
     return np.unpackbits(np.frombuffer(b, dtype=np.uint8))
 
@@ -20,15 +43,17 @@ def int32_to_bits(n: int):
     arr = np.array([(n >> shift) & 0xFF for shift in (24,16,8,0)], dtype=np.uint8)
     return np.unpackbits(arr)
 
-def embed_bits_in_frame(img, mask, bits, bit_idx):
-    # img: HxWx3 uint8 (BGR), mask: HxW {0,255}
+def embed_bits_in_frame(img, mask, bits, bit_idx, lsb_depth=1, channels=CHANNEL_BLUE, scatter_key=None):
+    # img: HxWx3 uint8 (BGR), mask: HxW {0,255} (or bool, from a mask store)
+    # scatter_key: visit the eligible pixels in that key's order instead of raster order
+    if (lsb_depth, channels) != DEFAULT_LAYOUT:
+        return embed_bits_in_frame_layout(img, mask, bits, bit_idx, lsb_depth, channels, scatter_key)
     H, W, _ = img.shape
     B = img[:,:,0]  # Blue channel
     flat_B = B.reshape(-1)
-    flat_mask = (mask.reshape(-1) == 255)
 
-    # indices where we can write
-    idxs = np.nonzero(flat_mask)[0]
+    # indices where we can write, in raster or keyed order (see scatter.py)
+    idxs = mask_rows(mask_pixels(mask), scatter_key)
     capacity = idxs.shape[0]
 
     # how many bits can we write here
@@ -45,48 +70,116 @@ def embed_bits_in_frame(img, mask, bits, bit_idx):
     img[:,:,0] = B
     return img, bit_idx, capacity
 
+def embed_bits_in_frame_layout(img, mask, bits, bit_idx, lsb_depth, channels, scatter_key=None):
+    # Same contract as embed_bits_in_frame; every eligible pixel holds lsb_depth bits per channel
+    idxs = mask_rows(mask_pixels(mask), scatter_key)
+    capacity = idxs.shape[0] * bits_per_pixel(lsb_depth, channels)
+    write_n = min(capacity, bits.shape[0] - bit_idx)
+    if write_n > 0:
+        write_lsb_bits(img.reshape(-1, img.shape[2]), bits[bit_idx:bit_idx + write_n], 0,
+                       lsb_depth, channels, rows=idxs)
+        bit_idx += write_n
+    return img, bit_idx, capacity
+
 def main():
     ap = argparse.ArgumentParser(description="Embed message bits using masks (blue-channel LSB)")
     ap.add_argument("--frames_dir", required=True, help="Input frames directory (original frames)")
-    ap.add_argument("--masks_dir", required=True, help="Masks directory created by mask_generator.py")
+    ap.add_argument("--masks_dir", default=None,
+                    help="Masks directory (or mask store) created by mask_generator.py")
+    ap.add_argument("--derive_masks", action="store_true",
+                    help="Mask-free mode: derive masks from LSB-cleared frames instead of --masks_dir")
     ap.add_argument("--message_file", required=True, help="Encrypted message file to embed")
     ap.add_argument("--out_dir", required=True, help="Output directory for modified frames (PNG)")
+    ap.add_argument("--workers", type=int, default=None, help="Frame encoder threads (default: all cores)")
+    ap.add_argument("--png_compression", type=int, default=DEFAULT_PNG_COMPRESSION,
+                    help="PNG compression level 0 (fastest) .. 9 (smallest)")
+    ap.add_argument("--format", choices=FRAME_FORMATS, default="png",
+                    help="Output frame format: png, or npy for raw arrays (no encoding)")
+    ap.add_argument("--passthrough", choices=PASSTHROUGH_MODES + ("encode",), default="link",
+                    help="Frames past the payload: hard-link or copy the source file, or decode + re-encode")
+    ap.add_argument("--lsb_depth", type=int, choices=range(1, MAX_LSB_DEPTH + 1), default=1,
+                    help="Low bits used per channel sample (more bits = fewer frames touched)")
+    ap.add_argument("--channels", type=parse_channels, default=format_channels(CHANNEL_BLUE),
+                    help="Channels that carry payload bits, any of b, g, r (e.g. bgr)")
+    ap.add_argument("--scatter", action="store_true",
+                    help="Spread the bits over the eligible pixels in a passphrase-keyed order "
+                         "(the extractor needs --scatter and the same passphrase)")
+    add_mask_args(ap)
+    metrics.add_metrics_args(ap)
     args = ap.parse_args()
+    if not args.derive_masks and args.masks_dir is None:
+        ap.error("either --masks_dir or --derive_masks is required")
+    metrics.configure_from_args(args)
 
-    os.makedirs(args.out_dir, exist_ok=True)
+    writer = FrameWriter(args.out_dir, workers=args.workers,
+                         png_compression=args.png_compression, fmt=args.format)
 
     # Read payload
     with open(args.message_file, "rb") as f:
         payload = f.read()
-    payload_bits = np.concatenate([int32_to_bits(len(payload)), bytes_to_bits(payload)])
+    key = scatter_key(get_passphrase()) if args.scatter else None
+    if (args.lsb_depth, args.channels) == DEFAULT_LAYOUT:
+        prefix_bits = int32_to_bits(len(payload))
+    else:
+        # bits_per_frame is 0: capacity varies with each frame's mask
+        flags = FLAG_SCATTERED if key is not None else 0
+        prefix_bits = bytes_to_bits(pack_header(len(payload), 0, flags=flags, lsb_depth=args.lsb_depth,
+                                                channels=args.channels))
+    payload_bits = np.concatenate([prefix_bits, bytes_to_bits(payload)])
 
     # Gather frames and masks (match by sorted order/filename)
     frame_names = sorted([n for n in os.listdir(args.frames_dir) if n.lower().endswith((".png",".jpg",".jpeg"))])
-    mask_names = sorted([n for n in os.listdir(args.masks_dir) if n.lower().endswith(".png")])
+    store = None
+    if args.derive_masks:
+        mask_names = [None] * len(frame_names)
+    elif is_mask_store(args.masks_dir):
+        store = MaskStore(args.masks_dir)
+        mask_names = store.names
+    else:
+        mask_names = sorted([n for n in os.listdir(args.masks_dir) if n.lower().endswith(".png")])
 
     if len(frame_names) != len(mask_names):
-        print(f"WARNING: frame count ({len(frame_names)}) != mask count ({len(mask_names)}). Proceeding by sorted order.")
+        log.warning(f"Frame count ({len(frame_names)}) != mask count ({len(mask_names)}). Proceeding by sorted order.")
 
     bit_idx = 0
     total_capacity = 0
+    prev_gray = None
 
-    for fn, mn in tqdm(list(zip(frame_names, mask_names)), desc="Embedding"):
-        fp = os.path.join(args.frames_dir, fn)
-        mp = os.path.join(args.masks_dir, mn)
-        img = cv2.imread(fp, cv2.IMREAD_COLOR)
-        mask = cv2.imread(mp, cv2.IMREAD_GRAYSCALE)
-        if img is None or mask is None:
-            continue
-        img, bit_idx, cap = embed_bits_in_frame(img, mask, payload_bits, bit_idx)
-        total_capacity += cap
-        outp = os.path.join(args.out_dir, os.path.splitext(fn)[0] + ".png")
-        cv2.imwrite(outp, img)
+    with writer:
+        for fn, mn in tqdm(list(zip(frame_names, mask_names)), desc="Embedding",
+                           disable=not metrics.show_progress()):
+            fp = os.path.join(args.frames_dir, fn)
+            if bit_idx >= payload_bits.shape[0] and args.passthrough != "encode":
+                # Payload complete: this frame is left untouched
+                writer.passthrough(os.path.splitext(fn)[0], fp, args.passthrough)
+                continue
+            with metrics.timer(metrics.DECODE):
+                img = cv2.imread(fp, cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            metrics.incr("frames_decoded")
+            if mn is None:
+                # Derived before embedding; LSB-invariant, so the extractor gets the same mask
+                mask, prev_gray = derive_mask(img, prev_gray, **mask_kwargs(args, lsb_invariant=True))
+            elif store is not None:
+                mask = store.mask(mn)
+            else:
+                mask = cv2.imread(os.path.join(args.masks_dir, mn), cv2.IMREAD_GRAYSCALE)
+                if mask is None:
+                    continue
+            start, start_idx = time.perf_counter(), bit_idx
+            img, bit_idx, cap = embed_bits_in_frame(img, mask, payload_bits, bit_idx, args.lsb_depth, args.channels, key)
+            metrics.add(metrics.EMBED, time.perf_counter() - start, (bit_idx - start_idx) // 8)
+            metrics.incr("bytes_embedded", (bit_idx - start_idx) // 8)
+            total_capacity += cap
+            writer.write(os.path.splitext(fn)[0], img)
 
     if bit_idx < payload_bits.shape[0]:
         need = payload_bits.shape[0] - bit_idx
         raise SystemExit(f"ERROR: Ran out of capacity. Needed {payload_bits.shape[0]} bits, wrote {bit_idx}. Short by {need} bits. "
                          f"Consider increasing mask keep_ratio or number of frames. Total per-frame capacity written: {total_capacity}.")
-    print(f"Done. Embedded {bit_idx} bits into {len(frame_names)} frames. Saved to {args.out_dir}")
+    log.info(f"Done. Embedded {bit_idx} bits into {len(frame_names)} frames. Saved to {args.out_dir}")
+    metrics.report("embed_msg_masked", bits_embedded=bit_idx)
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,43 @@
 #!/usr/bin/env python3
 """
 extract_modified_frames_masked.py — Extract bits using the SAME masks
-- Reads modified PNG frames and corresponding masks.
+- Reads modified PNG frames and corresponding masks (or, with --derive_masks,
+  re-derives the masks from the LSB-cleared stego frames themselves).
 - Reads 32-bit big-endian prefix to get payload length.
-- Extracts payload bits from BLUE-channel LSBs where mask==255.
+- Extracts payload bits from BLUE-channel LSBs where mask==255, in a single pass:
+  the length is parsed as soon as 32 bits have arrived and reading stops the moment
+  the payload is complete. Decoded frames/masks are kept in a small LRU cache.
+- Streams embedded with --lsb_depth/--channels start with a stream header instead of
+  the length prefix; its layout is detected from the first frame automatically.
+- With stored masks, frames are read in parallel: mask popcounts give every frame's
+  capacity up front, and their prefix sum tells each worker where its bits go. A packed
+  mask store (mask_generator.py --format store) has them in its index, no decode needed.
+- With --scatter, bits are read from the eligible pixels in the passphrase-keyed order
+  used by embed_msg_masked.py --scatter.
 - Writes reconstructed encrypted message to file.
 """
 import os
+import sys
 import cv2
+import functools
 import argparse
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+# Shared helpers (frame reader, metrics, ...) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from metrics import log
+from extract_modified_frames import split_shards
+from frame_writer import read_frame
+from lsb import DEFAULT_LAYOUT, LAYOUTS, bits_per_pixel, format_channels, read_lsb_bits
+from mask_generator import add_mask_args, derive_mask, mask_kwargs
+from mask_store import MaskStore, is_mask_store, mask_pixels
+from scatter import mask_rows, scatter_key
+from Encryption import get_passphrase
+from stream_header import CHANNEL_BLUE, HEADER_BITS, unpack_header
+
 def bits_to_bytes(bits: np.ndarray) -> bytes:
     pad = (-len(bits)) % 8
     if pad:
@@ -19,91 +45,290 @@ def bits_to_bytes(bits: np.ndarray) -> bytes:
     arr = np.packbits(bits).tobytes()
     return arr
 
-def read_bits_from_frame(img, mask, need_bits, bit_idx):
+FRAME_CACHE_SIZE = 8
+LENGTH_BITS = 32
+
+def read_bits_from_frame(img, mask, need_bits, bit_idx, frame_offset=0, lsb_depth=1, channels=CHANNEL_BLUE,
+                         scatter_key=None, cache_rows=False):
+    # frame_offset: number of this frame's eligible bits already consumed
+    # scatter_key: the eligible pixels are read in that key's order (see scatter.py)
+    # cache_rows: keep that order for this mask, for callers that read the same frame again
+    if (lsb_depth, channels) != DEFAULT_LAYOUT:
+        return read_bits_from_frame_layout(img, mask, need_bits, bit_idx, frame_offset, lsb_depth, channels,
+                                           scatter_key, cache_rows)
     H, W, _ = img.shape
     B = img[:,:,0]  # Blue channel
     flat_B = B.reshape(-1)
-    flat_mask = (mask.reshape(-1) == 255)
-    idxs = np.nonzero(flat_mask)[0]
+    idxs = mask_rows(mask_pixels(mask), scatter_key, cache_rows)
     capacity = idxs.shape[0]
 
     remain = need_bits - bit_idx
-    take = min(capacity, remain)
+    take = min(capacity - frame_offset, remain)
     if take > 0:
-        grabbed = flat_B[idxs[:take]] & 1
+        grabbed = flat_B[idxs[frame_offset:frame_offset + take]] & 1
         return grabbed, bit_idx + take, capacity
     return np.array([], dtype=np.uint8), bit_idx, capacity
 
-def main():
-    ap = argparse.ArgumentParser(description="Extract message bits using masks (blue-channel LSB)")
-    ap.add_argument("--frames_dir", required=True, help="Directory of modified frames (PNG)")
-    ap.add_argument("--masks_dir", required=True, help="Masks directory used during embedding")
-    ap.add_argument("--out_file", required=True, help="Output file path for reconstructed encrypted message")
-    args = ap.parse_args()
+def read_bits_from_frame_layout(img, mask, need_bits, bit_idx, frame_offset, lsb_depth, channels, scatter_key=None,
+                                cache_rows=False):
+    # Same contract as read_bits_from_frame; every eligible pixel holds lsb_depth bits per channel
+    idxs = mask_rows(mask_pixels(mask), scatter_key, cache_rows)
+    capacity = idxs.shape[0] * bits_per_pixel(lsb_depth, channels)
+    take = min(capacity - frame_offset, need_bits - bit_idx)
+    if take > 0:
+        grabbed = read_lsb_bits(img.reshape(-1, img.shape[2]), take, frame_offset, lsb_depth, channels, rows=idxs)
+        return grabbed, bit_idx + take, capacity
+    return np.array([], dtype=np.uint8), bit_idx, capacity
 
-    frame_names = sorted([n for n in os.listdir(args.frames_dir) if n.lower().endswith(".png")])
-    mask_names = sorted([n for n in os.listdir(args.masks_dir) if n.lower().endswith(".png")])
+def bits_to_length(bits: np.ndarray) -> int:
+    # 4 bytes big-endian length
+    return int.from_bytes(np.packbits(bits[:LENGTH_BITS]).tobytes(), "big")
 
-    if len(frame_names) != len(mask_names):
-        print(f"WARNING: frame count ({len(frame_names)}) != mask count ({len(mask_names)}). Proceeding by sorted order.")
+def prefix_to_length(bits: np.ndarray, prefix_bits: int) -> int:
+    if prefix_bits == LENGTH_BITS:
+        return bits_to_length(bits)
+    header = unpack_header(np.packbits(bits[:prefix_bits]).tobytes())
+    if header is None:
+        raise ValueError("No stream header found in frame 0.")
+    return header["payload_length"]
 
-    # First, read the first 32 bits to know payload length
-    need_bits = 32
-    bit_idx = 0
-    header_bits = []
+def make_frame_loader(cache_size=FRAME_CACHE_SIZE):
+    """Frame/mask reader with an LRU cache of recently decoded images (keyed by path)."""
+    @functools.lru_cache(maxsize=cache_size)
+    def load(path, grayscale=False):
+        with metrics.timer(metrics.DECODE):
+            if grayscale:
+                return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            return read_frame(path)
+    return load
 
-    for fn, mn in tqdm(list(zip(frame_names, mask_names)), desc="Reading header"):
-        if bit_idx >= need_bits:
-            break
-        fp = os.path.join(args.frames_dir, fn)
-        mp = os.path.join(args.masks_dir, mn)
-        img = cv2.imread(fp, cv2.IMREAD_COLOR)
-        mask = cv2.imread(mp, cv2.IMREAD_GRAYSCALE)
-        if img is None or mask is None:
+def make_mask_loader(masks_dir, load):
+    """Mask reader by name: PNG masks through the frame cache, or a packed mask store."""
+    if is_mask_store(masks_dir):
+        return MaskStore(masks_dir).mask
+    return lambda name: load(os.path.join(masks_dir, name), grayscale=True)
+
+def iter_frames_with_masks(args, frame_names, mask_names, load=None, lsb_bits=1):
+    """Yield (img, mask) pairs; masks are read from disk or derived from the frames."""
+    load = load or make_frame_loader()
+    get_mask = make_mask_loader(args.masks_dir, load) if args.masks_dir else None
+    prev_gray = None
+    for fn, mn in zip(frame_names, mask_names):
+        img = load(os.path.join(args.frames_dir, fn))
+        if img is None:
             continue
-        grabbed, bit_idx, _ = read_bits_from_frame(img, mask, need_bits, bit_idx)
-        if grabbed.size:
-            header_bits.append(grabbed)
+        metrics.incr("frames_decoded")
+        if mn is None:
+            mask, prev_gray = derive_mask(img, prev_gray, **mask_kwargs(args, True, lsb_bits))
+        else:
+            mask = get_mask(mn)
+            if mask is None:
+                continue
+        yield img, mask
 
-    if bit_idx < need_bits:
-        raise SystemExit(f"ERROR: Not enough capacity to read header. Read {bit_idx}/32 bits.")
+def detect_layout(img, mask_for, scatter_key=None):
+    """Layout of a masked stream, from its first frame and `mask_for(lsb_depth)`.
 
-    header_bits = np.concatenate(header_bits)
-    header_bytes = np.frombuffer(np.packbits(header_bits), dtype=np.uint8)
-    # 4 bytes big-endian length
-    payload_len = (int(header_bytes[0])<<24) | (int(header_bytes[1])<<16) | (int(header_bytes[2])<<8) | int(header_bytes[3])
+    Non-default layouts start with a stream header written in that layout; anything
+    else is the legacy 32-bit length prefix in blue-channel LSBs.
+    """
+    for lsb_depth, channels in LAYOUTS[1:]:
+        grabbed, n, _ = read_bits_from_frame(img, mask_for(lsb_depth), HEADER_BITS, 0, 0, lsb_depth, channels,
+                                             scatter_key, cache_rows=True)
+        if n < HEADER_BITS:
+            continue
+        header = unpack_header(np.packbits(grabbed).tobytes())
+        if header is not None and (header["lsb_depth"], header["channels"]) == (lsb_depth, channels):
+            return lsb_depth, channels
+    return DEFAULT_LAYOUT
+
+def extract_payload(frames_with_masks, lsb_depth=1, channels=CHANNEL_BLUE, scatter_key=None):
+    """Single-pass extraction from (img, mask) pairs; stops pulling frames once done.
 
-    # Now read the payload bits
-    payload_bits_needed = payload_len * 8
-    total_needed = 32 + payload_bits_needed
+    Returns (payload bytes, payload length from the prefix, bits read).
+    """
+    # The default layout uses the 32-bit length prefix, the others a stream header
+    prefix_bits = LENGTH_BITS if (lsb_depth, channels) == DEFAULT_LAYOUT else HEADER_BITS
+    need_bits = prefix_bits          # until the length prefix has been read
+    payload_len = None
     bit_idx = 0
-    all_bits = []
+    chunks = []
 
-    for fn, mn in tqdm(list(zip(frame_names, mask_names)), desc="Reading payload"):
-        if bit_idx >= total_needed:
+    for img, mask in frames_with_masks:
+        frame_offset = 0
+        while bit_idx < need_bits:
+            with metrics.timer(metrics.EXTRACT):
+                grabbed, new_idx, _ = read_bits_from_frame(img, mask, need_bits, bit_idx, frame_offset,
+                                                           lsb_depth, channels, scatter_key)
+            if not grabbed.size:
+                break  # frame exhausted
+            chunks.append(grabbed)
+            frame_offset += new_idx - bit_idx
+            bit_idx = new_idx
+            if payload_len is None and bit_idx >= prefix_bits:
+                # Length known: keep going in this same frame with the real target
+                payload_len = prefix_to_length(np.concatenate(chunks), prefix_bits)
+                need_bits = prefix_bits + payload_len * 8
+        if payload_len is not None and bit_idx >= need_bits:
             break
-        fp = os.path.join(args.frames_dir, fn)
-        mp = os.path.join(args.masks_dir, mn)
-        img = cv2.imread(fp, cv2.IMREAD_COLOR)
-        mask = cv2.imread(mp, cv2.IMREAD_GRAYSCALE)
-        if img is None or mask is None:
-            continue
-        grabbed, bit_idx2, _ = read_bits_from_frame(img, mask, total_needed, bit_idx)
-        if grabbed.size:
-            all_bits.append(grabbed)
-        bit_idx = bit_idx2
 
-    if bit_idx < total_needed:
-        raise SystemExit(f"ERROR: Not enough capacity. Read {bit_idx}/{total_needed} bits.")
+    if payload_len is None:
+        raise ValueError(f"Not enough capacity to read header. Read {bit_idx}/{prefix_bits} bits.")
+    if bit_idx < need_bits:
+        raise ValueError(f"Not enough capacity. Read {bit_idx}/{need_bits} bits.")
 
-    all_bits = np.concatenate(all_bits)
+    all_bits = np.concatenate(chunks)
     # strip header bits
-    payload_bits = all_bits[32:32+payload_bits_needed]
-    payload = bits_to_bytes(payload_bits)
+    payload = bits_to_bytes(all_bits[prefix_bits:need_bits])
+    return payload, payload_len, bit_idx
+
+def mask_capacity(mask, lsb_depth=1, channels=CHANNEL_BLUE):
+    """Payload bits a frame holds under `mask`: its popcount times the bits per pixel."""
+    return int(np.count_nonzero(mask_pixels(mask))) * bits_per_pixel(lsb_depth, channels)
+
+def _read_shard(job):
+    # Bits [0, take) of each frame in the shard, concatenated and packed
+    frames_dir, masks_dir, names, takes, lsb_depth, channels, key = job
+    load = make_frame_loader(1)
+    get_mask = make_mask_loader(masks_dir, load)
+    bits = []
+    for (fn, mn), take in zip(names, takes):
+        img = load(os.path.join(frames_dir, fn))
+        mask = get_mask(mn)
+        if img is None or mask is None:
+            raise ValueError(f"Unable to read frame {fn} or mask {mn}.")
+        metrics.incr("frames_decoded")
+        with metrics.timer(metrics.EXTRACT):
+            grabbed, _, _ = read_bits_from_frame(img, mask, take, 0, 0, lsb_depth, channels, key)
+        bits.append(grabbed)
+    bits = np.concatenate(bits) if bits else np.zeros(0, dtype=np.uint8)
+    return np.packbits(bits), bits.shape[0]
+
+def extract_payload_sharded(frames_dir, masks_dir, frame_names, mask_names, lsb_depth=1, channels=CHANNEL_BLUE,
+                            workers=None, load=None, scatter_key=None):
+    """Extraction with stored masks, frame ranges read by `workers` processes.
+
+    Only frame 0 (for the length prefix) and the masks are read up front; the prefix sum
+    of the mask capacities places every frame's bits in the stream. A mask store has the
+    popcounts in its index, so no mask is decoded for that. Returns the same
+    (payload bytes, payload length, bits read) as extract_payload.
+    """
+    workers = workers or os.cpu_count() or 1
+    load = load or make_frame_loader()
+    store = MaskStore(masks_dir) if is_mask_store(masks_dir) else None
+    get_mask = store.mask if store is not None else make_mask_loader(masks_dir, load)
+    prefix_bits = LENGTH_BITS if (lsb_depth, channels) == DEFAULT_LAYOUT else HEADER_BITS
+    first = load(os.path.join(frames_dir, frame_names[0])) if frame_names else None
+    first_mask = get_mask(mask_names[0]) if mask_names else None
+    if first is None or first_mask is None:
+        raise ValueError("Unable to read the first frame and mask.")
+    grabbed, n, _ = read_bits_from_frame(first, first_mask, prefix_bits, 0, 0, lsb_depth, channels, scatter_key)
+    if n < prefix_bits:
+        raise ValueError(f"Frame 0 holds only {n}/{prefix_bits} bits of the length prefix.")
+    payload_len = prefix_to_length(grabbed, prefix_bits)
+    need_bits = prefix_bits + payload_len * 8
+
+    # Prefix sum of capacities, over just enough masks to cover the payload
+    starts, takes = [], []
+    total = 0
+    for mn in mask_names[:len(frame_names)]:
+        if total >= need_bits:
+            break
+        if store is not None:
+            capacity = store.popcount(mn) * bits_per_pixel(lsb_depth, channels)
+        else:
+            mask = get_mask(mn)
+            if mask is None:
+                raise ValueError(f"Unable to read mask {mn}.")
+            capacity = mask_capacity(mask, lsb_depth, channels)
+        starts.append(total)
+        takes.append(min(capacity, need_bits - total))
+        total += takes[-1]
+    if total < need_bits:
+        raise ValueError(f"Not enough capacity. Read {total}/{need_bits} bits.")
+
+    shards = split_shards(len(takes), workers)
+    names = list(zip(frame_names, mask_names))
+    jobs = [(frames_dir, masks_dir, names[start:end], takes[start:end], lsb_depth, channels, scatter_key)
+            for start, end in shards]
+    if len(jobs) == 1:
+        results = [_read_shard(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            results = []
+            for result, snapshot in pool.map(functools.partial(metrics.run_with_snapshot, _read_shard), jobs):
+                metrics.merge(snapshot)
+                results.append(result)
+
+    # Stitch the shards together by their bit offsets
+    bits = np.empty(need_bits, dtype=np.uint8)
+    for (start, _), (packed, n_bits) in zip(shards, results):
+        bits[starts[start]:starts[start] + n_bits] = np.unpackbits(packed)[:n_bits]
+    return bits_to_bytes(bits[prefix_bits:need_bits]), payload_len, need_bits
+
+def main():
+    ap = argparse.ArgumentParser(description="Extract message bits using masks (blue-channel LSB)")
+    ap.add_argument("--frames_dir", required=True, help="Directory of modified frames (PNG or .npy)")
+    ap.add_argument("--masks_dir", default=None, help="Masks directory (or mask store) used during embedding")
+    ap.add_argument("--derive_masks", action="store_true",
+                    help="Mask-free mode: re-derive masks from the stego frames (same mask args as embedding)")
+    ap.add_argument("--out_file", required=True, help="Output file path for reconstructed encrypted message")
+    ap.add_argument("--frame_cache", type=int, default=FRAME_CACHE_SIZE,
+                    help="Number of decoded frames/masks kept in the LRU cache")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Processes reading frame ranges in parallel with --masks_dir (default: all cores)")
+    ap.add_argument("--scatter", action="store_true",
+                    help="The stream was embedded with --scatter (pixel order keyed by the passphrase)")
+    add_mask_args(ap)
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args()
+    if not args.derive_masks and args.masks_dir is None:
+        ap.error("either --masks_dir or --derive_masks is required")
+    metrics.configure_from_args(args)
+
+    frame_names = sorted([n for n in os.listdir(args.frames_dir) if n.lower().endswith((".png", ".npy"))])
+    if args.derive_masks:
+        mask_names = [None] * len(frame_names)
+    elif is_mask_store(args.masks_dir):
+        mask_names = MaskStore(args.masks_dir).names
+    else:
+        mask_names = sorted([n for n in os.listdir(args.masks_dir) if n.lower().endswith(".png")])
+
+    if len(frame_names) != len(mask_names):
+        log.warning(f"Frame count ({len(frame_names)}) != mask count ({len(mask_names)}). Proceeding by sorted order.")
+
+    load = make_frame_loader(args.frame_cache)
+    key = scatter_key(get_passphrase()) if args.scatter else None
+    lsb_depth, channels = DEFAULT_LAYOUT
+    first = load(os.path.join(args.frames_dir, frame_names[0])) if frame_names else None
+    if first is not None:
+        if mask_names[0] is None:
+            mask_for = lambda depth: derive_mask(first, None, **mask_kwargs(args, True, depth))[0]
+        else:
+            first_mask = make_mask_loader(args.masks_dir, load)(mask_names[0])
+            mask_for = lambda depth: first_mask if first_mask is not None else np.zeros(first.shape[:2], np.uint8)
+        lsb_depth, channels = detect_layout(first, mask_for, key)
+        log.info(f"Layout: {lsb_depth} bit(s) per sample in channels {format_channels(channels)}")
+
+    try:
+        if args.derive_masks or args.workers == 1:
+            # Derived masks depend on the previous frame, so frames are read in order
+            pairs = iter_frames_with_masks(args, frame_names, mask_names, load, lsb_bits=lsb_depth)
+            payload, payload_len, _ = extract_payload(tqdm(pairs, total=len(frame_names), desc="Extracting",
+                                                           disable=not metrics.show_progress()),
+                                                      lsb_depth, channels, key)
+        else:
+            payload, payload_len, _ = extract_payload_sharded(args.frames_dir, args.masks_dir, frame_names,
+                                                              mask_names, lsb_depth, channels, args.workers, load,
+                                                              key)
+    except ValueError as e:
+        raise SystemExit(f"ERROR: {e}")
 
     with open(args.out_file, "wb") as f:
         f.write(payload)
-    print(f"Wrote reconstructed encrypted message to: {args.out_file} (length {payload_len} bytes)")
+    metrics.incr("bytes_extracted", payload_len)
+    log.info(f"Wrote reconstructed encrypted message to: {args.out_file} (length {payload_len} bytes)")
+    metrics.report("extract_modified_frames_masked")
 
 if __name__ == "__main__":
     main()
@@ -3,86 +3,270 @@
 mask_generator.py — Path 1 (Content-aware embedding)
 Creates per-frame binary masks highlighting textured and/or moving regions.
 Now robust to mixed frame sizes.
+With --lsb_invariant, frames are scored with their LSBs cleared, so the same masks can
+be re-derived from the stego frames themselves (no masks need to be shipped).
+Frames are split into chunks handled by worker processes (--workers); each chunk re-reads
+the frame before it for the motion term, so the masks equal a sequential run. The keep
+threshold is found by selection rather than a full sort, with the same value np.quantile
+gives. --score_scale < 1 scores a downscaled frame (faster, masks no longer exact).
+With --format store, masks are bit-packed into one memory-mapped store (see mask_store.py).
 """
 import os
+import sys
 import cv2
 import argparse
+import functools
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+# Shared helpers (metrics, ...) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from lsb import MAX_LSB_DEPTH
+from metrics import log
+from extract_modified_frames import split_shards
+from mask_store import MaskStoreWriter, mask_pixels
+
+MIN_CHUNK_FRAMES = 8     # frames per chunk at least (each chunk re-reads one lookback frame)
+CHUNKS_PER_WORKER = 4    # a few chunks per worker, so uneven frames do not leave processes idle
+MASK_FORMATS = ("png", "store")
+SELECT_ROUNDS = 3        # histogram narrowing passes of the keep threshold search
+SELECT_MIN_WINDOW = 4096 # candidates left to np.partition directly
+
 def ensure_dir(p):
     os.makedirs(p, exist_ok=True)
 
+def frame_to_gray(img, lsb_invariant=False, lsb_bits=1):
+    # Clearing the LSBs has to happen per channel *before* the gray conversion: a flipped
+    # blue LSB can change the rounded gray value in any bit, so `gray & 0xFE` is not
+    # enough to make the score independent of the embedded payload.
+    if lsb_invariant:
+        img = img & ((0xFF << lsb_bits) & 0xFF)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+def scoring_gray(gray, score_scale=1.0):
+    # Gray image at the scoring resolution (unchanged at score_scale=1.0)
+    if score_scale >= 1.0:
+        return gray
+    size = (max(1, round(gray.shape[1] * score_scale)), max(1, round(gray.shape[0] * score_scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+def _norm01(x):
+    # In-place equivalent of (x - x.min()) / (x.max() - x.min() + 1e-8): one min/max pass
+    lo, hi, _, _ = cv2.minMaxLoc(x)
+    lo = np.float32(lo)
+    denom = np.float32(np.float32(hi) - lo) + np.float32(1e-8)
+    np.subtract(x, lo, out=x)
+    np.divide(x, denom, out=x)
+    return x
+
 def score_frame(gray, prev_gray=None, alpha_motion=0.5, resize_prev=True):
     # Texture score via Laplacian magnitude
-    lap = cv2.Laplacian(gray, cv2.CV_32F, ksize=3)
-    tex = np.abs(lap)
+    score = cv2.Laplacian(gray, cv2.CV_32F, ksize=3)
+    np.abs(score, out=score)
 
     # Motion score via frame difference
-    if prev_gray is None:
-        mot = np.zeros_like(gray, dtype=np.float32)
-    else:
+    if prev_gray is not None and prev_gray.shape != gray.shape:
         # If sizes differ, either resize prev or skip motion
-        if prev_gray.shape != gray.shape:
-            if resize_prev:
-                prev_gray = cv2.resize(prev_gray, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_AREA)
-            else:
-                prev_gray = None
-        if prev_gray is None:
-            mot = np.zeros_like(gray, dtype=np.float32)
+        if resize_prev:
+            prev_gray = cv2.resize(prev_gray, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_AREA)
         else:
-            mot = cv2.absdiff(gray, prev_gray).astype(np.float32)
+            prev_gray = None
 
-    # Normalize each to [0,1]
-    def norm01(x):
-        x = x - x.min()
-        d = x.max() - x.min()
-        return x / (d + 1e-8)
-
-    tex_n = norm01(tex)
-    mot_n = norm01(mot)
-    score = tex_n * (1.0 - alpha_motion) + mot_n * alpha_motion
+    # Normalize each to [0,1] and blend, in place. Without a previous frame the motion
+    # map is all zeros, which normalizes to zeros and adds nothing.
+    np.multiply(_norm01(score), 1.0 - alpha_motion, out=score)
+    if prev_gray is not None:
+        mot = cv2.absdiff(gray, prev_gray).astype(np.float32, copy=False)
+        np.multiply(_norm01(mot), alpha_motion, out=mot)
+        np.add(score, mot, out=score)
     return score
 
-def mask_from_score(score, keep_ratio=0.25, dilate=1):
+def _select_pair(score, lo, hi):
+    # The lo-th and hi-th smallest values of `score` without sorting it: a 256-bin
+    # histogram of the values quantized to uint8 (monotone, so bins never reorder values)
+    # finds the bins holding those ranks, and only their values are kept. Heavy-tailed
+    # scores can crowd one bin, so this narrows a few times before the final partition;
+    # a window of one repeated value (common, gray levels are integers) ends it early.
+    values = score.reshape(1, -1)   # a row: OpenCV is much slower on an (n, 1) column
+    vmin, vmax, _, _ = cv2.minMaxLoc(values)
+    for _ in range(SELECT_ROUNDS):
+        if vmin >= vmax or values.size <= SELECT_MIN_WINDOW:
+            break
+        scale = 255.0 / (vmax - vmin)
+        q = cv2.convertScaleAbs(values, alpha=scale, beta=-vmin * scale)
+        cum = np.cumsum(cv2.calcHist([q], [0], None, [256], [0, 256]).ravel().astype(np.int64))
+        b_lo = int(np.searchsorted(cum, lo, side="right"))
+        b_hi = int(np.searchsorted(cum, hi, side="right"))
+        below = int(cum[b_lo - 1]) if b_lo else 0
+        window = cv2.inRange(q, b_lo, b_hi)
+        vmin, vmax, _, _ = cv2.minMaxLoc(values, window)
+        if vmin >= vmax:
+            break
+        values = values[window.view(bool)].reshape(1, -1)
+        lo, hi = lo - below, hi - below
+    if vmin >= vmax:
+        value = values.dtype.type(vmin)
+        return value, value
+    part = np.partition(values.reshape(-1), (lo, hi))
+    return part[lo], part[hi]
+
+def score_threshold(score, keep_ratio=0.25):
+    """np.quantile(score, 1 - keep_ratio), bit for bit, from a selection instead of a sort."""
+    n = score.size
+    position = (n - 1) * (1.0 - keep_ratio)
+    lo = int(position)
+    hi = min(lo + 1, n - 1)
+    a, b = _select_pair(score, lo, hi)
+    # Interpolating between the two order statistics exactly as np.quantile does
+    return np.quantile(np.array([a, b], dtype=score.dtype), position - lo)
+
+def mask_from_score(score, keep_ratio=0.25, dilate=1, out_shape=None):
     # Keep top "keep_ratio" fraction of pixels
-    thresh_val = np.quantile(score, 1.0 - keep_ratio)
-    mask = (score >= thresh_val).astype(np.uint8) * 255
+    thresh_val = score_threshold(score, keep_ratio)
+    mask = np.greater_equal(score, thresh_val).view(np.uint8)
+    mask *= 255
+    if out_shape is not None and mask.shape != tuple(out_shape):
+        # Mask scored at a reduced resolution: back to frame size before dilating
+        mask = cv2.resize(mask, (out_shape[1], out_shape[0]), interpolation=cv2.INTER_NEAREST)
     if dilate > 0:
         k = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * dilate + 1, 2 * dilate + 1))
         mask = cv2.dilate(mask, k, iterations=1)
     return mask
 
-def main():
-    ap = argparse.ArgumentParser(description="Generate content-aware masks for frames")
-    ap.add_argument("--frames_dir", required=True, help="Input frames folder (e.g., output_frames)")
-    ap.add_argument("--out_dir", required=True, help="Output masks folder (will be created)")
+def derive_mask(img, prev_gray=None, keep_ratio=0.25, alpha_motion=0.5, dilate=1,
+                resize_prev=True, lsb_invariant=False, lsb_bits=1, score_scale=1.0):
+    """Mask for one BGR frame; also returns its (scoring) gray image to pass as `prev_gray` next time."""
+    with metrics.timer(metrics.MASK, img.nbytes):
+        gray = scoring_gray(frame_to_gray(img, lsb_invariant, lsb_bits), score_scale)
+        score = score_frame(gray, prev_gray, alpha_motion=alpha_motion, resize_prev=resize_prev)
+        return mask_from_score(score, keep_ratio=keep_ratio, dilate=dilate, out_shape=img.shape[:2]), gray
+
+def add_mask_args(ap):
+    """Mask parameters shared by the generator and the mask-free embed/extract modes."""
     ap.add_argument("--keep_ratio", type=float, default=0.25, help="Fraction of pixels to keep in mask (0..1)")
     ap.add_argument("--alpha_motion", type=float, default=0.5, help="Weight for motion vs texture (0..1)")
     ap.add_argument("--dilate", type=int, default=1, help="Dilate radius (pixels) to slightly expand mask")
     ap.add_argument("--no_resize_prev", action="store_true",
                     help="If set, do NOT resize previous frame; motion becomes zero when sizes differ.")
-    args = ap.parse_args()
+    ap.add_argument("--score_scale", type=float, default=1.0,
+                    help="Score frames downscaled by this factor (0..1]; masks are scaled back up. "
+                         "1.0 = full resolution (exact)")
 
-    ensure_dir(args.out_dir)
+def mask_kwargs(args, lsb_invariant, lsb_bits=None):
+    # lsb_bits: low bits cleared before scoring; must cover the embed --lsb_depth
+    return dict(keep_ratio=args.keep_ratio, alpha_motion=args.alpha_motion, dilate=args.dilate,
+                resize_prev=(not args.no_resize_prev), lsb_invariant=lsb_invariant,
+                lsb_bits=lsb_bits or getattr(args, "lsb_depth", 1), score_scale=args.score_scale)
 
-    names = sorted([n for n in os.listdir(args.frames_dir)
-                    if n.lower().endswith((".png", ".jpg", ".jpeg"))])
+# Function to load a frame for mask generation (None if unreadable)
+def read_frame(path):
+    with metrics.timer(metrics.DECODE):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is not None:
+        metrics.incr("frames_decoded")
+    return img
+
+def _mask_chunk(job):
+    # Masks for names[start:end]; the chunk looks back to the last readable frame before
+    # `start` for its first motion term, so its masks match a sequential run. PNG masks
+    # are written here; for a mask store the packed masks go back to the caller, which
+    # appends them in frame order.
+    frames_dir, out_dir, names, start, end, kwargs, fmt = job
     prev_gray = None
-    for n in tqdm(names, desc="Generating masks"):
-        p = os.path.join(args.frames_dir, n)
-        img = cv2.imread(p, cv2.IMREAD_COLOR)
+    for n in reversed(names[:start]):
+        img = read_frame(os.path.join(frames_dir, n))
+        if img is not None:
+            prev_gray = scoring_gray(frame_to_gray(img, kwargs["lsb_invariant"], kwargs["lsb_bits"]),
+                                     kwargs["score_scale"])
+            break
+    done, packed = 0, []
+    for n in names[start:end]:
+        img = read_frame(os.path.join(frames_dir, n))
         if img is None:
             # Skip unreadable files
             continue
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.float32)
-        score = score_frame(gray, prev_gray, alpha_motion=args.alpha_motion,
-                            resize_prev=(not args.no_resize_prev))
-        mask = mask_from_score(score, keep_ratio=args.keep_ratio, dilate=args.dilate)
-        outp = os.path.join(args.out_dir, os.path.splitext(n)[0] + "_mask.png")
-        cv2.imwrite(outp, mask)
-        prev_gray = gray
-    print(f"Saved masks to: {args.out_dir}")
+        mask, prev_gray = derive_mask(img, prev_gray, **kwargs)
+        stem = os.path.splitext(n)[0]
+        if fmt == "store":
+            with metrics.timer(metrics.WRITE, mask.nbytes):
+                bits = mask_pixels(mask)
+                packed.append((stem, mask.shape, np.packbits(bits), int(np.count_nonzero(bits))))
+        else:
+            outp = os.path.join(out_dir, stem + "_mask.png")
+            with metrics.timer(metrics.WRITE, mask.nbytes):
+                cv2.imwrite(outp, mask)
+        done += 1
+    return end - start, done, packed
+
+def _run_chunks(jobs, workers):
+    if workers == 1 or len(jobs) == 1:
+        for job in jobs:
+            yield _mask_chunk(job)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        for result, snapshot in pool.map(functools.partial(metrics.run_with_snapshot, _mask_chunk), jobs):
+            metrics.merge(snapshot)
+            yield result
+
+def generate_masks(frames_dir, out_dir, names, kwargs, workers=None, progress=None, fmt="png"):
+    """Write a mask for each frame, in chunks spread over `workers` processes.
+
+    fmt 'png' writes `<name>_mask.png` files, 'store' one packed mask store (mask_store.py).
+    """
+    if fmt not in MASK_FORMATS:
+        raise ValueError(f"Unsupported mask format: {fmt!r} (expected one of {MASK_FORMATS})")
+    workers = workers or os.cpu_count() or 1
+    jobs = [(frames_dir, out_dir, names, start, end, kwargs, fmt)
+            for start, end in split_shards(len(names), workers * CHUNKS_PER_WORKER, MIN_CHUNK_FRAMES)]
+    written = 0
+    store = MaskStoreWriter(out_dir) if fmt == "store" else None
+    try:
+        for n_frames, done, packed in _run_chunks(jobs, workers):
+            for entry in packed:
+                store.add_packed(*entry)
+            written += done
+            if progress is not None:
+                progress.update(n_frames)
+    except BaseException:
+        # Incl. KeyboardInterrupt: a partial store must not pass for a complete one
+        if store is not None:
+            store.abort()
+        raise
+    if store is not None:
+        store.close()
+    return written
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate content-aware masks for frames")
+    ap.add_argument("--frames_dir", required=True, help="Input frames folder (e.g., output_frames)")
+    ap.add_argument("--out_dir", required=True, help="Output masks folder (will be created)")
+    add_mask_args(ap)
+    ap.add_argument("--lsb_invariant", action="store_true",
+                    help="Score frames with LSBs cleared (masks match the mask-free --derive_masks mode)")
+    ap.add_argument("--lsb_depth", type=int, choices=range(1, MAX_LSB_DEPTH + 1), default=1,
+                    help="With --lsb_invariant: low bits cleared, i.e. the --lsb_depth used for embedding")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Worker processes for frame chunks (default: all cores; 1 = in-process)")
+    ap.add_argument("--format", choices=MASK_FORMATS, default="png",
+                    help="png: one <frame>_mask.png per frame; store: all masks bit-packed in one "
+                         "memory-mapped file (about 8x smaller, read without decoding)")
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args()
+    metrics.configure_from_args(args)
+    if not 0.0 < args.score_scale <= 1.0:
+        ap.error("--score_scale must be in (0, 1]")
+
+    ensure_dir(args.out_dir)
+
+    names = sorted([n for n in os.listdir(args.frames_dir)
+                    if n.lower().endswith((".png", ".jpg", ".jpeg"))])
+    with tqdm(total=len(names), desc="Generating masks", disable=not metrics.show_progress()) as progress:
+        generate_masks(args.frames_dir, args.out_dir, names, mask_kwargs(args, args.lsb_invariant),
+                       workers=args.workers, progress=progress, fmt=args.format)
+    log.info(f"Saved masks to: {args.out_dir}")
+    metrics.report("mask_generator")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+mask_store.py — All masks of a clip in one packed, memory-mapped file
+- masks.bin holds each mask as np.packbits of its flattened boolean rows (1 bit per
+  pixel, ~8x smaller than 8-bit PNG masks), one frame after the other.
+- index.json records every frame's name (frame file stem), shape, byte offset and
+  popcount, so per-frame capacity is known without touching masks.bin at all.
+- MaskStore maps masks.bin read-only; a mask is unpacked straight from the mapped
+  bytes into a boolean array (no image decode).
+Written by mask_generator.py --format store; embed/extract accept the folder as --masks_dir.
+"""
+import os
+import json
+import numpy as np
+
+DATA_NAME = "masks.bin"
+INDEX_NAME = "index.json"
+STORE_VERSION = 1
+
+def mask_pixels(mask):
+    # Flat boolean view of the eligible pixels: stored masks are already boolean,
+    # PNG / derived masks are {0, 255}
+    flat = mask.reshape(-1)
+    return flat if flat.dtype == np.bool_ else flat == 255
+
+def is_mask_store(path):
+    return path is not None and os.path.isfile(os.path.join(path, INDEX_NAME))
+
+class MaskStoreWriter:
+    """Appends masks to `<path>/masks.bin`; `close` writes the index (use as a context manager).
+
+    The index is written last, atomically, and only on success: a store whose generation
+    failed or was interrupted has no index.json, so is_mask_store rejects it.
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.frames = []
+        self._offset = 0
+        # Drop a previous run's index first: it must never describe the new masks.bin
+        index_path = os.path.join(path, INDEX_NAME)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        self._data = open(os.path.join(path, DATA_NAME), "wb")
+
+    def add(self, name, mask):
+        """Append the mask of frame `name` (bool or {0, 255} uint8, HxW); returns its popcount."""
+        bits = mask_pixels(mask)
+        return self.add_packed(name, mask.shape[:2], np.packbits(bits), int(np.count_nonzero(bits)))
+
+    def add_packed(self, name, shape, packed, popcount):
+        """Append an already packed mask (e.g. packed by a worker process)."""
+        self._data.write(packed.tobytes())
+        self.frames.append({"name": name, "shape": [int(shape[0]), int(shape[1])],
+                            "offset": self._offset, "popcount": int(popcount)})
+        self._offset += packed.nbytes
+        return popcount
+
+    def close(self):
+        if self._data.closed:
+            return
+        self._data.close()
+        index_path = os.path.join(self.path, INDEX_NAME)
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": STORE_VERSION, "frames": self.frames}, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    def abort(self):
+        """Discard a partial store: close and delete masks.bin, write no index."""
+        if not self._data.closed:
+            self._data.close()
+        data_path = os.path.join(self.path, DATA_NAME)
+        if os.path.exists(data_path):
+            os.remove(data_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class MaskStore:
+    """Read-only view of a mask store; masks are looked up by frame name or position."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, INDEX_NAME), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported mask store version in {path}: {index.get('version')!r}")
+        self.path = path
+        self.frames = index["frames"]
+        self.names = [frame["name"] for frame in self.frames]
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        data_path = os.path.join(path, DATA_NAME)
+        if os.path.getsize(data_path):
+            self._data = np.memmap(data_path, dtype=np.uint8, mode="r")
+        else:
+            # np.memmap cannot map an empty file (a store of zero-sized masks)
+            self._data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _frame(self, key):
+        return self.frames[key if isinstance(key, int) else self._positions[key]]
+
+    def shape(self, key):
+        return tuple(self._frame(key)["shape"])
+
+    def popcount(self, key):
+        """Number of eligible pixels, read from the index."""
+        return self._frame(key)["popcount"]
+
+    def packed(self, key):
+        """The mask's packed bytes: a slice of the mapped file, nothing is copied."""
+        frame = self._frame(key)
+        h, w = frame["shape"]
+        return self._data[frame["offset"]:frame["offset"] + (h * w + 7) // 8]
+
+    def mask(self, key):
+        """HxW boolean mask, unpacked from the mapped bytes."""
+        h, w = self._frame(key)["shape"]
+        return np.unpackbits(self.packed(key), count=h * w).view(np.bool_).reshape(h, w)
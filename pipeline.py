@@ -0,0 +1,223 @@
+# pipeline.py — In-process steganography pipeline
+# Runs Encryption → Extract Frames → Embed Message → Extract Message → Decryption in one
+# interpreter. The token and the frame buffers are passed in memory (frames are streamed
+# from the source video straight into the lossless stego video); disk checkpoints of the
+# intermediate artifacts are opt-in.
+import argparse
+import os
+import sys
+import time
+from contextlib import closing, contextmanager
+
+import metrics
+from metrics import log
+from Decryption import decrypt_envelope, decrypt_message, decrypt_stream
+from Encryption import (CODEC, CODECS, COMPRESSION_LEVEL, encrypt_envelope, encrypt_message, encrypt_stream,
+                        get_passphrase, iter_file_chunks, load_plaintext, save_bytes)
+from embed_msg import (LOSSLESS_FOURCC, embed_message_in_frames, embed_stream_in_frames,
+                       tee_frames_to_folder, write_frames_to_video)
+from extract_frames import get_video_fps, iter_video_frames
+from extract_modified_frames import (extract_message_from_video_file, extract_payload_from_video_file,
+                                     iter_payload_chunks)
+from ecc import load_rs_nsym
+from lsb import MAX_LSB_DEPTH, format_channels, parse_channels
+from scatter import scatter_key
+from stream_header import CHANNEL_BLUE
+
+# --- Paths (edit if your project lives elsewhere) ---
+PROJECT_DIR = r"C:\Users\KANISHK\Desktop\Steganography-PJT-main\Steganography"
+VIDEO_PATH = os.path.join(PROJECT_DIR, "Bali.MOV")
+OUTPUT_VIDEO_PATH = os.path.join(PROJECT_DIR, "output_video_with_message.mkv")
+
+STAGES = ("Encryption", "Extract Frames", "Embed Message", "Extract Message", "Decryption")
+
+@contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+# Generator that passes items through while charging the time spent producing them to `name`
+def _timed(iterable, timings, name):
+    timings.setdefault(name, 0.0)
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[name] += time.perf_counter() - start
+        yield item
+
+def _save_text(s, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(s)
+
+# Save a token as <name>.bin (binary envelope) or <name>.txt (base64 text)
+def _save_token(token, checkpoint_dir, name):
+    if isinstance(token, (bytes, bytearray)):
+        save_bytes(token, os.path.join(checkpoint_dir, name + ".bin"))
+    else:
+        _save_text(token, os.path.join(checkpoint_dir, name + ".txt"))
+
+def run_pipeline(video_path, plaintext, passphrase, output_video_path, checkpoint_dir=None,
+                 frame_interval=1, frame_rate=None, fourcc=LOSSLESS_FOURCC, queue_size=8,
+                 binary=True, codec=CODEC, level=COMPRESSION_LEVEL, lsb_depth=1, channels=CHANNEL_BLUE,
+                 ecc_nsym=0, scatter=False):
+    """Encrypt `plaintext`, hide it in `video_path`, then extract and decrypt it again.
+
+    With `binary` (default) the raw envelope bytes are embedded and extracted byte-exact;
+    otherwise the legacy base64 token is used. `lsb_depth` and `channels` select the bit
+    layout (see lsb.py) and `ecc_nsym` (RS parity bytes per codeword, 0 = off) the optional
+    error correction; the extractor reads both back from the stream header. With `scatter`
+    the bits are spread over each frame in a passphrase-keyed order (see scatter.py). Returns a
+    dict with the token, the decrypted message, the frame count and the per-stage
+    wall-clock timings (seconds, in STAGES order). When `checkpoint_dir` is set, the same files the standalone
+    scripts produce are written there as well.
+    """
+    timings = {}
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    key = scatter_key(passphrase) if scatter else None
+
+    # 1) Encryption
+    with _stage(timings, "Encryption"):
+        if binary:
+            token = encrypt_envelope(plaintext.encode("utf-8"), passphrase, codec=codec, level=level)
+        else:
+            token = encrypt_message(plaintext, passphrase)
+    if checkpoint_dir is not None:
+        _save_token(token, checkpoint_dir, "encrypted_message")
+
+    # 2) + 3) Decode frames and embed them straight into the stego video. Both stages run
+    # interleaved; decode time is measured inside the frame generator.
+    if frame_rate is None:
+        frame_rate = get_video_fps(video_path)
+    frames = _timed(iter_video_frames(video_path, frame_interval), timings, "Extract Frames")
+    if checkpoint_dir is not None:
+        frames = tee_frames_to_folder(frames, os.path.join(checkpoint_dir, "output_frames"),
+                                      prefix="frame", copy=True)
+    frames = embed_message_in_frames(frames, token, lsb_depth=lsb_depth, channels=channels, ecc_nsym=ecc_nsym,
+                                     scatter_key=key)
+    if checkpoint_dir is not None:
+        frames = tee_frames_to_folder(frames, os.path.join(checkpoint_dir, "output_frames_with_message"))
+
+    with _stage(timings, "Embed Message"):
+        frame_count = write_frames_to_video(frames, output_video_path, frame_rate, fourcc, queue_size)
+    timings["Embed Message"] -= timings["Extract Frames"]
+
+    # 4) Extract the token back out of the stego video
+    with _stage(timings, "Extract Message"):
+        if binary:
+            extracted = extract_payload_from_video_file(output_video_path, scatter_key=key)
+        else:
+            extracted = extract_message_from_video_file(output_video_path, scatter_key=key)
+    if checkpoint_dir is not None:
+        _save_token(extracted, checkpoint_dir, "extracted_encrypted_message")
+
+    # 5) Decryption
+    with _stage(timings, "Decryption"):
+        if binary:
+            message = decrypt_envelope(extracted, passphrase).decode("utf-8")
+        else:
+            message = decrypt_message(extracted, passphrase)
+    if checkpoint_dir is not None:
+        _save_text(message, os.path.join(checkpoint_dir, "decrypted_message.txt"))
+
+    return {
+        "token": token,
+        "message": message,
+        "frames": frame_count,
+        "timings": {name: timings[name] for name in STAGES},
+    }
+
+def encrypt_and_embed_file(video_path, message_path, passphrase, output_video_path,
+                           frame_rate=None, fourcc=LOSSLESS_FOURCC, queue_size=8,
+                           lsb_depth=1, channels=CHANNEL_BLUE, ecc_nsym=0, scatter=False):
+    """Stream a (possibly huge) file through the v4 chunked envelope into the stego video.
+
+    File chunks are compressed, encrypted and embedded as the frames go by, so memory
+    stays constant regardless of the file size. Returns the number of frames written.
+    """
+    if frame_rate is None:
+        frame_rate = get_video_fps(video_path)
+    envelope = encrypt_stream(iter_file_chunks(message_path), passphrase)
+    key = scatter_key(passphrase) if scatter else None
+    frames = embed_stream_in_frames(iter_video_frames(video_path), envelope, lsb_depth, channels, ecc_nsym, key)
+    return write_frames_to_video(frames, output_video_path, frame_rate, fourcc, queue_size)
+
+def extract_and_decrypt_file(stego_video_path, passphrase, out_path, scatter=False):
+    """Inverse of encrypt_and_embed_file; decoding stops at the envelope's final record.
+
+    Returns the number of plaintext bytes written to `out_path`.
+    """
+    written = 0
+    key = scatter_key(passphrase) if scatter else None
+    with closing(iter_video_frames(stego_video_path)) as frames, open(out_path, "wb") as f:
+        for chunk in decrypt_stream(iter_payload_chunks(frames, scatter_key=key), passphrase):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+def print_timings(timings):
+    total = sum(timings.values())
+    for name, seconds in timings.items():
+        log.info(f"🔹 {name:<16} {seconds * 1000:10.1f} ms")
+    log.info(f"   {'Total':<16} {total * 1000:10.1f} ms")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run the whole steganography pipeline in one process")
+    ap.add_argument("--video", default=VIDEO_PATH, help="Source (cover) video")
+    ap.add_argument("--message_file", default=None,
+                    help="Plaintext message file (default: message.txt / built-in test message)")
+    ap.add_argument("--output", default=OUTPUT_VIDEO_PATH, help="Output stego video (lossless)")
+    ap.add_argument("--checkpoint_dir", default=None,
+                    help="If set, write the intermediate files and frame folders here")
+    ap.add_argument("--frame_interval", type=int, default=1, help="Keep every n-th frame of the source video")
+    ap.add_argument("--text", action="store_true",
+                    help="Embed the base64 token instead of the raw binary envelope (33%% larger)")
+    ap.add_argument("--codec", choices=sorted(CODECS), default=CODEC, help="Compression codec for the inner payload")
+    ap.add_argument("--level", type=int, default=COMPRESSION_LEVEL, help="Compression level for the codec")
+    ap.add_argument("--lsb_depth", type=int, choices=range(1, MAX_LSB_DEPTH + 1), default=1,
+                    help="Low bits used per channel sample (more bits = fewer frames touched)")
+    ap.add_argument("--channels", type=parse_channels, default=format_channels(CHANNEL_BLUE),
+                    help="Channels that carry payload bits, any of b, g, r (e.g. bgr)")
+    ap.add_argument("--ecc", action="store_true",
+                    help="Reed-Solomon code each frame's payload so damaged frames can be repaired")
+    ap.add_argument("--rs_nsym", type=int, default=None,
+                    help="RS parity bytes per 255-byte codeword (default: rs_nsym from helper.json, or 32)")
+    ap.add_argument("--scatter", action="store_true",
+                    help="Spread the bits over each frame in a passphrase-keyed pixel order")
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args(argv)
+    metrics.configure_from_args(args)
+
+    if args.message_file:
+        with open(args.message_file, "r", encoding="utf-8") as f:
+            plaintext = f.read()
+    else:
+        plaintext = load_plaintext()
+    passphrase = get_passphrase()
+
+    log.info("🚀 Starting Steganography Pipeline...\n")
+    metrics.reset()
+    result = run_pipeline(args.video, plaintext, passphrase, args.output,
+                          checkpoint_dir=args.checkpoint_dir, frame_interval=args.frame_interval,
+                          binary=not args.text, codec=args.codec, level=args.level,
+                          lsb_depth=args.lsb_depth, channels=args.channels,
+                          ecc_nsym=(args.rs_nsym or load_rs_nsym()) if args.ecc else 0, scatter=args.scatter)
+    print_timings(result["timings"])
+    metrics.report("pipeline", pipeline_stages=result["timings"], frames=result["frames"])
+
+    if result["message"] != plaintext:
+        log.error("❌ Round trip failed: decrypted message does not match the plaintext.")
+        return 1
+    log.info(f"\n🎉 All steps completed! {result['frames']} frames written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# probe.py — Scan files and folders for embedded payloads without extracting them
+# Only frame 0 of every candidate is decoded: its stream header (magic, layout, payload
+# length, flags) says whether it carries a payload, how large it is and how many frames it
+# spans. Candidates are stego videos (by extension) and folders of frame files, found by
+# walking the given paths; they are probed on a process pool and every result is written
+# as one JSON line the moment it is known:
+#   {"path": "out/clip1.mkv", "kind": "video", "frames": 300, "width": 1920, "height": 1080,
+#    "payload": true, "payload_length": 52431, "lsb_depth": 1, "channels": "b", "streamed": false,
+#    "ecc_nsym": 0, "scattered": false, "frames_needed": 26, "fits": true, "seconds": 0.04}
+# With --masked, frame folders without a classic header are also probed as mask-free masked
+# streams (embed_msg_masked.py --derive_masks): frame 0's mask is re-derived and only its
+# stream header, or the 32-bit length prefix of the original layout, is read. That prefix
+# has no magic, so it is reported only if the length is plausible for the folder
+# ("verified": false), and frames_needed is an estimate from frame 0's capacity.
+# Scattered streams are only found with --scatter and the passphrase they were embedded with.
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+import metrics
+from metrics import log
+from extract_frames import iter_frame_files, list_frame_files
+from extract_modified_frames import _check_header_layout, payload_frames, read_ecc_nsym, read_stream_header
+from lsb import format_channels
+from stream_header import FLAG_ECC, FLAG_SCATTERED, FLAG_STREAMED, HEADER_BITS, unpack_header
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml")
+VIDEO_EXTENSIONS = ('.mkv', '.avi', '.mp4', '.mov', '.m4v', '.webm')
+STEGO_FRAME_EXTENSIONS = ('.png', '.npy')   # lossy .jpg frames cannot carry a payload
+MAX_IN_FLIGHT_PER_WORKER = 4
+
+# Generator that walks `roots` and yields every probe target as (kind, path): "video" for
+# video files, "frames" for folders holding frame files
+def find_targets(roots, video_extensions=VIDEO_EXTENSIONS, frame_extensions=STEGO_FRAME_EXTENSIONS):
+    for root in roots:
+        if os.path.isfile(root):
+            if root.lower().endswith(video_extensions):
+                yield "video", root
+            continue
+        for folder, dirs, files in os.walk(root):
+            dirs.sort()
+            if any(name.lower().endswith(frame_extensions) for name in files):
+                yield "frames", folder
+            for name in sorted(files):
+                if name.lower().endswith(video_extensions):
+                    yield "video", os.path.join(folder, name)
+
+# Function to decode frame 0 of a target; returns (frame or None, frame count)
+def read_first_frame(kind, path, frame_extensions=STEGO_FRAME_EXTENSIONS):
+    if kind == "frames":
+        frame_paths = list_frame_files(path, frame_extensions)
+        return next(iter_frame_files(frame_paths[:1]), None), len(frame_paths)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {path}")
+    try:
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        start = time.perf_counter()
+        ok, frame = cap.read()
+        if not ok:
+            return None, n_frames
+        metrics.add(metrics.DECODE, time.perf_counter() - start, frame.nbytes)
+        metrics.incr("frames_decoded")
+        return frame, n_frames
+    finally:
+        cap.release()
+
+# Function to describe the classic stream in frame 0 (None if it has no stream header)
+def probe_classic(frame, n_frames, scatter_key=None):
+    header = read_stream_header(frame, scatter_key)
+    if header is None:
+        return None
+    _check_header_layout(header, frame)
+    streamed = bool(header["flags"] & FLAG_STREAMED)
+    nsym = read_ecc_nsym(frame, header, scatter_key) if header["flags"] & FLAG_ECC else 0
+    needed = None if streamed else payload_frames(header, nsym or None)
+    return {
+        "payload": True,
+        "payload_length": None if streamed else header["payload_length"],
+        "lsb_depth": header["lsb_depth"],
+        "channels": format_channels(header["channels"]),
+        "streamed": streamed,
+        "ecc_nsym": nsym,
+        "scattered": bool(header["flags"] & FLAG_SCATTERED),
+        "frames_needed": needed,
+        "fits": None if needed is None else needed <= n_frames,
+    }
+
+# Function to describe a mask-free masked stream in frame 0 (None if none is found)
+def probe_masked(frame, n_frames, mask_options, scatter_key=None):
+    if ML_DIR not in sys.path:
+        sys.path.insert(0, ML_DIR)
+    from extract_modified_frames_masked import (LENGTH_BITS, bits_to_length, detect_layout, mask_capacity,
+                                                read_bits_from_frame)
+    from lsb import DEFAULT_LAYOUT
+    from mask_generator import derive_mask
+
+    masks = {}
+    def mask_for(lsb_depth):
+        if lsb_depth not in masks:
+            masks[lsb_depth] = derive_mask(frame, None, **dict(mask_options, lsb_invariant=True,
+                                                               lsb_bits=lsb_depth))[0]
+        return masks[lsb_depth]
+
+    lsb_depth, channels = detect_layout(frame, mask_for, scatter_key)
+    mask = mask_for(lsb_depth)
+    # Default layout: a bare 32-bit length prefix, only checked for plausibility below
+    verified = (lsb_depth, channels) != DEFAULT_LAYOUT
+    prefix_bits = HEADER_BITS if verified else LENGTH_BITS
+    bits, n, _ = read_bits_from_frame(frame, mask, prefix_bits, 0, 0, lsb_depth, channels, scatter_key,
+                                      cache_rows=True)
+    if n < prefix_bits:
+        return None
+    if verified:
+        header = unpack_header(np.packbits(bits).tobytes())
+        length, flags = header["payload_length"], header["flags"]
+    else:
+        length, flags = bits_to_length(bits), 0
+
+    capacity = mask_capacity(mask, lsb_depth, channels)
+    need_bits = prefix_bits + length * 8
+    needed = -(-need_bits // capacity) if capacity else None
+    if not verified and (length == 0 or needed is None or needed > n_frames):
+        return None
+    return {
+        "payload": True,
+        "masked": True,
+        "verified": verified,
+        "payload_length": length,
+        "lsb_depth": lsb_depth,
+        "channels": format_channels(channels),
+        "scattered": bool(flags & FLAG_SCATTERED) or (not verified and scatter_key is not None),
+        "frames_needed": needed,
+        "fits": needed is not None and needed <= n_frames,
+    }
+
+# Function to probe one (kind, path) target; never raises, errors go into the record
+def probe_target(job):
+    kind, path, scatter_key, mask_options = job
+    start = time.perf_counter()
+    record = {"path": path, "kind": kind}
+    try:
+        frame, n_frames = read_first_frame(kind, path)
+        record["frames"] = n_frames
+        if frame is None:
+            record["payload"] = False
+        else:
+            record["height"], record["width"] = frame.shape[:2]
+            found = probe_classic(frame, n_frames, scatter_key)
+            if found is None and mask_options is not None and kind == "frames":
+                found = probe_masked(frame, n_frames, mask_options, scatter_key)
+            record.update(found or {"payload": False})
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+# Generator that probes `targets` on `workers` processes and yields each record as soon as
+# it is done (not in input order). At most a few jobs per worker are queued at a time, so a
+# tree of any size is walked lazily.
+def probe_all(targets, workers=None, scatter_key=None, mask_options=None):
+    workers = workers or os.cpu_count() or 1
+    jobs = ((kind, path, scatter_key, mask_options) for kind, path in targets)
+    if workers == 1:
+        for job in jobs:
+            yield probe_target(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for job in jobs:
+            in_flight.add(pool.submit(metrics.run_with_snapshot, probe_target, job))
+            if len(in_flight) < workers * MAX_IN_FLIGHT_PER_WORKER:
+                continue
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record, snapshot = future.result()
+                metrics.merge(snapshot)
+                yield record
+        for future in in_flight:
+            record, snapshot = future.result()
+            metrics.merge(snapshot)
+            yield record
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Find stego videos / frame folders and report their payloads "
+                                             "(frame 0 only, JSON lines)")
+    ap.add_argument("paths", nargs="+", help="Video files and/or folders to scan (recursively)")
+    ap.add_argument("--workers", type=int, default=None, help="Probe processes (default: all cores)")
+    ap.add_argument("--output", default="-", help="JSON-lines output file (default: stdout)")
+    ap.add_argument("--found_only", action="store_true", help="Only write records of targets carrying a payload")
+    ap.add_argument("--scatter", action="store_true",
+                    help="Also find scattered streams (pixel order keyed by the passphrase)")
+    ap.add_argument("--masked", action="store_true",
+                    help="Also probe frame folders for mask-free masked streams (mask args as when embedding)")
+    sys.path.insert(0, ML_DIR)
+    from mask_generator import add_mask_args
+    add_mask_args(ap)
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args(argv)
+    # JSON on stdout: keep the console log to warnings unless asked otherwise
+    metrics.configure(args.log_level or ("WARNING" if args.output == "-" else None), args.metrics_file, args.trace)
+
+    scatter_key = None
+    if args.scatter:
+        from Encryption import get_passphrase
+        from scatter import scatter_key as derive_scatter_key
+        scatter_key = derive_scatter_key(get_passphrase())
+    mask_options = None
+    if args.masked:
+        from mask_generator import mask_kwargs
+        mask_options = {k: v for k, v in mask_kwargs(args, True).items() if k not in ("lsb_invariant", "lsb_bits")}
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    counts = {"probed": 0, "found": 0, "errors": 0}
+    try:
+        for record in probe_all(find_targets(args.paths), args.workers, scatter_key, mask_options):
+            counts["probed"] += 1
+            counts["found"] += bool(record.get("payload"))
+            counts["errors"] += "error" in record
+            if record.get("payload") or not args.found_only:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    log.info(f"Probed {counts['probed']} targets: {counts['found']} with a payload, {counts['errors']} errors.")
+    metrics.report("probe", **counts)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
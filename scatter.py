@@ -0,0 +1,142 @@
+# scatter.py — Keyed, scattered pixel order for LSB payloads
+# By default payload bits fill a frame's pixels in raster (or mask) order, so a short payload
+# sits in the top rows of frame 0. With a scatter key the same bits go to the pixels in a
+# keyed pseudo-random order instead: the header, the payload and every frame's share alike.
+# The stream header then carries FLAG_SCATTERED, and an extractor without the key finds no
+# header at all.
+#
+# The order of an n-pixel frame is argsort(splitmix64(i ^ key)), i = 0..n-1: pure integer
+# arithmetic, so it does not depend on NumPy's random streams, computed once per
+# (pixel count, key) and kept (as int32, with its inverse) in a small LRU cache. Masked
+# frames use the eligible pixels in that order, recomputed for every frame: a clip's masks
+# all differ, so only the header probes that re-read frame 0 with the same mask ask for
+# the rows to be cached per (key, mask).
+#
+# Visiting pixels in random order is never free. At 1080p (one core) a full-frame blue-LSB
+# write costs ~20 ms scattered vs ~6 ms in raster order, a full read ~15-20 ms vs ~4 ms,
+# and a masked frame (25% of the pixels, new mask) ~20 ms vs ~5 ms.
+# benchmarks/run_benchmarks.py tracks all three.
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+import metrics
+
+SCATTER_SALT = b"STGV-scatter-key"   # fixed scrypt salt: the key must be derivable at extraction
+ORDER_CACHE_SIZE = 4                 # cached pixel orders (one per frame size and key)
+ROWS_CACHE_SIZE = 16                 # cached eligible-pixel rows (one per mask and key)
+
+_rows_cache = OrderedDict()
+_rows_lock = threading.Lock()
+
+# Function to derive the 64-bit scatter key from the passphrase. It goes through the same
+# scrypt KDF as the envelope key, so the header magic is no shortcut for guessing passphrases.
+def scatter_key(passphrase):
+    from Encryption import derive_key
+    return int.from_bytes(derive_key(passphrase, SCATTER_SALT)[:8], "big")
+
+def _splitmix64(x):
+    # SplitMix64 finalizer over a uint64 array (wraps modulo 2^64)
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+@lru_cache(maxsize=ORDER_CACHE_SIZE)
+def pixel_order(n_pixels, key):
+    """Keyed permutation of range(n_pixels): the order payload bits visit the pixels in."""
+    with metrics.timer(metrics.SCATTER):
+        order = np.argsort(_splitmix64(np.arange(n_pixels, dtype=np.uint64) ^ np.uint64(key))).astype(np.int32)
+    order.flags.writeable = False
+    metrics.incr("scatter_orders_built")
+    return order
+
+@lru_cache(maxsize=ORDER_CACHE_SIZE)
+def inverse_order(n_pixels, key):
+    """Position of every pixel in pixel_order(n_pixels, key)."""
+    order = pixel_order(n_pixels, key)
+    with metrics.timer(metrics.SCATTER):
+        inverse = np.empty(n_pixels, dtype=np.int32)
+        inverse[order] = np.arange(n_pixels, dtype=np.int32)
+    inverse.flags.writeable = False
+    return inverse
+
+def frame_rows(frame_shape, key):
+    """Pixel rows of a (H, W, ...) frame in payload order; None (raster order) without a key."""
+    if key is None:
+        return None
+    return pixel_order(frame_shape[0] * frame_shape[1], key)
+
+def scatter_lsbs(plane, bits, bit_offset, key):
+    """Write `bits` to the LSBs of `plane` (flat uint8, one bit per pixel, modified in place)
+    at positions [bit_offset, bit_offset + len(bits)) of the keyed pixel order."""
+    n = plane.shape[0]
+    order = pixel_order(n, key)
+    lo, hi = bit_offset, bit_offset + bits.shape[0]
+    if 2 * (hi - lo) < n:
+        target = order[lo:hi]
+        plane[target] = (plane[target] & 0xFE) | bits
+        return
+    # Most of the frame: lay the bits out in pixel order through the inverse permutation
+    # (a gather from a small contiguous array), so the frame is written sequentially
+    in_order = np.empty(n, dtype=np.uint8)
+    in_order[lo:hi] = bits
+    in_order[:lo] = plane[order[:lo]] & 1
+    in_order[hi:] = plane[order[hi:]] & 1
+    plane &= 0xFE
+    plane |= np.take(in_order, inverse_order(n, key), mode="clip")
+
+def gather_lsbs(plane, n_bits, bit_offset, key):
+    """LSBs of `plane` at positions [bit_offset, bit_offset + n_bits) of the keyed order."""
+    rows = pixel_order(plane.shape[0], key)[bit_offset:bit_offset + n_bits]
+    if 2 * n_bits < plane.shape[0]:
+        return plane[rows] & 1
+    # Most of the frame: one sequential pass over the (strided) frame, then gather from
+    # the contiguous bit plane
+    return np.take(plane & 1, rows, mode="clip")
+
+def mask_rows(eligible, key=None, cache=False):
+    """Flat indices of the eligible pixels (a flat bool array), in payload order.
+
+    Raster order without a key, keyed order with one. With cache=True (for callers that
+    read the same mask repeatedly) the keyed rows are kept per (key, mask content);
+    otherwise the mask is not even hashed.
+    """
+    if key is None:
+        return np.flatnonzero(eligible)
+    if not cache:
+        return _keyed_rows(eligible, key)
+    digest = hashlib.blake2b(np.packbits(eligible).tobytes(), digest_size=16).digest()
+    cache_key = (eligible.shape[0], key, digest)
+    with _rows_lock:
+        rows = _rows_cache.get(cache_key)
+        if rows is not None:
+            _rows_cache.move_to_end(cache_key)
+            return rows
+
+    rows = _keyed_rows(eligible, key)
+    rows.flags.writeable = False
+    with _rows_lock:
+        _rows_cache[cache_key] = rows
+        while len(_rows_cache) > ROWS_CACHE_SIZE:
+            _rows_cache.popitem(last=False)
+    return rows
+
+def _keyed_rows(eligible, key):
+    order = pixel_order(eligible.shape[0], key)
+    with metrics.timer(metrics.SCATTER):
+        # Positions of the eligible pixels in the keyed order, sorted: cheaper than
+        # filtering the whole order through a random gather of the mask (and an index
+        # gather beats boolean indexing here)
+        positions = np.take(inverse_order(eligible.shape[0], key), np.flatnonzero(eligible), mode="clip")
+        return np.take(order, np.sort(positions), mode="clip")
+
+def clear_cache():
+    pixel_order.cache_clear()
+    inverse_order.cache_clear()
+    with _rows_lock:
+        _rows_cache.clear()
@@ -0,0 +1,384 @@
+# service.py — Local HTTP service for encrypt+embed and extract+decrypt (stdlib only)
+# Keeps a pool of warm worker processes (cv2, numpy and pycryptodome already imported and
+# their native code loaded) so callers pay none of the interpreter and import start-up cost.
+# Bodies are streamed through temp files in 64 KiB pieces, never held in memory whole.
+#
+#   POST /embed?video=<cover path>[&output=<path>][&lsb_depth=2&channels=bg]
+#        body: the payload; header X-Passphrase. Responds with the lossless stego video
+#        (or, with `output`, writes it there and responds with JSON).
+#   POST /extract[?video=<stego path>]
+#        body: the stego video (or empty with `video`); header X-Passphrase.
+#        Responds with the decrypted payload.
+#   GET  /metrics   stage timers, counters and request stats (JSON)
+#   GET  /health
+#
+# Only `--max_jobs` requests are uploading or running at a time; up to `--max_queue` more
+# wait (their uploads are not read, so TCP pushes back on the client) and the rest get 503.
+#
+#   python service.py --port 8765 --workers 4
+#   curl -s --data-binary @secret.txt -H "X-Passphrase: $PASS" \
+#        "http://127.0.0.1:8765/embed?video=/videos/cover.mov" -o stego.mkv
+#   curl -s --data-binary @stego.mkv -H "X-Passphrase: $PASS" http://127.0.0.1:8765/extract
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+import metrics
+from metrics import log
+from Decryption import decrypt_envelope, decrypt_stream
+from Encryption import STREAM_VERSION, derive_key
+from extract_frames import iter_video_frames
+from extract_modified_frames import iter_payload_chunks
+from lsb import check_layout, parse_channels
+from pipeline import encrypt_and_embed_file
+
+HOST = "127.0.0.1"   # localhost only: the service trusts its callers with server-side paths
+DEFAULT_PORT = 8765
+IO_CHUNK = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+DEFAULT_MAX_UPLOAD_MB = 1024
+ENDPOINTS = ("/embed", "/extract", "/metrics", "/health")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# --- Worker side (runs in the pool processes) ---
+
+def _warm_up():
+    # Pool initializer: load the native code paths (OpenCV, scrypt) once so the first request
+    # does not pay for it. The cheap scrypt call fills no cache real requests use: every
+    # embed derives its key from a fresh random salt.
+    cv2.cvtColor(np.zeros((8, 8, 3), np.uint8), cv2.COLOR_BGR2GRAY)
+    derive_key(b"warm-up", bytes(16), n_log2=10)
+
+def _job_result(**fields):
+    # Ship this process's stage timers back so the service can aggregate them
+    fields["metrics"] = metrics.snapshot()
+    return fields
+
+def embed_job(video_path, payload_path, passphrase, output_path, lsb_depth=1, channels=1):
+    metrics.reset()
+    frames = encrypt_and_embed_file(video_path, payload_path, passphrase, output_path,
+                                    lsb_depth=lsb_depth, channels=channels)
+    return _job_result(frames=frames, bytes=os.path.getsize(output_path))
+
+def extract_job(video_path, passphrase, output_path):
+    # Streamed (v4) envelopes are decrypted chunk by chunk; v3/v5 ones are small enough
+    # to be decrypted whole.
+    metrics.reset()
+    written = 0
+    with closing(iter_video_frames(video_path)) as frames, open(output_path, "wb") as f:
+        chunks = iter_payload_chunks(frames)
+        first = next(chunks, b"")
+        chunks = itertools.chain([first], chunks)
+        if first[:1] == bytes([STREAM_VERSION]):
+            plaintext = decrypt_stream(chunks, passphrase)
+        else:
+            plaintext = [decrypt_envelope(b"".join(chunks), passphrase)]
+        for piece in plaintext:
+            f.write(piece)
+            written += len(piece)
+    return _job_result(bytes=written)
+
+# --- HTTP plumbing ---
+
+async def read_request(reader):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, "Request header too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    return method.upper(), url.path, params, headers
+
+async def iter_body(reader, headers):
+    """Yield the request body in pieces of at most IO_CHUNK bytes (Content-Length or chunked)."""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = (await reader.readline()).split(b";")[0].strip()
+            try:
+                size = int(size_line or b"0", 16)
+            except ValueError:
+                raise HTTPError(400, "Malformed chunk size")
+            if size < 0:
+                raise HTTPError(400, "Malformed chunk size")
+            if size == 0:
+                await reader.readline()
+                return
+            while size:
+                piece = await reader.read(min(size, IO_CHUNK))
+                if not piece:
+                    raise HTTPError(400, "Truncated chunked body")
+                size -= len(piece)
+                yield piece
+            await reader.readline()
+    if "content-length" not in headers:
+        raise HTTPError(411, "Content-Length or chunked transfer encoding required")
+    try:
+        remaining = int(headers["content-length"])
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length")
+    if remaining < 0:
+        raise HTTPError(400, "Malformed Content-Length")
+    while remaining:
+        piece = await reader.read(min(remaining, IO_CHUNK))
+        if not piece:
+            raise HTTPError(400, "Truncated body")
+        remaining -= len(piece)
+        yield piece
+
+async def receive_body(reader, headers, path, max_bytes):
+    # Only reads as fast as the disk takes it; the StreamReader pauses the socket when its
+    # buffer fills, so a fast client is throttled instead of buffered.
+    total = 0
+    with open(path, "wb") as f:
+        async for piece in iter_body(reader, headers):
+            total += len(piece)
+            if total > max_bytes:
+                raise HTTPError(413, f"Body larger than {max_bytes} bytes")
+            f.write(piece)
+    return total
+
+def _head(status, content_type, length, extra=None):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             f"Content-Type: {content_type}", f"Content-Length: {length}", "Connection: close"]
+    lines += [f"{k}: {v}" for k, v in (extra or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def send_json(writer, status, obj, extra=None):
+    body = json.dumps(obj, indent=2).encode("utf-8")
+    writer.write(_head(status, "application/json", len(body), extra) + body)
+    await writer.drain()
+
+async def send_file(writer, path, content_type="application/octet-stream"):
+    writer.write(_head(200, content_type, os.path.getsize(path)))
+    with open(path, "rb") as f:
+        while True:
+            piece = f.read(IO_CHUNK)
+            if not piece:
+                break
+            writer.write(piece)
+            await writer.drain()   # backpressure: wait while the client is slower than the disk
+
+# --- Service ---
+
+class StegoService:
+    def __init__(self, workers=None, max_jobs=None, max_queue=None, max_upload_mb=DEFAULT_MAX_UPLOAD_MB,
+                 tmp_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs or self.workers
+        self.max_queue = self.max_jobs * 4 if max_queue is None else max_queue
+        self.max_upload = int(max_upload_mb * 1024 * 1024)
+        self.tmp_dir = tmp_dir
+        self.pool = None
+        self.slots = None
+        self.waiting = 0
+        self.active = 0
+        self.requests = {}   # "METHOD path status" -> count
+        self.started = time.time()
+
+    async def start(self):
+        self.slots = asyncio.Semaphore(self.max_jobs)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+        # Spawn every worker now instead of on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, os.getpid) for _ in range(self.workers)))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        start = time.perf_counter()
+        method, path, status = "-", "-", 500
+        try:
+            method, path, params, headers = await read_request(reader)
+            status = await self.dispatch(method, path, params, headers, reader, writer)
+        except HTTPError as e:
+            status = e.status
+            await self._error(writer, e.status, str(e))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            status = 499   # client went away
+        except Exception as e:
+            log.exception(f"Request {method} {path} failed")
+            await self._error(writer, 500, f"{type(e).__name__}: {e}")
+        finally:
+            key = f"{method} {path} {status}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+            metrics.add(f"http {path if path in ENDPOINTS else 'other'}", time.perf_counter() - start)
+            log.debug(f"{method} {path} -> {status} in {time.perf_counter() - start:.3f} s")
+            writer.close()
+
+    async def _error(self, writer, status, message):
+        try:
+            extra = {"Retry-After": "1"} if status == 503 else None
+            await send_json(writer, status, {"error": message}, extra)
+        except ConnectionError:
+            pass
+
+    async def dispatch(self, method, path, params, headers, reader, writer):
+        routes = {"/embed": ("POST", self.embed), "/extract": ("POST", self.extract),
+                  "/metrics": ("GET", self.stats), "/health": ("GET", self.health)}
+        if path not in routes:
+            raise HTTPError(404, f"No such endpoint: {path}")
+        expected, handler = routes[path]
+        if method != expected:
+            raise HTTPError(405, f"{path} expects {expected}")
+        return await handler(params, headers, reader, writer)
+
+    async def health(self, params, headers, reader, writer):
+        await send_json(writer, 200, {"status": "ok"})
+        return 200
+
+    async def stats(self, params, headers, reader, writer):
+        snapshot = metrics.snapshot()
+        snapshot["service"] = {"workers": self.workers, "max_jobs": self.max_jobs, "max_queue": self.max_queue,
+                               "active": self.active, "waiting": self.waiting,
+                               "uptime_s": round(time.time() - self.started, 1), "requests": self.requests}
+        await send_json(writer, 200, snapshot)
+        return 200
+
+    async def _run(self, fn, *args):
+        # Runs a worker job and folds its timers and counters into the service-wide registry
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.pool, fn, *args)
+        metrics.merge(result.pop("metrics"))
+        return result
+
+    async def _admit(self):
+        # Concurrency limit with a bounded wait queue; overflow is rejected, not buffered
+        if self.slots.locked() and self.waiting >= self.max_queue:
+            raise HTTPError(503, "Too many requests in flight; retry later")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def _release(self):
+        self.active -= 1
+        self.slots.release()
+
+    async def embed(self, params, headers, reader, writer):
+        passphrase = _passphrase(headers)
+        video = params.get("video")
+        if not video or not os.path.isfile(video):
+            raise HTTPError(400, f"Cover video not found: {video!r}")
+        try:
+            lsb_depth = int(params.get("lsb_depth", 1))
+            channels = parse_channels(params.get("channels", "b"))
+            check_layout(lsb_depth, channels)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as tmp:
+            payload = os.path.join(tmp, "payload")
+            stego = params.get("output") or os.path.join(tmp, "stego.mkv")
+            await self._admit()
+            try:
+                n_bytes = await receive_body(reader, headers, payload, self.max_upload)
+                result = await self._job(embed_job, video, payload, passphrase, stego, lsb_depth, channels)
+            finally:
+                self._release()
+            metrics.incr("service_embeds")
+            log.info(f"🔐 /embed: {n_bytes} bytes into {result['frames']} frames of {os.path.basename(video)}")
+            if params.get("output"):
+                await send_json(writer, 200, dict(result, output=stego, payload_bytes=n_bytes))
+            else:
+                await send_file(writer, stego, "video/x-matroska")
+        return 200
+
+    async def extract(self, params, headers, reader, writer):
+        passphrase = _passphrase(headers)
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as tmp:
+            video = params.get("video")
+            if video and not os.path.isfile(video):
+                raise HTTPError(400, f"Stego video not found: {video!r}")
+            plaintext = os.path.join(tmp, "payload")
+            await self._admit()
+            try:
+                if not video:
+                    video = os.path.join(tmp, "stego.mkv")
+                    if not await receive_body(reader, headers, video, self.max_upload):
+                        raise HTTPError(400, "Empty body and no ?video= given")
+                result = await self._job(extract_job, video, passphrase, plaintext)
+            finally:
+                self._release()
+            metrics.incr("service_extracts")
+            log.info(f"🔓 /extract: {result['bytes']} bytes")
+            await send_file(writer, plaintext)
+        return 200
+
+    async def _job(self, fn, *args):
+        try:
+            return await self._run(fn, *args)
+        except ValueError as e:
+            # Wrong passphrase, no payload, corrupt envelope, unreadable video...
+            raise HTTPError(400, str(e))
+
+def _passphrase(headers):
+    value = headers.get("x-passphrase")
+    if not value:
+        raise HTTPError(400, "X-Passphrase header required")
+    return value.encode("utf-8")
+
+async def serve(port=DEFAULT_PORT, **kwargs):
+    service = StegoService(**kwargs)
+    await service.start()
+    server = await asyncio.start_server(service.handle, HOST, port, limit=MAX_HEADER_BYTES)
+    log.info(f"🚀 Listening on http://{HOST}:{port} with {service.workers} warm workers "
+             f"(max {service.max_jobs} jobs, {service.max_queue} queued)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Local HTTP service for stego embed / extract")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port on {HOST}")
+    ap.add_argument("--workers", type=int, default=None, help="Warm worker processes (default: all cores)")
+    ap.add_argument("--max_jobs", type=int, default=None, help="Requests uploading/running at once (default: workers)")
+    ap.add_argument("--max_queue", type=int, default=None, help="Requests allowed to wait (default: 4x max_jobs)")
+    ap.add_argument("--max_upload_mb", type=float, default=DEFAULT_MAX_UPLOAD_MB, help="Largest accepted body")
+    ap.add_argument("--tmp_dir", default=None, help="Where uploads and results are spooled")
+    metrics.add_metrics_args(ap)
+    args = ap.parse_args(argv)
+    metrics.configure_from_args(args)
+    try:
+        asyncio.run(serve(args.port, workers=args.workers, max_jobs=args.max_jobs, max_queue=args.max_queue,
+                          max_upload_mb=args.max_upload_mb, tmp_dir=args.tmp_dir))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# stream_header.py — Self-describing header for the classic LSB stream
+# The header is written at the very start of frame 0 (blue-channel LSBs, raster order),
+# so an extractor can learn the payload length and the per-frame layout from the stego
+# frames alone and open only the frames that actually carry payload.
+import struct
+
+# Header: [magic(4B) | version(1B) | flags(1B) | lsb_depth(1B) | channels(1B) |
+#          bits_per_frame(4B) | payload_length(8B)]   — big-endian, 20 bytes
+MAGIC = b"STGV"
+VERSION = 1
+HEADER_FORMAT = ">4sBBBBIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+HEADER_BITS = HEADER_SIZE * 8
+
+# Flags
+# FLAG_STREAMED: the payload length was not known when frame 0 was written (payload_length
+# is 0); the payload is self-delimiting (e.g. a v4 streaming envelope) and is read frame
+# by frame until its consumer stops.
+FLAG_STREAMED = 0x01
+# FLAG_ECC: each frame's share of the payload is Reed-Solomon coded on its own (see ecc.py);
+# the ECC_PREFIX_SIZE byte after the header holds the parity bytes per codeword (nsym).
+FLAG_ECC = 0x02
+ECC_PREFIX_SIZE = 1
+# FLAG_SCATTERED: the stream (header included) is written in a keyed pixel order rather
+# than raster order (see scatter.py); the header is only found with the right key.
+FLAG_SCATTERED = 0x04
+
+# Channel bitmask (BGR order, as stored by OpenCV); see lsb.py for the bit layout
+CHANNEL_BLUE = 0x01
+CHANNEL_GREEN = 0x02
+CHANNEL_RED = 0x04
+
+def pack_header(payload_length, bits_per_frame, flags=0, lsb_depth=1, channels=CHANNEL_BLUE):
+    return struct.pack(HEADER_FORMAT, MAGIC, VERSION, flags, lsb_depth, channels,
+                       bits_per_frame, payload_length)
+
+def unpack_header(data):
+    """Parse a header; returns None if `data` does not start with the magic value."""
+    if len(data) < HEADER_SIZE or data[:4] != MAGIC:
+        return None
+    _, version, flags, lsb_depth, channels, bits_per_frame, payload_length = \
+        struct.unpack(HEADER_FORMAT, bytes(data[:HEADER_SIZE]))
+    if version != VERSION:
+        raise ValueError(f"Unsupported stream header version: {version}")
+    return {
+        "version": version,
+        "flags": flags,
+        "lsb_depth": lsb_depth,
+        "channels": channels,
+        "bits_per_frame": bits_per_frame,
+        "payload_length": payload_length,
+    }
+
+def frames_needed(payload_length, bits_per_frame):
+    """Number of leading frames that hold the header plus `payload_length` payload bytes."""
+    bytes_per_frame = bits_per_frame // 8
+    total = HEADER_SIZE + payload_length
+    return (total + bytes_per_frame - 1) // bytes_per_frame